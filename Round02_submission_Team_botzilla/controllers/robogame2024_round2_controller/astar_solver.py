@@ -1,53 +1,97 @@
 import heapq
-
-# Define movement directions (North, South, East, West)
-DIRECTIONS = [(0, -1), (0, 1), (1, 0), (-1, 0)]
+import math
+import time
+from maze import DIRECTIONS
+from robot_utils import RobotUtils
+from navigation_utils import NavigationUtils
+from maze_grid import WALL_BITS, flat_cells
+from distance_oracle import DistanceOracle
+from bucket_astar import BucketAStar
+from instrumentation import profiler, timed
 
 class AStarSolver:
-    def __init__(self, cell_map, start, survivors, exit_point):
+    # Travel time estimate of route_report, with the position target moves of NavigationUtils.follow_path
+    CELL_TIME = 0.25 / (RobotUtils.MAX_SPEED * RobotUtils.WHEEL_RADIUS)  # in seconds, one cell straight ahead
+    CORNER_TIME = (NavigationUtils.TURN_RADIUS + RobotUtils.AXLE_LENGTH / 2) * math.pi / 2 / RobotUtils.WHEEL_RADIUS / RobotUtils.MAX_SPEED \
+        - CELL_TIME  # in seconds, added by a quarter turn driven as an arc (instead of half a cell on both sides)
+    TURN_BACK_TIME = math.pi * RobotUtils.AXLE_LENGTH / 2 / RobotUtils.WHEEL_RADIUS / NavigationUtils.ROTATION_SPEED  # in seconds, a half turn in place
+
+    def __init__(self, cell_map, start, survivors, exit_point, oracle=None, engine='heap'):
         self.cell_map = cell_map  # 2D list representing the grid
         self.start = start  # (x, y)
         self.survivors = survivors  # List of survivor positions [(x1, y1), (x2, y2), (x3, y3)]
         self.exit_point = exit_point  # (x, y)
         self.rows = len(cell_map)
         self.cols = len(cell_map[0])
+        self.cell_walls, self.cell_costs = flat_cells(cell_map)  # walls bitmask / cost by y * cols + x, the arrays of a MazeGrid
+        # Search engine of a_star: 'heap' (tuple keyed heapq) or 'bucket' (integer indexed, bucket queue)
+        self.engine = engine
+        self.bucket_search = BucketAStar(cell_map) if engine == 'bucket' else None
+        # Heuristic weight of the heap engine, the cell costs are taken as fixed for the life of the solver
+        self.weight = self.min_cost()
+        # Shortest paths between the key points (start, survivors, exit), can be shared between solvers
+        self.oracle = oracle if oracle is not None else DistanceOracle(cell_map)
+        self.oracle.set_key_points([start, exit_point] + list(survivors))
 
-    def heuristic(self, a, b):
-        """Compute Manhattan distance as heuristic."""
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+    def heuristic(self, a, b, weight=1):
+        """Compute Manhattan distance as heuristic, weighted by the lowest cell cost it never overestimates."""
+        return weight * (abs(a[0] - b[0]) + abs(a[1] - b[1]))
 
+    def min_cost(self):
+        grid = getattr(self.cell_map, 'grid', None)
+        if grid is not None:
+            return grid.cost_range()[0]
+        return min(self.cell_costs)
+
+    @timed('planning.a_star')
     def a_star(self, start, goal):
         """A* search algorithm to find the shortest path avoiding fire pits."""
+        if self.bucket_search is not None:
+            expansions = self.bucket_search.expansions
+            path = self.bucket_search.search(start, goal)
+            profiler.count('planning.a_star.expansions', self.bucket_search.expansions - expansions)
+            return path
+
         pq = []  # Priority queue (min-heap)
         heapq.heappush(pq, (0, start))  # (cost, (x, y))
         came_from = {start: None}  # Tracks the path
         cost_so_far = {start: 0}  # Tracks the cost to each node
+        weight = self.weight  # zero cost cells turn the search into Dijkstra
+        expansions = 0
+
+        # Walls and costs are read from the flat arrays, cell views are not built in the loop
+        walls, cost, cols, rows = self.cell_walls, self.cell_costs, self.cols, self.rows
+        steps = [(bit, dx, dy, dy * cols + dx) for bit, (dx, dy) in zip(WALL_BITS, DIRECTIONS)]
+        gx, gy = goal
 
         while pq:
             current_cost, current = heapq.heappop(pq)
+            expansions += 1
 
             if current == goal:
                 break  # Stop when reaching the goal
 
             x, y = current
-            ccell = self.cell_map[y][x]
+            i = y * cols + x
+            cell_walls = walls[i]
+            g = cost_so_far[current]
 
-            for i in range(4):
-                if ccell.wall_data[i] == 1: continue  # Skip if there is a wall
+            for bit, dx, dy, step in steps:
+                if cell_walls & bit: continue  # Skip if there is a wall
 
-                dx, dy = DIRECTIONS[i]
                 nx, ny = x + dx, y + dy
 
-                if 0 <= nx < self.rows and 0 <= ny < self.cols:
-                    ncell = self.cell_map[ny][nx]
-                    new_cost = cost_so_far[current] + ncell.get_cost()
+                if 0 <= nx < cols and 0 <= ny < rows:
+                    new_cost = g + cost[i + step]
+                    neighbour = (nx, ny)
 
-                    if (nx, ny) not in cost_so_far or new_cost < cost_so_far[(nx, ny)]:
-                        cost_so_far[(nx, ny)] = new_cost
-                        priority = new_cost + self.heuristic((nx, ny), goal)
-                        heapq.heappush(pq, (priority, (nx, ny)))
-                        came_from[(nx, ny)] = current
+                    if neighbour not in cost_so_far or new_cost < cost_so_far[neighbour]:
+                        cost_so_far[neighbour] = new_cost
+                        priority = new_cost + weight * (abs(nx - gx) + abs(ny - gy))
+                        heapq.heappush(pq, (priority, neighbour))
+                        came_from[neighbour] = current
 
+        profiler.count('planning.a_star.expansions', expansions)
         return self.reconstruct_path(came_from, start, goal)
 
     def reconstruct_path(self, came_from, start, goal):
@@ -61,12 +105,14 @@ class AStarSolver:
         path.reverse()
         return path
     
+    @timed('planning.find_rescue_route')
     def find_rescue_route(self):
         """Finds the best rescue route visiting all survivors and returning to exit."""
+        self.check_exit()
         path = []
         current_position = self.start
 
-        survivors_set = set(self.survivors)
+        survivors_set = set(self.reachable_survivors())
 
         minimum = float('inf')
         nearest_path = None
@@ -74,20 +120,173 @@ class AStarSolver:
 
         while survivors_set:
             for survivor in survivors_set:
-                temp_path = self.a_star(current_position, survivor)[1:]
+                temp_path = self.oracle.path(current_position, survivor)
+                if temp_path is None: continue  # Skip unreachable survivors
+                temp_path = temp_path[1:]
                 temp_cost = len(temp_path)
                 if temp_cost < minimum:
                     minimum = temp_cost
                     nearest_survivor = survivor
                     nearest_path = temp_path
 
+            if nearest_survivor is None:
+                break  # The remaining survivors are unreachable
+
             current_position = nearest_survivor
             path.extend(nearest_path)
 
             survivors_set.remove(nearest_survivor)
 
             minimum = float('inf')
+            nearest_survivor = None
 
-        path.extend(self.a_star(current_position, self.exit_point)[1:])  # Return to exit
+        path.extend(self.oracle.path(current_position, self.exit_point)[1:])  # Return to exit
 
         return path
+
+    def route_from_order(self, order):
+        """Joins the oracle paths from the start through the survivors in order, then to the exit."""
+        path = []
+        current_position = self.start
+        for point in list(order) + [self.exit_point]:
+            path.extend(self.oracle.path(current_position, point)[1:])
+            current_position = point
+        return path
+
+    def order_cost(self, order):
+        """Damage-weighted cost (Cell.get_cost) of visiting the survivors in order."""
+        cost = 0
+        current_position = self.start
+        for point in list(order) + [self.exit_point]:
+            cost += self.oracle.cost(current_position, point)
+            current_position = point
+        return cost
+
+    def check_exit(self):
+        """Every route ends at the exit, none can be planned when the start does not reach it."""
+        if self.oracle.cost(self.start, self.exit_point) == float('inf'):
+            raise ValueError(f'exit {self.exit_point} can not be reached from {self.start}')
+
+    def reachable_survivors(self):
+        return [survivor for survivor in self.survivors
+                if self.oracle.cost(self.start, survivor) < float('inf') and self.oracle.cost(survivor, self.exit_point) < float('inf')]
+
+    def held_karp_order(self, survivors):
+        """Cost-optimal visiting order with the Held-Karp bitmask DP, O(2^k * k^2) for k survivors."""
+        k = len(survivors)
+        if k == 0:
+            return []
+
+        start_cost = [self.oracle.cost(self.start, s) for s in survivors]
+        exit_cost = [self.oracle.cost(s, self.exit_point) for s in survivors]
+        pair_cost = [[self.oracle.cost(a, b) for b in survivors] for a in survivors]
+
+        # best[mask][i]: lowest cost to visit the survivors of mask, ending at survivor i
+        best = [[float('inf')] * k for _ in range(1 << k)]
+        parent = [[-1] * k for _ in range(1 << k)]
+        for i in range(k):
+            best[1 << i][i] = start_cost[i]
+
+        for mask in range(1, 1 << k):
+            row = best[mask]
+            for i in range(k):
+                cost = row[i]
+                if cost == float('inf'): continue
+                for j in range(k):
+                    if mask & (1 << j): continue
+                    new_cost = cost + pair_cost[i][j]
+                    next_mask = mask | (1 << j)
+                    if new_cost < best[next_mask][j]:
+                        best[next_mask][j] = new_cost
+                        parent[next_mask][j] = i
+
+        full = (1 << k) - 1
+        last = min(range(k), key=lambda i: best[full][i] + exit_cost[i])
+
+        order = []
+        mask = full
+        while last != -1:
+            order.append(survivors[last])
+            last, mask = parent[mask][last], mask & ~(1 << last)
+        order.reverse()
+        return order
+
+    def greedy_order(self, survivors):
+        """Visits the survivor with the lowest weighted cost from the current position first."""
+        order = []
+        current_position = self.start
+        remaining = set(survivors)
+        while remaining:
+            nearest_survivor = min(remaining, key=lambda survivor: (self.oracle.cost(current_position, survivor), survivor))
+            order.append(nearest_survivor)
+            remaining.remove(nearest_survivor)
+            current_position = nearest_survivor
+        return order
+
+    def two_opt(self, order):
+        """Improves an order by reversing segments while it lowers the total cost (costs are not symmetric)."""
+        order = list(order)
+        best_cost = self.order_cost(order)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(len(order) - 1):
+                for j in range(i + 1, len(order)):
+                    candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                    candidate_cost = self.order_cost(candidate)
+                    if candidate_cost < best_cost:
+                        order, best_cost = candidate, candidate_cost
+                        improved = True
+        return order
+
+    @timed('planning.find_optimal_rescue_route')
+    def find_optimal_rescue_route(self, max_exact_survivors=12):
+        """
+        Finds the rescue route with the lowest damage-weighted cost.
+
+        The order is exact (Held-Karp) up to max_exact_survivors, above that greedy + 2-opt is used.
+        """
+        self.check_exit()
+        survivors = self.reachable_survivors()
+        if len(survivors) <= max_exact_survivors:
+            order = self.held_karp_order(survivors)
+        else:
+            order = self.two_opt(self.greedy_order(survivors))
+        return self.route_from_order(order)
+
+    def route_report(self, path):
+        """Cells moved, damage taken and estimated travel time (straight runs and quarter turns) along a route."""
+        damage = 0
+        for x, y in path:
+            cell_damage = self.cell_map[y][x].damage
+            if cell_damage is not None and cell_damage > 0:
+                damage += cell_damage
+        corners, turn_backs = self.count_turns(path)
+        return {'cells': len(path), 'damage': damage, 'cost': sum(self.cell_map[y][x].get_cost() for x, y in path),
+                'corners': corners, 'turn_backs': turn_backs,
+                'travel_time': len(path) * self.CELL_TIME + corners * self.CORNER_TIME + turn_backs * self.TURN_BACK_TIME}
+
+    def count_turns(self, path):
+        """(quarter turns, half turns) between the moves of a route from the start."""
+        corners = turn_backs = 0
+        previous = None
+        for (x1, y1), (x2, y2) in zip([self.start] + path, path):
+            move = (x2 - x1, y2 - y1)
+            if previous is not None and move != previous:
+                if move == (-previous[0], -previous[1]):
+                    turn_backs += 1
+                else:
+                    corners += 1
+            previous = move
+        return corners, turn_backs
+
+    def compare_plans(self):
+        """Plans the greedy and the optimal routes and reports both with their planning time."""
+        reports = {}
+        for name, plan in (('greedy', self.find_rescue_route), ('optimal', self.find_optimal_rescue_route)):
+            start_time = time.perf_counter()
+            path = plan()
+            report = self.route_report(path)
+            report['planning_time'] = time.perf_counter() - start_time
+            reports[name] = report
+        return reports
@@ -0,0 +1,193 @@
+"""
+Whole controller runs (exploration then mission) on FakeRobot over a corpus of mazes, in a process pool.
+
+    python batch_runner.py mazes/*.json --strategy frontier --report report.csv
+
+Mazes are files in the Maze.to_array JSON layout (maze.json), 20x20 with the entrance at ENTRANCE_CELL
+like the competition world. The report has one row per maze (REPORT_FIELDS), as CSV or as JSON with
+a summary, depending on the extension of the report file. Damage taken and survivors rescued are
+counted over the mission, from the cells of the world the robot actually drove through. The color
+LUTs of each worker process live in a temporary directory, the controller's tables are never written.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from maze import Maze, MAZE_CELL_SIZE
+from fake_robot import FakeRobot
+from explore_frontier import EXPLORERS
+from mission import Mission
+
+REPORT_FIELDS = [
+    'maze', 'strategy', 'status',
+    'explore_steps', 'explore_sim_time', 'explore_wall_time', 'explore_cpu_time', 'cells_explored',
+    'mission_steps', 'mission_sim_time', 'mission_wall_time', 'mission_cpu_time',
+    'damage_taken', 'survivors_rescued', 'survivors',
+]
+
+RESCUE_TIME = 3 # in seconds, time spent in a survivor cell for it to count as rescued (see Mission.run)
+
+class CellTracker:
+    """Wraps FakeRobot.step to add up the damage of the cells the robot enters and the time it spends in each."""
+
+    def __init__(self, robot):
+        self.robot = robot
+        self.damage = 0
+        self.cell_time = {}
+        self.cell = robot.current_cell()
+
+        step = robot.step
+
+        def tracked_step(duration):
+            result = step(duration)
+            cell = robot.current_cell()
+            if cell is not None:
+                if cell != self.cell:
+                    self.damage += max(0, robot.cell_map[cell[1]][cell[0]].damage or 0)
+                self.cell_time[cell] = self.cell_time.get(cell, 0.0) + duration / 1000
+            self.cell = cell
+            return result
+
+        robot.step = tracked_step
+
+    def reset(self):
+        self.damage = 0
+        self.cell_time = {}
+
+    def rescued(self, survivors):
+        return sum(1 for cell in survivors if self.cell_time.get(cell, 0.0) >= RESCUE_TIME)
+
+@contextlib.contextmanager
+def phase(result, name, robot):
+    """Record the simulated steps and time, wall clock time and CPU time of a phase of the run."""
+    steps, sim_time = robot.steps, robot.getTime()
+    wall_time, cpu_time = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        result[name + '_steps'] = robot.steps - steps
+        result[name + '_sim_time'] = round(robot.getTime() - sim_time, 3)
+        result[name + '_wall_time'] = round(time.perf_counter() - wall_time, 4)
+        result[name + '_cpu_time'] = round(time.process_time() - cpu_time, 4)
+
+def run_maze(file, strategy='frontier', max_time=3600, lut_directory=None):
+    """
+    Explore a maze and run the mission on it, returns a row of the report.
+
+    The color LUTs are kept in a subdirectory of lut_directory per process, so the runs of a worker
+    warm them up for each other; with None they are thrown away after the run.
+    """
+    if lut_directory is None:
+        with tempfile.TemporaryDirectory() as directory:
+            return run_maze(file, strategy, max_time, directory)
+    lut_directory = os.path.join(lut_directory, str(os.getpid()))
+    os.makedirs(lut_directory, exist_ok=True)
+
+    result = dict.fromkeys(REPORT_FIELDS)
+    result.update(maze=file, strategy=strategy, status='completed')
+
+    world = Maze()
+    world.from_file(file)
+    if (world.grid.width, world.grid.height) != (MAZE_CELL_SIZE, MAZE_CELL_SIZE):
+        result['status'] = f'error: {world.grid.width}x{world.grid.height} maze'
+        return result
+    survivors = [(x, y) for y, row in enumerate(world.cell_map) for x, cell in enumerate(row) if cell.has_survivor]
+    result['survivors'] = len(survivors)
+
+    robot = FakeRobot(world, max_time=max_time)
+    tracker = CellTracker(robot)
+    explorer = None
+
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        try:
+            explorer = EXPLORERS[strategy](robot, lut_directory=lut_directory)
+            with phase(result, 'explore', robot):
+                explorer.run()
+            result['cells_explored'] = explorer.maze.grid.explored.count()
+
+            if not explorer.completed:
+                result['status'] = 'stopped' # out of simulated time
+            else:
+                tracker.reset()
+                mission = Mission(explorer.maze, explorer.initial_position, explorer.initial_bearing, explorer.entrance_position,
+                                  robot, perception=explorer.perception, wait_clock=robot.getTime)
+                with phase(result, 'mission', robot):
+                    mission.run()
+                result['damage_taken'] = tracker.damage
+                result['survivors_rescued'] = tracker.rescued(survivors)
+                if robot.max_time is not None and robot.getTime() >= robot.max_time:
+                    result['status'] = 'stopped'
+        except Exception as error:
+            result['status'] = f'error: {type(error).__name__}: {error}'
+        finally:
+            if explorer is not None and explorer.perception is not None:
+                explorer.perception.close()
+
+    return result
+
+def run_batch(files, strategy='frontier', workers=None, max_time=3600):
+    """Rows of the report for every maze file, in order, run on `workers` processes (every core by default)."""
+    with tempfile.TemporaryDirectory() as lut_directory, ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(partial(run_maze, strategy=strategy, max_time=max_time, lut_directory=lut_directory), files))
+
+def summary(results):
+    """Run counts per status and totals or means of the completed runs."""
+    completed = [result for result in results if result['status'] == 'completed']
+    statuses = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+
+    def mean(field):
+        return round(sum(result[field] for result in completed) / len(completed), 3) if completed else None
+
+    return {
+        'runs': len(results),
+        'statuses': statuses,
+        'mean_explore_sim_time': mean('explore_sim_time'),
+        'mean_mission_sim_time': mean('mission_sim_time'),
+        'mean_explore_cpu_time': mean('explore_cpu_time'),
+        'mean_mission_cpu_time': mean('mission_cpu_time'),
+        'damage_taken': sum(result['damage_taken'] for result in completed),
+        'survivors_rescued': sum(result['survivors_rescued'] for result in completed),
+        'survivors': sum(result['survivors'] for result in completed),
+    }
+
+def write_report(results, file):
+    """Write the rows as CSV, or as JSON with their summary when the file ends with .json."""
+    if file.endswith('.json'):
+        with open(file, 'w') as f:
+            json.dump({'summary': summary(results), 'results': results}, f, indent=2)
+        return
+
+    with open(file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the exploration and the mission on FakeRobot over many mazes.')
+    parser.add_argument('mazes', nargs='+', help='maze files in the maze.json layout')
+    parser.add_argument('--strategy', choices=sorted(EXPLORERS), default='frontier')
+    parser.add_argument('--workers', type=int, default=None, help='processes to run (every core by default)')
+    parser.add_argument('--max-time', type=float, default=3600, help='simulated seconds a run may take')
+    parser.add_argument('--report', default='report.csv', help='report file, .csv or .json')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = run_batch(args.mazes, args.strategy, args.workers, args.max_time)
+    write_report(results, args.report)
+
+    totals = summary(results)
+    print(f"{totals['runs']} runs in {time.perf_counter() - start:.1f} s: {totals['statuses']}")
+    print(f"mean simulated time: exploration {totals['mean_explore_sim_time']} s, mission {totals['mean_mission_sim_time']} s; "
+          f"{totals['survivors_rescued']}/{totals['survivors']} survivors rescued, {totals['damage_taken']} damage taken")
+    print(f'report written to {args.report}')
+
+if __name__ == '__main__':
+    main()
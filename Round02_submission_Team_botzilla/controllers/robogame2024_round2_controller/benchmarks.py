@@ -0,0 +1,715 @@
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from colors import *
+import color_detect
+from color_detect import scan_palette
+from color_lut import ColorLUT
+from fake_devices import FakeCamera, encode_bgra
+from robot_utils import CameraFrame, RobotUtils
+from navigation_utils import NavigationUtils
+from maze import Maze, ENTRANCE_CELL
+from astar_solver import AStarSolver
+from distance_oracle import DistanceOracle
+from dstar_lite import DStarLite
+from bucket_astar import BucketAStar
+from fake_robot import FakeRobot, FLOOR_COLOR, WALL_COLOR
+from explore_dfs import Explorer
+from explore_frontier import FrontierExplorer
+from exploration_checkpoint import ExplorationCheckpoint
+import batch_runner
+from instrumentation import profiler, timed as instrumented
+from maze_visualizer import MazeVisualizer, import_pygame
+from maze_generator import generate_maze, entrance_cell
+import maze_generator
+from perception import BOTTOM_COLORS, FRONT_COLORS, classify_floor, detect_survivor
+from scenarios import (LUT_DIRECTORY, ControllerKilled, quiet, synthetic_frame, camera_frame, blended_frame, edge_frame, patch_frame, recorded_frames,
+                       load_maze, randomize_maze, recolored_maze, cell_list_map, known_maze_mission, full_run)
+
+def timed(function, *args, repeat=1, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args, **kwargs)
+    return result, (time.perf_counter() - start) / repeat
+
+def measured(function, *args):
+    """Result of a call with the memory it allocated (in bytes) still held by the result."""
+    tracemalloc.start()
+    result = function(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def peak_memory(function, *args):
+    """Result of a call with the most memory (in bytes) it had allocated at once."""
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, peak
+
+#----------------------------------------------
+# Benchmarks
+#----------------------------------------------
+
+def bench_color_detect():
+    """Scalar per-target scans against the batched engine on every tile color."""
+    targets = (RED, ORANGE, YELLOW)
+    frames = [synthetic_frame(rgb, seed) for seed, rgb in enumerate((RED, ORANGE, YELLOW, GREEN, (200, 200, 200)))]
+
+    scalar_time = 0
+    batch_time = 0
+
+    for frame in frames:
+        start = time.perf_counter()
+        scalar = [color_detect.get_color_deltas(frame, target) for target in targets]
+        scalar.append(color_detect.is_color_exists(frame, GREEN, threshold=20))
+        scalar_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = color_detect.get_colors_deltas(frame, targets)
+        batch.append(color_detect.are_colors_exist(frame, (GREEN,), threshold=20)[0])
+        batch_time += time.perf_counter() - start
+
+    print(f'color_detect: scalar {scalar_time / len(frames) * 1000:.1f} ms/cell, '
+          f'batched {batch_time / len(frames) * 1000:.1f} ms/cell, '
+          f'speedup x{scalar_time / batch_time:.1f}')
+
+def bench_camera_ingestion():
+    """getImageArray() nested lists against CameraFrame views over the raw buffer."""
+    targets = (RED, ORANGE, YELLOW)
+    frames = [encode_bgra(synthetic_frame(rgb, seed)) for seed, rgb in enumerate((RED, ORANGE, YELLOW, GREEN))]
+
+    camera = FakeCamera(frames)
+    start = time.perf_counter()
+    nested = [color_detect.get_colors_deltas(camera.getImageArray(), targets) for _ in frames]
+    nested_time = time.perf_counter() - start
+
+    camera = FakeCamera(frames)
+    start = time.perf_counter()
+    viewed = [color_detect.get_colors_deltas(CameraFrame(camera.getImage(), 64, 64), targets) for _ in frames]
+    view_time = time.perf_counter() - start
+
+    print(f'camera ingestion: getImageArray {nested_time / len(frames) * 1000:.1f} ms/frame, '
+          f'CameraFrame {view_time / len(frames) * 1000:.1f} ms/frame')
+
+def bench_color_lut():
+    """Cold and warm ColorLUT scans, and a save / load round trip of the table."""
+    targets = (RED, ORANGE, YELLOW)
+    frames = [synthetic_frame(rgb, seed) for seed, rgb in enumerate((RED, ORANGE, YELLOW, (200, 200, 200)) * 2)]
+
+    _, plain_time = timed(lambda: [color_detect.get_colors_deltas(frame, targets) for frame in frames])
+
+    lut = ColorLUT(targets)
+    _, cold_time = timed(lambda: [color_detect.get_colors_deltas(frame, targets, lut=lut) for frame in frames])
+    _, warm_time = timed(lambda: [color_detect.get_colors_deltas(frame, targets, lut=lut) for frame in frames])
+    capped = ColorLUT(targets, threshold=20)
+    _, capped_time = timed(lambda: [color_detect.get_colors_deltas(frame, targets, lut=capped) for frame in frames])
+
+    with tempfile.TemporaryDirectory() as directory:
+        file = os.path.join(directory, 'bottom.lut')
+        lut.save(file)
+        size = os.path.getsize(file)
+        _, load_time = timed(ColorLUT.load, file, targets)
+
+    print(f'color LUT: plain {plain_time / len(frames) * 1000:.1f} ms/frame, cold {cold_time / len(frames) * 1000:.1f} ms/frame, '
+          f'cold with the pre-filter {capped_time / len(frames) * 1000:.1f} ms/frame, warm {warm_time / len(frames) * 1000:.1f} ms/frame, hit rate {lut.hit_rate() * 100:.1f}%, '
+          f'{len(lut.table)} entries in {size / 1024:.0f} KiB loaded in {load_time * 1000:.1f} ms')
+
+def bench_palette_scan():
+    """One scan_palette traversal against per-target scans, with strides and early exits."""
+    palette = (RED, ORANGE, YELLOW, GREEN)
+    frames = [synthetic_frame(rgb, seed) for seed, rgb in enumerate((RED, ORANGE, YELLOW, GREEN))]
+
+    _, per_target_time = timed(lambda: [[color_detect.get_color_deltas(frame, target) for target in palette] for frame in frames])
+    _, full_time = timed(lambda: [scan_palette(frame, palette) for frame in frames])
+
+    _, strided_time = timed(lambda: [scan_palette(frame, palette, stride=4) for frame in frames])
+    _, roi_time = timed(lambda: [scan_palette(frame, palette, roi=(16, 16, 48, 48)) for frame in frames])
+    _, stop_time = timed(lambda: [scan_palette(frame, palette, stop_count=32) for frame in frames])
+
+    print(f'palette scan: per target {per_target_time / len(frames) * 1000:.1f} ms/frame, single pass {full_time / len(frames) * 1000:.1f} ms/frame, '
+          f'stride 4 {strided_time / len(frames) * 1000:.1f} ms/frame, center roi {roi_time / len(frames) * 1000:.1f} ms/frame, '
+          f'stop at 32 px {stop_time / len(frames) * 1000:.1f} ms/frame')
+
+def bench_prefilter():
+    """Exact CIEDE2000 on every distinct color against the pre-filtered scan, on recorded camera frames."""
+    targets = (RED, ORANGE, YELLOW)
+    tiles = (RED, ORANGE, YELLOW, GREEN, (200, 200, 200), (40, 40, 40), (30, 60, 200))
+    camera = FakeCamera([encode_bgra(synthetic_frame(rgb, seed, noise=12)) for seed, rgb in enumerate(tiles)])
+    frames = [CameraFrame(camera.getImage(), 64, 64) for _ in tiles]
+
+    codes = [color_detect.unique_color_codes(frame) for frame in frames]
+    _, exact_time = timed(lambda: [color_detect.color_codes_deltas(frame_codes, targets) for frame_codes in codes])
+    filtered, filtered_time = timed(lambda: [color_detect.color_codes_deltas(frame_codes, targets, threshold=20) for frame_codes in codes])
+
+    pairs = sum(deltas.size for deltas in filtered)
+    rejected = sum(int((deltas == float('inf')).sum()) for deltas in filtered)
+
+    print(f'pre-filter: exact {exact_time / len(frames) * 1000:.1f} ms/frame, filtered {filtered_time / len(frames) * 1000:.1f} ms/frame, '
+          f'{rejected / pairs * 100:.1f}% of pairs rejected')
+
+def bench_distance_oracle(survivor_count=8, seed=0):
+    """Pairwise a_star calls between key points against one DistanceOracle search per key point."""
+    maze = load_maze()
+    rng = random.Random(seed)
+    survivors = rng.sample([(x, y) for y in range(len(maze.cell_map)) for x in range(len(maze.cell_map[0]))], survivor_count)
+    points = [ENTRANCE_CELL] + survivors
+
+    solver = AStarSolver(maze.cell_map, ENTRANCE_CELL, survivors, ENTRANCE_CELL)
+    _, a_star_time = timed(lambda: [[solver.a_star(a, b) for b in points] for a in points])
+
+    oracle = DistanceOracle(maze.cell_map)
+    _, oracle_time = timed(oracle.cost_matrix, points)
+    _, query_time = timed(oracle.cost_matrix, points)
+
+    print(f'distance oracle ({len(points)} key points): pairwise a_star {a_star_time * 1000:.1f} ms, '
+          f'oracle build {oracle_time * 1000:.1f} ms, cached matrix {query_time * 1000:.2f} ms')
+
+def bench_rescue_plans(seed=0):
+    """Greedy nearest-survivor routes against the optimal (Held-Karp, or greedy + 2-opt) routes."""
+    maze = load_maze()
+    rng = random.Random(seed)
+    cells = [(x, y) for y in range(len(maze.cell_map)) for x in range(len(maze.cell_map[0]))]
+    for x, y in rng.sample(cells, len(cells) // 6):
+        maze.cell_map[y][x].damage = rng.choice((10, 40))
+
+    for survivor_count in (3, 6, 10, 16):
+        survivors = rng.sample(cells, survivor_count)
+        solver = AStarSolver(maze.cell_map, ENTRANCE_CELL, survivors, ENTRANCE_CELL)
+        reports = solver.compare_plans()
+        greedy, optimal = reports['greedy'], reports['optimal']
+        print(f'rescue plans ({survivor_count} survivors): greedy {greedy["damage"]} damage / {greedy["cells"]} cells / '
+              f'{greedy["travel_time"]:.0f} s in {greedy["planning_time"] * 1000:.1f} ms, optimal {optimal["damage"]} damage / '
+              f'{optimal["cells"]} cells / {optimal["travel_time"]:.0f} s in {optimal["planning_time"] * 1000:.1f} ms')
+
+def bench_maze_grid(sizes=(20, 100, 200)):
+    """Memory and a_star speed of the flat MazeGrid against the list of Cell objects."""
+    for size in sizes:
+        rng = random.Random(size)
+        maze, grid_memory = measured(Maze, size)
+        randomize_maze(maze, rng)
+        cell_map, list_memory = measured(cell_list_map, maze)
+
+        start = (0, size - 1)
+        reachable = DistanceOracle(maze.cell_map).search(start)[0]
+        goal = max(reachable, key=lambda cell: abs(cell[0] - start[0]) + abs(cell[1] - start[1]))
+        _, grid_time = timed(AStarSolver(maze.cell_map, start, [], goal).a_star, start, goal)
+        _, list_time = timed(AStarSolver(cell_map, start, [], goal).a_star, start, goal)
+
+        print(f'maze grid {size}x{size}: grid {grid_memory / 1024:.0f} KiB, cells {list_memory / 1024:.0f} KiB, '
+              f'a_star grid {grid_time * 1000:.1f} ms, cells {list_time * 1000:.1f} ms')
+
+def bench_bucket_astar(sizes=(20, 50, 100, 200), queries=20):
+    """Heap a_star against the integer indexed bucket queue engine on random mazes."""
+    for size in sizes:
+        for damages in ((-1, -1, -1, 10, 40), (-1, -1, -1, 0, 10, 40)):
+            rng = random.Random(size)
+            maze = randomize_maze(Maze(size), rng, damages)
+            reachable = list(DistanceOracle(maze.cell_map).search((0, 0))[0])
+            pairs = [(rng.choice(reachable), rng.choice(reachable)) for _ in range(queries)]
+
+            heap_solver = AStarSolver(maze.cell_map, (0, 0), [], (0, 0))
+            bucket_solver = AStarSolver(maze.cell_map, (0, 0), [], (0, 0), engine='bucket')
+            _, heap_time = timed(lambda: [heap_solver.a_star(a, b) for a, b in pairs])
+            _, bucket_time = timed(lambda: [bucket_solver.a_star(a, b) for a, b in pairs])
+
+            label = 'with' if 0 in damages else 'without'
+            print(f'bucket a_star {size}x{size} ({label} zero cost cells): heap {heap_time / queries * 1000:.2f} ms, '
+                  f'bucket {bucket_time / queries * 1000:.2f} ms per search')
+
+def bench_fake_robot():
+    """Raw FakeRobot step rate, and a full Mission.run on maze.json driven by it."""
+    robot = FakeRobot()
+    robot_utils = RobotUtils(robot)
+    robot_utils.set_speed(50)
+    robot_utils.left_motor.setPosition(float('inf'))
+    robot_utils.right_motor.setPosition(float('inf'))
+    steps = 10000
+    _, step_time = timed(lambda: [robot_utils.step() for _ in range(steps)])
+    print(f'fake robot: {steps / step_time:.0f} steps/s')
+
+    robot = FakeRobot()
+    _, mission_time = timed(quiet, known_maze_mission(robot).run)
+    print(f'fake robot mission: {robot.steps} steps, {robot.getTime():.1f} s simulated in {mission_time:.2f} s')
+
+def bench_explorer(explorer_count=3):
+    """Several explorers interleaved tick by tick in one process, each on its own FakeRobot."""
+    explorers = [Explorer(FakeRobot(), lut_directory=LUT_DIRECTORY) for _ in range(explorer_count)]
+
+    def explore_all():
+        running = list(explorers)
+        while running:
+            running = [explorer for explorer in running if explorer.tick()]
+
+    _, explore_time = timed(quiet, explore_all)
+
+    steps = sum(explorer.robot.steps for explorer in explorers)
+    print(f'explorer: {explorer_count} interleaved explorations of maze.json, {steps} steps in {explore_time:.2f} s')
+
+def bench_frontier(max_time=3600):
+    """Cells explored per simulated minute by the DFS and the frontier explorer, on maze.json and with a walled off corner."""
+    enclosed = load_maze()
+    for x, y in ((0, 0), (1, 0), (0, 1), (1, 1)):
+        enclosed.cell_map[y][x].wall_data = [1, 1, 1, 1]
+    for x, y, side in ((2, 0, 3), (2, 1, 3), (0, 2, 0), (1, 2, 0)):
+        enclosed.cell_map[y][x].wall_data[side] = 1
+
+    for label, maze in (('maze.json', load_maze()), ('walled off corner', enclosed)):
+        for explorer_class in (Explorer, FrontierExplorer):
+            robot = FakeRobot(maze, max_time=max_time)
+            explorer = explorer_class(robot, lut_directory=LUT_DIRECTORY)
+            _, explore_time = timed(quiet, explorer.run)
+            if explorer.perception is not None:
+                explorer.perception.wait()
+
+            explored = [(x, y) for y, row in enumerate(explorer.maze.cell_map) for x, cell in enumerate(row) if cell.explored]
+            status = 'completed' if explorer.completed else 'stopped'
+            print(f'frontier {label}, {explorer_class.__name__}: {len(explored)} cells in {robot.getTime():.0f} s simulated ({status}), '
+                  f'{len(explored) / robot.getTime() * 60:.1f} cells/min, {explore_time:.2f} s')
+
+class PointByPointNavigation(NavigationUtils):
+    """Previous behaviour of the navigation: rotate (even by 0 degrees), then move and stop, at every waypoint."""
+
+    def follow_path(self, points, reverse=False, stop=None):
+        for x, y in points:
+            current_x, current_y = self.robot.current_position()
+            target_degree = self.direction_of_tow_poits(current_x, current_y, x, y)
+            self.rotate_to_angle((target_degree + 180) % 360 if reverse else target_degree)
+            self.move_straight(self.distance_of_two_points(current_x, current_y, x, y), -1 if reverse else 1)
+            if stop is not None and stop():
+                return (x, y)
+        return (points[-1][0], points[-1][1]) if points else None
+
+def bench_trajectory():
+    """Simulated time of exploration and mission with the trajectory executor against point by point moves."""
+    for label, navigation_class, motion_control in (('point by point', PointByPointNavigation, False),
+                                                    ('follow_path', NavigationUtils, False),
+                                                    ('follow_path with motion control', NavigationUtils, True)):
+        results = []
+        for explorer_class in (Explorer, FrontierExplorer):
+            robot = FakeRobot()
+            explorer = explorer_class(robot, lut_directory=LUT_DIRECTORY)
+            explorer.nav_utils = navigation_class(explorer.robot_utils, motion_control)
+            quiet(explorer.run)
+            results.append(f'{explorer_class.__name__} {robot.getTime():.0f} s')
+
+        robot = FakeRobot()
+        mission = known_maze_mission(robot)
+        mission.nav_utils = navigation_class(mission.robot_utils, motion_control)
+        quiet(mission.run)
+        results.append(f'Mission {robot.getTime():.1f} s')
+        print(f'trajectory {label}: ' + ', '.join(results) + ' simulated')
+
+def bench_motion_control():
+    """Per-move timing stats of the closed loop motion controller, against position targets and busy-waits."""
+    for motion_control in (False, True):
+        robot = FakeRobot()
+        explorer = FrontierExplorer(robot, lut_directory=LUT_DIRECTORY)
+        explorer.nav_utils = NavigationUtils(explorer.robot_utils, motion_control)
+        quiet(explorer.run)
+        x, y = explorer.robot_utils.current_position()
+        error = math.hypot(x - explorer.initial_position[0], y - explorer.initial_position[1])
+
+        label = 'closed loop' if motion_control else 'position targets'
+        print(f'motion control {label}: frontier exploration in {robot.steps} steps, {robot.getTime():.0f} s simulated, '
+              f'{error * 1000:.1f} mm from the initial position at the end')
+        if motion_control:
+            for kind, entry in explorer.nav_utils.motion.summary().items():
+                print(f'  {kind}: {entry["moves"]} moves, {entry["steps"]} steps, {entry["time"]:.0f} s, '
+                      f'{entry["steps"] / entry["moves"]:.1f} steps per move, mean error {entry["error"]:.4f}')
+
+def bench_sensor_cache():
+    """Device calls and controller time of explorations with and without the per step sensor snapshot."""
+    for explorer_class in (Explorer, FrontierExplorer):
+        results = {}
+        for cache_sensors in (False, True):
+            robot = FakeRobot()
+            explorer = explorer_class(robot, lut_directory=LUT_DIRECTORY)
+            explorer.robot_utils.cache_sensors = cache_sensors
+            _, explore_time = timed(quiet, explorer.run)
+            results[cache_sensors] = (robot.steps, explorer.robot_utils.device_reads, explorer.robot_utils.saved_reads, explore_time)
+
+        steps, uncached_reads, _, uncached_time = results[False]
+        _, device_reads, saved_reads, cached_time = results[True]
+        print(f'sensor cache {explorer_class.__name__}: {uncached_reads} -> {device_reads} device reads '
+              f'({saved_reads} saved, {device_reads / steps:.2f} per step), {uncached_time:.2f} s -> {cached_time:.2f} s')
+
+def bench_known_cells():
+    """Cells sensed and skipped as already known during the explorations, and the CPU time it avoided."""
+    for explorer_class in (Explorer, FrontierExplorer):
+        explorer = explorer_class(FakeRobot(), async_perception=False, lut_directory=LUT_DIRECTORY)
+        quiet(explorer.run)
+        per_cell = explorer.sensing_time / explorer.sensed_cells * 1000
+        print(f'known cells {explorer_class.__name__}: {explorer.sensed_cells} cells sensed ({per_cell:.2f} ms CPU per cell), '
+              f'{explorer.skipped_cells} revisits skipped, ~{explorer.avoided_sensing_time() * 1000:.0f} ms avoided')
+
+def bench_perception():
+    """Control thread time spent on color classification, inline against the background worker."""
+    for async_perception in (False, True):
+        robot = FakeRobot()
+        explorer = Explorer(robot, async_perception=async_perception, lut_directory=LUT_DIRECTORY)
+        _, explore_time = timed(quiet, explorer.run)
+
+        label = 'worker thread' if async_perception else 'inline'
+        line = f'perception {label}: exploration in {explore_time:.2f} s, {explorer.sensing_time * 1000:.0f} ms of sensing on the control thread'
+        if async_perception:
+            perception = explorer.perception
+            line += f', {perception.worker_time * 1000:.0f} ms on the worker, {perception.wait_time * 1000:.1f} ms waiting for it'
+            perception.close()
+        print(line)
+
+def bench_dstar_lite(sizes=(20, 50, 100), changes=20, seed=0):
+    """Replanning latency of D* Lite after a cell changes on the way, against fresh searches."""
+    for size in sizes:
+        for damages in ((-1, -1, -1, 10, 40), (-1, -1, -1, 0, 10, 40)):
+            rng = random.Random(seed + size)
+            maze = randomize_maze(Maze(size), rng, damages)
+            reachable = list(DistanceOracle(maze.cell_map).search((0, 0))[0])
+            start, goal = max(((rng.choice(reachable), rng.choice(reachable)) for _ in range(20)),
+                              key=lambda pair: abs(pair[0][0] - pair[1][0]) + abs(pair[0][1] - pair[1][1]))
+
+            planner = DStarLite(maze.cell_map, start, goal)
+            maze.add_cell_listener(planner.update_cell)
+            bucket = BucketAStar(maze.cell_map)
+            heap_solver = AStarSolver(maze.cell_map, (0, 0), [], (0, 0))
+            path = planner.compute_path()
+
+            repair_time = fresh_time = heap_time = 0.0
+            replans = 0
+            for _ in range(changes):
+                if path is None or len(path) < 4:
+                    break
+                # Drive a few cells, then a cell a few cells ahead turns out worse than mapped
+                planner.move_start(path[min(3, len(path) - 2)])
+                x, y = path[rng.randrange(min(4, len(path) - 1), min(8, len(path)))]
+                if (x, y) == goal:
+                    continue
+                maze.cell_map[y][x].damage = 40
+                maze.notify_cell_changed(x, y)
+
+                path, elapsed = timed(planner.compute_path)
+                repair_time += elapsed
+                try:
+                    _, elapsed = timed(bucket.search, planner.start, goal)
+                except KeyError:
+                    elapsed = 0.0
+                fresh_time += elapsed
+                _, elapsed = timed(heap_solver.a_star, planner.start, goal)
+                heap_time += elapsed
+                replans += 1
+
+            label = 'with' if 0 in damages else 'without'
+            print(f'dstar lite {size}x{size} ({label} zero cost cells): {replans} replans, D* Lite repair {repair_time / replans * 1000:.2f} ms, '
+                  f'fresh bucket A* {fresh_time / replans * 1000:.2f} ms, fresh heap A* {heap_time / replans * 1000:.2f} ms')
+
+def bench_maze_snapshot(sizes=(20, 100, 500), seed=0):
+    """Size and save / load time of binary maze snapshots against the JSON, and checkpointing every explored cell."""
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, 'maze.json')
+        snapshot_file = os.path.join(directory, 'maze.snapshot')
+
+        for size in sizes:
+            rng = random.Random(seed + size)
+            # Odd sized, so the last byte of the packed walls only holds one cell
+            maze = randomize_maze(Maze(size + 1, size), rng)
+            for row in maze.cell_map:
+                for cell in row:
+                    cell.has_survivor = rng.choice((None, 0, 0, 1))
+                    cell.explored = rng.random() < 0.5
+                    if rng.random() < 0.9:
+                        cell.x, cell.y = rng.randrange(-400, 400) / 8, rng.randrange(-400, 400) / 8
+                    if rng.random() < 0.1:
+                        cell.damage = None
+
+            _, json_save_time = timed(maze.save, json_file)
+            _, snapshot_save_time = timed(maze.save_snapshot, snapshot_file)
+            json_load_time = timed(Maze().from_file, json_file)[1]
+            loaded = Maze(1)
+            _, snapshot_load_time = timed(loaded.load_snapshot, snapshot_file)
+
+            print(f'maze snapshot {size + 1}x{size}: JSON {os.path.getsize(json_file) / 1024:.0f} KiB saved in {json_save_time * 1000:.1f} ms, '
+                  f'loaded in {json_load_time * 1000:.1f} ms; snapshot {os.path.getsize(snapshot_file) / 1024:.0f} KiB saved in '
+                  f'{snapshot_save_time * 1000:.2f} ms, loaded in {snapshot_load_time * 1000:.2f} ms')
+
+        # A snapshot after every explored cell of an exploration
+        robot = FakeRobot()
+        explorer = FrontierExplorer(robot, async_perception=False, lut_directory=LUT_DIRECTORY)
+        checkpoints = []
+
+        def checkpoint(x, y):
+            checkpoints.append(timed(explorer.maze.save_snapshot, snapshot_file)[1])
+
+        explorer.maze.add_cell_listener(checkpoint)
+        _, explore_time = timed(quiet, explorer.run)
+
+        print(f'maze snapshot checkpoints: {len(checkpoints)} during an exploration, {sum(checkpoints) / len(checkpoints) * 1000:.3f} ms each, '
+              f'{sum(checkpoints):.2f} s in all for {robot.getTime():.0f} s simulated ({explore_time:.2f} s on the FakeRobot)')
+
+def bench_checkpoint(kill_steps=(1500, 6000, 10500)):
+    """Explorations killed mid-run and restarted from their ExplorationCheckpoint, against uninterrupted ones."""
+    with tempfile.TemporaryDirectory() as directory:
+        file = os.path.join(directory, 'exploration.log')
+
+        for explorer_class in (Explorer, FrontierExplorer):
+            robot = FakeRobot()
+            checkpoint = ExplorationCheckpoint(file)
+            explorer = explorer_class(robot, checkpoint=checkpoint, lut_directory=LUT_DIRECTORY)
+            record = checkpoint.record
+            record_times = []
+
+            def timed_record():
+                # CPU time of the control thread, the worker thread also runs while the log waits for it
+                start = time.thread_time()
+                record()
+                record_times.append(time.thread_time() - start)
+
+            checkpoint.record = timed_record
+            _, explore_time = timed(quiet, explorer.run)
+            explorer.perception.close()
+            uninterrupted_time = robot.getTime()
+            print(f'checkpoint {explorer_class.__name__}: {len(record_times)} lines, {checkpoint.bytes_written / 1024:.0f} KiB written, '
+                  f'{sum(record_times) * 1000:.0f} ms of logging CPU time in a {explore_time:.2f} s exploration')
+            checkpoint.clear()
+
+            for kill_step in kill_steps:
+                robot = FakeRobot()
+                step = robot.step
+
+                def killing_step(duration):
+                    if robot.steps == kill_step:
+                        raise ControllerKilled()
+                    return step(duration)
+
+                robot.step = killing_step
+                checkpoint = ExplorationCheckpoint(file)
+                explorer = explorer_class(robot, checkpoint=checkpoint, lut_directory=LUT_DIRECTORY)
+                try:
+                    quiet(explorer.run)
+                except ControllerKilled:
+                    pass
+                # Whatever the dead controller had not written is lost
+                checkpoint.close()
+                explorer.perception.executor.shutdown(wait=False)
+                explored_before = explorer.maze.grid.explored.count()
+
+                robot.step = step
+                checkpoint = ExplorationCheckpoint(file)
+                resumed = explorer_class(robot, checkpoint=checkpoint, lut_directory=LUT_DIRECTORY)
+                quiet(resumed.run)
+                resumed.perception.close()
+                exploration_time = robot.getTime()
+                checkpoint.clear()
+
+                print(f'checkpoint {explorer_class.__name__} killed at step {kill_step}: {explored_before} cells explored, '
+                      f'{resumed.sensed_cells} sensed after the restart, {exploration_time:.0f} s simulated '
+                      f'in all (uninterrupted {uninterrupted_time:.0f} s)')
+
+def bench_batch_runner(maze_count=8, seed=0):
+    """Batch runs over recolored copies of maze.json, on one process and on every core."""
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        files = []
+        for i in range(maze_count):
+            file = os.path.join(directory, f'maze_{i}.json')
+            recolored_maze(rng).save(file)
+            files.append(file)
+
+        for strategy in ('dfs', 'frontier'):
+            _, serial_time = timed(batch_runner.run_batch, files, strategy, 1)
+            parallel, parallel_time = timed(batch_runner.run_batch, files, strategy)
+
+            for report in ('report.csv', 'report.json'):
+                batch_runner.write_report(parallel, os.path.join(directory, report))
+            with open(os.path.join(directory, 'report.json')) as f:
+                totals = json.load(f)['summary']
+
+            print(f'batch runner {strategy}: {maze_count} mazes in {serial_time:.1f} s on 1 process, {parallel_time:.1f} s on '
+                  f'{os.cpu_count()}, mean {totals["mean_explore_sim_time"]:.0f} s exploration + {totals["mean_mission_sim_time"]:.0f} s mission '
+                  f'simulated, {totals["damage_taken"] / maze_count:.0f} damage per mission')
+
+def bench_instrumentation(repeat=3):
+    """Cost of the instrumentation disabled and enabled on a whole run, and its JSON and Chrome trace exports."""
+    def plain(value):
+        return value
+
+    @instrumented('bench.call')
+    def wrapped(value):
+        return value
+
+    calls = 100000
+    _, plain_time = timed(lambda: [plain(i) for i in range(calls)])
+    _, wrapped_time = timed(lambda: [wrapped(i) for i in range(calls)])
+
+    disabled_time = min(timed(full_run)[1] for _ in range(repeat))
+    profiler.enable()
+    try:
+        enabled_time = float('inf')
+        for _ in range(repeat):
+            profiler.reset()
+            steps, elapsed = timed(full_run)
+            enabled_time = min(enabled_time, elapsed)
+    finally:
+        profiler.disable()
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_file = os.path.join(directory, 'trace.json')
+        chrome_file = os.path.join(directory, 'chrome_trace.json')
+        profiler.save_json(json_file)
+        profiler.save_chrome_trace(chrome_file)
+        with open(chrome_file) as f:
+            events = json.load(f)['traceEvents']
+        size = os.path.getsize(chrome_file)
+
+    print(profiler.summary())
+    # Instrumented calls of the run, each costing about the disabled decorator overhead when the profiler is off
+    call_overhead = (wrapped_time - plain_time) / calls
+    instrumented_calls = sum(timer['calls'] for timer in profiler.timers.values()) + steps
+    print(f'instrumentation: disabled decorator {call_overhead * 1e9:.0f} ns per call, ~{instrumented_calls * call_overhead * 1000:.1f} ms '
+          f'for the {instrumented_calls} instrumented calls of a whole run taking {disabled_time:.2f} s disabled, {enabled_time:.2f} s enabled; '
+          f'{len(events)} trace events in {size / 1024:.0f} KiB')
+    profiler.reset()
+
+def bench_visualizer(repeat=3):
+    """Full and incremental redraws of a headless MazeVisualizer, and what leaving it on costs a whole run."""
+    try:
+        import_pygame(headless=True)
+    except ImportError:
+        print('visualizer: pygame is not installed, skipped')
+        return
+
+    maze = load_maze()
+    visualizer = MazeVisualizer(maze, headless=True)
+    _, full_time = timed(lambda: (setattr(visualizer, 'full_redraw', True), visualizer.draw(force=True)), repeat=50)
+    _, cell_time = timed(lambda: (visualizer.on_cell_changed(5, 5), visualizer.draw(force=True)), repeat=500)
+
+    visualizers = []
+    def headless(maze, max_fps=10):
+        visualizers.append(MazeVisualizer(maze, headless=True, max_fps=max_fps))
+        return visualizers[-1]
+
+    plain_time = min(timed(full_run)[1] for _ in range(repeat))
+    visualized_time = min(timed(full_run, headless)[1] for _ in range(repeat))
+    unlimited_time = timed(full_run, lambda maze: headless(maze, max_fps=None))[1]
+
+    limited, unlimited = visualizers[-2], visualizers[-1]
+    print(f'visualizer: full redraw {full_time * 1000:.2f} ms, one cell {cell_time * 1000:.3f} ms; whole run {plain_time:.2f} s, '
+          f'{visualized_time:.2f} s with {limited.frames} frames ({limited.frames_skipped} skipped), {unlimited_time:.2f} s drawing '
+          f'{unlimited.frames} frames of {unlimited.cells_drawn / unlimited.frames:.1f} cells')
+
+def bench_maze_generator(count=4, seed=0):
+    """Generation time of mazes from 20x20 to 500x500, and whole runs on a generated corpus."""
+    line = ['maze generator:']
+    for size in (20, 100, 500):
+        _, generate_time = timed(generate_maze, size, seed=seed, fire_pit_density=0.15, survivor_count=5)
+        line.append(f'{size}x{size} in {generate_time * 1000:.1f} ms,')
+
+    # Whole runs on a corpus written by the command line
+    with tempfile.TemporaryDirectory() as directory:
+        quiet(maze_generator.main, [directory, '--count', str(count), '--seed', str(seed)])
+        files = sorted(os.path.join(directory, file) for file in os.listdir(directory))
+        results, elapsed = timed(batch_runner.run_batch, files)
+    totals = batch_runner.summary(results)
+    line.append(f'{count} generated 20x20 mazes run in {elapsed:.1f} s, mean {totals["mean_explore_sim_time"]:.0f} s exploration '
+                f'+ {totals["mean_mission_sim_time"]:.0f} s mission simulated, {totals["survivors_rescued"]} of {totals["survivors"]} survivors rescued')
+    print(' '.join(line))
+
+def bench_planner_scaling(sizes=(20, 50, 100, 200, 500), survivor_count=8, queries=5, seed=0):
+    """Latency and peak memory of a_star (both engines) and find_rescue_route on generated mazes from 20x20 to 500x500."""
+    for size in sizes:
+        maze, generate_time = timed(generate_maze, size, seed=seed, survivor_count=survivor_count)
+        cell_map = maze.cell_map
+        entrance = entrance_cell(size, size)
+        survivors = [(x, y) for y in range(size) for x in range(size) if cell_map[y][x].has_survivor]
+        rng = random.Random(seed)
+        cells = [(x, y) for y in range(size) for x in range(size)]
+        # The far corners and random pairs, every cell is reachable in a generated maze
+        pairs = [(entrance, (0, 0)), (entrance, (size - 1, 0))] + [(rng.choice(cells), rng.choice(cells)) for _ in range(queries)]
+
+        line = [f'planner scaling {size}x{size}:']
+        for engine in ('heap', 'bucket'):
+            solver = AStarSolver(cell_map, entrance, [], entrance, engine=engine)
+            latencies = [timed(solver.a_star, a, b)[1] for a, b in pairs]
+            _, memory = peak_memory(solver.a_star, *pairs[0])
+            line.append(f'a_star {engine} mean {sum(latencies) / len(latencies) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms, '
+                        f'{memory / 1024:.0f} KiB per search;')
+
+        # A new solver every time, so the searches of its DistanceOracle are part of the route planning
+        def rescue_route():
+            return AStarSolver(cell_map, entrance, survivors, entrance).find_rescue_route()
+        _, route_time = timed(rescue_route)
+        _, route_memory = peak_memory(rescue_route)
+        line.append(f'find_rescue_route ({survivor_count} survivors) {route_time * 1000:.1f} ms, {route_memory / 1024:.0f} KiB '
+                    f'(maze generated in {generate_time * 1000:.0f} ms)')
+        print(' '.join(line))
+
+def bench_coarse_detection(seed=0):
+    """Cost of the floor and survivor decisions, coarse-to-fine against the full scan."""
+    rng = random.Random(seed)
+    recorded = recorded_frames()
+    floor_colors = BOTTOM_COLORS + (GREEN, FLOOR_COLOR, WALL_COLOR)
+    frame_sets = {
+        'recorded': [bottom for bottom, _ in recorded] + [front for _, front in recorded if front is not None],
+        'noisy tiles': [camera_frame(synthetic_frame(rgb, rng.randrange(1000), noise)) for rgb in floor_colors for noise in (3, 6, 10)],
+        'blends': [camera_frame(blended_frame(rgb, base, ratio / 20, rng.randrange(1000)))
+                   for rgb in BOTTOM_COLORS + (GREEN,) for base in (FLOOR_COLOR, WALL_COLOR) for ratio in range(21)],
+        'tile edges': [camera_frame(edge_frame(rgb, FLOOR_COLOR, rng.randrange(1, 64), rng.randrange(1000)))
+                       for rgb in BOTTOM_COLORS for _ in range(6)],
+        'survivor patches': [camera_frame(patch_frame(GREEN, WALL_COLOR, size, rng.randrange(1000))) for size in (1, 2, 3, 5) for _ in range(4)],
+    }
+
+    for name, frames in frame_sets.items():
+        line = [f'coarse detection, {len(frames)} {name} frames:']
+        for lut_label, bottom_lut, front_lut in (('no LUT', None, None), ('LUT', ColorLUT(BOTTOM_COLORS), ColorLUT(FRONT_COLORS))):
+            bottom, front = color_detect.CoarseToFine(), color_detect.CoarseToFine()
+            # Both scans time warm tables, the pooled colors of the coarse one are looked up in them too
+            for frame in frames:
+                classify_floor(frame, bottom_lut, None), detect_survivor(frame, front_lut, None)
+                classify_floor(frame, bottom_lut, color_detect.CoarseToFine()), detect_survivor(frame, front_lut, color_detect.CoarseToFine())
+            full, full_time = timed(lambda: [(classify_floor(frame, bottom_lut, None), detect_survivor(frame, front_lut, None)) for frame in frames])
+            _, coarse_time = timed(lambda: [(classify_floor(frame, bottom_lut, bottom), detect_survivor(frame, front_lut, front)) for frame in frames])
+            line.append(f'{lut_label} full {full_time / len(frames) * 1000:.2f} ms, coarse {coarse_time / len(frames) * 1000:.2f} ms/frame '
+                        f'({bottom.stats()["refined_share"] * 100:.0f}% / {front.stats()["refined_share"] * 100:.0f}% of the floor / survivor tiles refined);')
+        if name != 'recorded':
+            decisions = sorted({damage for damage, _ in full}), sum(survivor for _, survivor in full)
+            line.append(f'damages {decisions[0]}, {decisions[1]} survivors')
+        print(' '.join(line))
+
+BENCHMARKS = {
+    'color_detect': bench_color_detect,
+    'camera_ingestion': bench_camera_ingestion,
+    'color_lut': bench_color_lut,
+    'palette_scan': bench_palette_scan,
+    'prefilter': bench_prefilter,
+    'distance_oracle': bench_distance_oracle,
+    'rescue_plans': bench_rescue_plans,
+    'maze_grid': bench_maze_grid,
+    'bucket_astar': bench_bucket_astar,
+    'fake_robot': bench_fake_robot,
+    'explorer': bench_explorer,
+    'frontier': bench_frontier,
+    'trajectory': bench_trajectory,
+    'motion_control': bench_motion_control,
+    'sensor_cache': bench_sensor_cache,
+    'known_cells': bench_known_cells,
+    'perception': bench_perception,
+    'dstar_lite': bench_dstar_lite,
+    'maze_snapshot': bench_maze_snapshot,
+    'checkpoint': bench_checkpoint,
+    'batch_runner': bench_batch_runner,
+    'instrumentation': bench_instrumentation,
+    'visualizer': bench_visualizer,
+    'maze_generator': bench_maze_generator,
+    'planner_scaling': bench_planner_scaling,
+    'coarse_detection': bench_coarse_detection,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
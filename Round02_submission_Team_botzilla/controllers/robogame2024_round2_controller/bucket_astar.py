@@ -0,0 +1,105 @@
+from array import array
+from maze_grid import WALL_BITS, flat_cells
+
+class BucketAStar:
+    """
+    A* over linear cell indices (y * width + x) with a bucket (Dial) priority queue.
+
+    Cell costs are small integers (0, 1, 10 or 40), so the open set is a ring of max_cost + 2
+    buckets indexed by f = g + h instead of a heap of (priority, (x, y)) tuples. Cost and parent
+    arrays are allocated once per solver and stamped with a search id instead of being cleared.
+
+    The Manhattan heuristic is weighted by the lowest cell cost, so it never overestimates: with
+    zero cost cells the search is Dijkstra and the path cost stays optimal.
+    """
+
+    def __init__(self, cell_map):
+        self.cell_map = cell_map
+        self.grid = getattr(cell_map, 'grid', None)
+        self.height = len(cell_map)
+        self.width = len(cell_map[0])
+
+        size = self.width * self.height
+        self.cost_so_far = array('l', [0]) * size
+        self.came_from = array('l', [-1]) * size
+        self.reached = array('l', [0]) * size # id of the last search that reached each cell
+        self.closed = array('l', [0]) * size # id of the last search that expanded each cell
+        self.search_id = 0
+        self.expansions = 0
+
+    def flat_cells(self):
+        """Walls bitmasks, costs and (lowest, highest) cost of every cell, straight from the arrays of a MazeGrid."""
+        walls, cost = flat_cells(self.cell_map)
+        if self.grid is not None:
+            return walls, cost, self.grid.cost_range()
+        return walls, cost, (min(cost), max(cost))
+
+    def search(self, start, goal):
+        """Lowest cost path from start to goal as a list of (x, y), raises KeyError if the goal can not be reached."""
+        walls, cost, (min_cost, max_cost) = self.flat_cells()
+        width, height = self.width, self.height
+        cost_so_far, came_from, reached, closed = self.cost_so_far, self.came_from, self.reached, self.closed
+
+        # Every move costs at least min_cost, the f of a neighbour is at most max_cost + min_cost above the current one
+        weight = min_cost
+        bucket_count = max_cost + min_cost + 1
+        buckets = [[] for _ in range(bucket_count)]
+
+        self.search_id += 1
+        search_id = self.search_id
+
+        gx, gy = goal
+        source = start[1] * width + start[0]
+        target = gy * width + gx
+
+        reached[source] = search_id
+        cost_so_far[source] = 0
+        came_from[source] = -1
+
+        f = weight * (abs(start[0] - gx) + abs(start[1] - gy))
+        buckets[f % bucket_count].append(source)
+        queued = 1
+
+        north, south, east, west = WALL_BITS
+
+        while queued:
+            bucket = buckets[f % bucket_count]
+            if not bucket:
+                f += 1
+                continue
+
+            i = bucket.pop()
+            queued -= 1
+            if closed[i] == search_id: continue  # Stale entry of a cell already expanded
+            closed[i] = search_id
+            self.expansions += 1
+
+            if i == target: break
+
+            x, y = i % width, i // width
+            g = cost_so_far[i]
+            cell_walls = walls[i]
+
+            for bit, nx, ny, j in ((north, x, y - 1, i - width), (south, x, y + 1, i + width),
+                                   (east, x + 1, y, i + 1), (west, x - 1, y, i - 1)):
+                if cell_walls & bit: continue  # Skip if there is a wall
+                if not (0 <= nx < width and 0 <= ny < height) or closed[j] == search_id: continue
+
+                new_cost = g + cost[j]
+                if reached[j] != search_id or new_cost < cost_so_far[j]:
+                    reached[j] = search_id
+                    cost_so_far[j] = new_cost
+                    came_from[j] = i
+                    buckets[(new_cost + weight * (abs(nx - gx) + abs(ny - gy))) % bucket_count].append(j)
+                    queued += 1
+
+        if reached[target] != search_id:
+            raise KeyError(goal)
+
+        path = []
+        i = target
+        while i != -1:
+            path.append((i % width, i // width))
+            i = came_from[i]
+        path.reverse()
+        return path
@@ -1,5 +1,12 @@
 import math
 
+from instrumentation import profiler, timed
+
+try:
+    import numpy as np
+except ImportError: # NumPy is optional, the scalar functions below are used without it
+    np = None
+
 def rgb_to_lab(rgb):
     """
     Convert an RGB color to Lab color space without using NumPy.
@@ -112,6 +119,7 @@ def deltaE_ciede2000(Lab1, Lab2):
 
     return delta_E
 
+@timed('color_detect.get_color_deltas')
 def get_color_deltas(imageArray, target_rgb, width=64, height=64, threshold=20):
     target_lab = rgb_to_lab(target_rgb)
 
@@ -129,6 +137,7 @@ def get_color_deltas(imageArray, target_rgb, width=64, height=64, threshold=20):
 
     return min(deltas) if deltas else None
 
+@timed('color_detect.is_color_exists')
 def is_color_exists(imageArray, target_rgb, width=64, height=64, threshold=10):
     target_lab = rgb_to_lab(target_rgb)
 
@@ -142,4 +151,596 @@ def is_color_exists(imageArray, target_rgb, width=64, height=64, threshold=10):
             if delta_E < threshold:
                 return True
 
-    return False
\ No newline at end of file
+    return False
+
+#----------------------------------------------
+# Batched color detection
+#----------------------------------------------
+
+def rgb_to_lab_array(pixels):
+    """
+    Convert an array of RGB colors to Lab color space in one pass.
+
+    :param pixels: NumPy array of shape (..., 3) in 0-255 range
+    :return: NumPy array of shape (..., 3) in Lab space
+    """
+    rgb = np.asarray(pixels, dtype=np.float64) / 255.0
+
+    rgb = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+    matrix = np.array([
+        [0.4124564 / 0.95047, 0.3575761 / 0.95047, 0.1804375 / 0.95047],
+        [0.2126729,           0.7151522,           0.0721750          ],
+        [0.0193339 / 1.08883, 0.1191920 / 1.08883, 0.9503041 / 1.08883],
+    ])
+    xyz = rgb @ matrix.T
+
+    xyz = np.where(xyz > (6/29)**3, np.cbrt(xyz), (xyz / (3 * (6/29)**2)) + (4/29))
+    fx, fy, fz = xyz[..., 0], xyz[..., 1], xyz[..., 2]
+
+    return np.stack(((116 * fy) - 16, 500 * (fx - fy), 200 * (fy - fz)), axis=-1)
+
+def deltaE_ciede2000_array(Lab1, Lab2):
+    """
+    Vectorized version of deltaE_ciede2000, the inputs are broadcast against each other.
+
+    :param Lab1: NumPy array of shape (..., 3) - First colors in Lab space
+    :param Lab2: NumPy array of shape (..., 3) - Second colors in Lab space
+    :return: NumPy array of ΔE2000 color differences
+    """
+    L1, a1, b1 = Lab1[..., 0], Lab1[..., 1], Lab1[..., 2]
+    L2, a2, b2 = Lab2[..., 0], Lab2[..., 1], Lab2[..., 2]
+
+    C1 = np.sqrt(a1**2 + b1**2)
+    C2 = np.sqrt(a2**2 + b2**2)
+    C_avg = (C1 + C2) / 2
+
+    G = 0.5 * (1 - np.sqrt((C_avg**7) / (C_avg**7 + 25**7)))
+
+    a1_prime = (1 + G) * a1
+    a2_prime = (1 + G) * a2
+
+    C1_prime = np.sqrt(a1_prime**2 + b1**2)
+    C2_prime = np.sqrt(a2_prime**2 + b2**2)
+
+    h1_prime = np.degrees(np.arctan2(b1, a1_prime)) % 360
+    h2_prime = np.degrees(np.arctan2(b2, a2_prime)) % 360
+
+    delta_L_prime = L2 - L1
+    delta_C_prime = C2_prime - C1_prime
+
+    delta_h_prime = h2_prime - h1_prime
+    delta_h_prime = np.where(np.abs(delta_h_prime) > 180,
+                             delta_h_prime + np.where(delta_h_prime < 0, 360, -360),
+                             delta_h_prime)
+
+    delta_H_prime = 2 * np.sqrt(C1_prime * C2_prime) * np.sin(np.radians(delta_h_prime) / 2)
+
+    L_avg_prime = (L1 + L2) / 2
+    C_avg_prime = (C1_prime + C2_prime) / 2
+
+    h_sum = h1_prime + h2_prime
+    h_avg_prime = np.where(np.abs(h1_prime - h2_prime) > 180,
+                           np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2),
+                           h_sum / 2)
+
+    T = 1 - 0.17 * np.cos(np.radians(h_avg_prime - 30)) + \
+        0.24 * np.cos(np.radians(2 * h_avg_prime)) + \
+        0.32 * np.cos(np.radians(3 * h_avg_prime + 6)) - \
+        0.20 * np.cos(np.radians(4 * h_avg_prime - 63))
+
+    SL = 1 + (0.015 * ((L_avg_prime - 50) ** 2)) / np.sqrt(20 + ((L_avg_prime - 50) ** 2))
+    SC = 1 + 0.045 * C_avg_prime
+    SH = 1 + 0.015 * C_avg_prime * T
+
+    delta_theta = 30 * np.exp(-((h_avg_prime - 275) / 25) ** 2)
+    RC = 2 * np.sqrt((C_avg_prime ** 7) / (C_avg_prime ** 7 + 25 ** 7))
+    RT = -RC * np.sin(np.radians(2 * delta_theta))
+
+    return np.sqrt(
+        (delta_L_prime / SL) ** 2 +
+        (delta_C_prime / SC) ** 2 +
+        (delta_H_prime / SH) ** 2 +
+        RT * (delta_C_prime / SC) * (delta_H_prime / SH)
+    )
+
+def image_pixels(imageArray, width=64, height=64):
+    """Flatten the scanned window of an image into a (width * height, 3) NumPy array."""
+    pixels = np.asarray(imageArray)[:height, :width, :3]
+    return pixels.reshape(-1, 3)
+
+def unique_color_codes(imageArray, width=64, height=64):
+    """Distinct pixel colors of the scanned window packed as 24-bit 0xRRGGBB codes."""
+    if np is None:
+        codes = set()
+        for y in range(height):
+            for x in range(width):
+                r, g, b = imageArray[y][x][:3]
+                codes.add((r << 16) | (g << 8) | b)
+        return sorted(codes)
+
+    pixels = image_pixels(imageArray, width, height)
+    return np.unique((pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2])
+
+def code_to_rgb(code):
+    return ((code >> 16) & 0xFF, (code >> 8) & 0xFF, code & 0xFF)
+
+#----------------------------------------------
+# Pre-filter
+#----------------------------------------------
+
+# SL is the largest at L' = 0 or 100, and x² + y² + RT·xy >= (1 - |RT| / 2)(x² + y²) with |RT| <= 2·sin(60°)
+SL_MAX = 1 + (0.015 * 50 ** 2) / math.sqrt(20 + 50 ** 2)
+RT_FACTOR = 1 - math.sin(math.radians(60))
+BOUND_MARGIN = 1e-9 # keeps float rounding from rejecting a pixel right at the threshold
+
+class DeltaEBounds:
+    """
+    Cheap lower bounds on the ΔE2000 from one target color, to reject pixels before the exact formula.
+
+    ΔE2000² >= (ΔL'/SL)² + RT_FACTOR·(ΔC'/SC)², which needs no trigonometry. With SL <= SL_MAX,
+    ΔL' alone also gives a fixed L window around the target, precomputed once per target.
+    """
+
+    def __init__(self, target_lab, threshold):
+        self.L, self.a, self.b = target_lab
+        self.C = math.sqrt(self.a**2 + self.b**2)
+        self.threshold_sq = (threshold * (1 + BOUND_MARGIN)) ** 2
+        self.L_min = self.L - threshold * (1 + BOUND_MARGIN) * SL_MAX
+        self.L_max = self.L + threshold * (1 + BOUND_MARGIN) * SL_MAX
+
+    def may_match(self, lab):
+        """Return False if the ΔE2000 between the target and this Lab color can not be under the threshold."""
+        L2, a2, b2 = lab
+        if L2 <= self.L_min or L2 >= self.L_max:
+            return False
+
+        L_avg_offset = (self.L + L2) / 2 - 50
+        SL = 1 + (0.015 * L_avg_offset ** 2) / math.sqrt(20 + L_avg_offset ** 2)
+        lower = ((L2 - self.L) / SL) ** 2
+        if lower >= self.threshold_sq:
+            return False
+
+        C_avg = (self.C + math.sqrt(a2**2 + b2**2)) / 2
+        G = 0.5 * (1 - math.sqrt((C_avg**7) / (C_avg**7 + 25**7)))
+        C1_prime = math.sqrt(((1 + G) * self.a)**2 + self.b**2)
+        C2_prime = math.sqrt(((1 + G) * a2)**2 + b2**2)
+        SC = 1 + 0.045 * (C1_prime + C2_prime) / 2
+
+        return lower + RT_FACTOR * ((C2_prime - C1_prime) / SC) ** 2 < self.threshold_sq
+
+def deltaE_lower_bound_sq_array(Lab1, Lab2):
+    """Vectorized DeltaEBounds lower bound on ΔE2000², the inputs are broadcast against each other."""
+    L1, a1, b1 = Lab1[..., 0], Lab1[..., 1], Lab1[..., 2]
+    L2, a2, b2 = Lab2[..., 0], Lab2[..., 1], Lab2[..., 2]
+
+    L_avg_offset = (L1 + L2) / 2 - 50
+    SL = 1 + (0.015 * L_avg_offset ** 2) / np.sqrt(20 + L_avg_offset ** 2)
+
+    C_avg = (np.sqrt(a1**2 + b1**2) + np.sqrt(a2**2 + b2**2)) / 2
+    G = 0.5 * (1 - np.sqrt((C_avg**7) / (C_avg**7 + 25**7)))
+    C1_prime = np.sqrt(((1 + G) * a1)**2 + b1**2)
+    C2_prime = np.sqrt(((1 + G) * a2)**2 + b2**2)
+    SC = 1 + 0.045 * (C1_prime + C2_prime) / 2
+
+    return ((L2 - L1) / SL) ** 2 + RT_FACTOR * ((C2_prime - C1_prime) / SC) ** 2
+
+def lab_box(lab_lo, lab_hi):
+    """
+    Ranges of L and C over the RGB box between two corners, from the Lab colors of its corners.
+
+    X, Y and Z grow with every channel, so f(X), f(Y), f(Z) over the box lie between their values at the
+    low and high corners (read back from the corners' Lab). L = 116·f(Y) - 16 is exact, a and b get
+    interval bounds, and C lies between the nearest and farthest points of the a, b rectangle.
+    """
+    L_lo, a_lo, b_lo = lab_lo
+    L_hi, a_hi, b_hi = lab_hi
+    fy_lo, fy_hi = (L_lo + 16) / 116, (L_hi + 16) / 116
+    fx_lo, fx_hi = fy_lo + a_lo / 500, fy_hi + a_hi / 500
+    fz_lo, fz_hi = fy_lo - b_lo / 200, fy_hi - b_hi / 200
+
+    a_min, a_max = 500 * (fx_lo - fy_hi), 500 * (fx_hi - fy_lo)
+    b_min, b_max = 200 * (fy_lo - fz_hi), 200 * (fy_hi - fz_lo)
+    C_min = math.hypot(max(a_min, -a_max, 0), max(b_min, -b_max, 0))
+    C_max = math.hypot(max(-a_min, a_max), max(-b_min, b_max))
+    return L_lo, L_hi, C_min, C_max
+
+def chroma_adaptation(C_avg):
+    """G factor of CIEDE2000, it shrinks as the average chroma grows."""
+    return 0.5 * (1 - math.sqrt((C_avg**7) / (C_avg**7 + 25**7)))
+
+def deltaE_box_lower_bound(target_lab, lab_lo, lab_hi):
+    """
+    Lower bound on the ΔE2000 between a target and every color of the RGB box between two corners.
+
+    DeltaEBounds' ΔE2000² >= (ΔL'/SL)² + RT_FACTOR·(ΔC'/SC)², taken at the worst point of the box's
+    L and C ranges (lab_box): SL grows with |L̄' - 50|, G falls with C̄, C' lies between C and (1 + G)·C,
+    and |ΔC'|/SC grows with the gap between the two C'.
+    """
+    L1, a1, b1 = target_lab
+    L_lo, L_hi, C_min, C_max = lab_box(lab_lo, lab_hi)
+
+    delta_L = max(L_lo - L1, L1 - L_hi, 0)
+    L_avg_offset = max(abs((L1 + L_lo) / 2 - 50), abs((L1 + L_hi) / 2 - 50))
+    SL = 1 + (0.015 * L_avg_offset ** 2) / math.sqrt(20 + L_avg_offset ** 2)
+
+    C1 = math.sqrt(a1**2 + b1**2)
+    G_min, G_max = chroma_adaptation((C1 + C_max) / 2), chroma_adaptation((C1 + C_min) / 2)
+    C1_lo, C1_hi = math.hypot((1 + G_min) * a1, b1), math.hypot((1 + G_max) * a1, b1)
+    C2_lo, C2_hi = C_min, (1 + G_max) * C_max
+    if C2_lo > C1_hi:
+        delta_C = (C2_lo - C1_hi) / (1 + 0.045 * (C1_hi + C2_lo) / 2)
+    elif C1_lo > C2_hi:
+        delta_C = (C1_lo - C2_hi) / (1 + 0.045 * (C1_lo + C2_hi) / 2)
+    else:
+        delta_C = 0.0
+
+    return math.sqrt((delta_L / SL) ** 2 + RT_FACTOR * delta_C ** 2) / (1 + BOUND_MARGIN)
+
+def deltaE_box_lower_bound_array(Lab1, Lab_lo, Lab_hi):
+    """Vectorized deltaE_box_lower_bound, the targets and the box corners are broadcast against each other."""
+    L1, a1, b1 = Lab1[..., 0], Lab1[..., 1], Lab1[..., 2]
+    L_lo, L_hi = Lab_lo[..., 0], Lab_hi[..., 0]
+    fy_lo, fy_hi = (L_lo + 16) / 116, (L_hi + 16) / 116
+    fx_lo, fx_hi = fy_lo + Lab_lo[..., 1] / 500, fy_hi + Lab_hi[..., 1] / 500
+    fz_lo, fz_hi = fy_lo - Lab_lo[..., 2] / 200, fy_hi - Lab_hi[..., 2] / 200
+
+    a_min, a_max = 500 * (fx_lo - fy_hi), 500 * (fx_hi - fy_lo)
+    b_min, b_max = 200 * (fy_lo - fz_hi), 200 * (fy_hi - fz_lo)
+    C_min = np.hypot(np.maximum(np.maximum(a_min, -a_max), 0), np.maximum(np.maximum(b_min, -b_max), 0))
+    C_max = np.hypot(np.maximum(-a_min, a_max), np.maximum(-b_min, b_max))
+
+    delta_L = np.maximum(np.maximum(L_lo - L1, L1 - L_hi), 0)
+    L_avg_offset = np.maximum(np.abs((L1 + L_lo) / 2 - 50), np.abs((L1 + L_hi) / 2 - 50))
+    SL = 1 + (0.015 * L_avg_offset ** 2) / np.sqrt(20 + L_avg_offset ** 2)
+
+    C1 = np.sqrt(a1**2 + b1**2)
+    C_avg_max, C_avg_min = (C1 + C_max) / 2, (C1 + C_min) / 2
+    G_min = 0.5 * (1 - np.sqrt((C_avg_max**7) / (C_avg_max**7 + 25**7)))
+    G_max = 0.5 * (1 - np.sqrt((C_avg_min**7) / (C_avg_min**7 + 25**7)))
+    C1_lo, C1_hi = np.hypot((1 + G_min) * a1, b1), np.hypot((1 + G_max) * a1, b1)
+    C2_lo, C2_hi = C_min, (1 + G_max) * C_max
+    delta_C = np.maximum(np.maximum(C2_lo - C1_hi, 0) / (1 + 0.045 * (C1_hi + C2_lo) / 2),
+                         np.maximum(C1_lo - C2_hi, 0) / (1 + 0.045 * (C1_lo + C2_hi) / 2))
+
+    return np.sqrt((delta_L / SL) ** 2 + RT_FACTOR * delta_C ** 2) / (1 + BOUND_MARGIN)
+
+def color_codes_deltas(codes, targets, threshold=None):
+    """
+    Compute the ΔE2000 between each color code and each target color.
+
+    :param codes: Sequence of 0xRRGGBB color codes
+    :param targets: Sequence of target (R, G, B) tuples
+    :param threshold: If given, pairs that can not be under it are rejected by the pre-filter
+                      and reported as infinity instead of running the exact formula
+    :return: One row of ΔE2000 per code, with one column per target
+    """
+    if np is None:
+        targets_lab = [rgb_to_lab(target_rgb) for target_rgb in targets]
+        if threshold is None:
+            return [[deltaE_ciede2000(target_lab, rgb_to_lab(code_to_rgb(code))) for target_lab in targets_lab] for code in codes]
+
+        bounds = [DeltaEBounds(target_lab, threshold) for target_lab in targets_lab]
+        rows = []
+        for code in codes:
+            color_lab = rgb_to_lab(code_to_rgb(code))
+            rows.append([deltaE_ciede2000(target_lab, color_lab) if bound.may_match(color_lab) else math.inf
+                         for target_lab, bound in zip(targets_lab, bounds)])
+        return rows
+
+    codes = np.asarray(codes, dtype=np.uint32)
+    colors = np.stack(((codes >> 16) & 0xFF, (codes >> 8) & 0xFF, codes & 0xFF), axis=-1)
+
+    colors_lab = rgb_to_lab_array(colors)
+    targets_lab = rgb_to_lab_array(np.asarray(targets, dtype=np.float64))
+
+    if threshold is None:
+        return deltaE_ciede2000_array(targets_lab[None, :, :], colors_lab[:, None, :])
+
+    # Only run the exact formula on the (color, target) pairs that survive the pre-filter
+    survivors = deltaE_lower_bound_sq_array(targets_lab[None, :, :], colors_lab[:, None, :]) < (threshold * (1 + BOUND_MARGIN)) ** 2
+    color_index, target_index = np.nonzero(survivors)
+
+    deltas = np.full(survivors.shape, np.inf)
+    deltas[color_index, target_index] = deltaE_ciede2000_array(targets_lab[target_index], colors_lab[color_index])
+    return deltas
+
+def min_color_deltas(imageArray, targets, width=64, height=64, lut=None, threshold=None):
+    """
+    Compute the minimum ΔE2000 between any pixel of the image and each target color.
+
+    Each distinct pixel color is converted to Lab once and all targets are scored in a single
+    pass, instead of one full scan per target as get_color_deltas / is_color_exists do.
+
+    :param imageArray: Image indexed as imageArray[y][x] -> (R, G, B)
+    :param targets: Sequence of target (R, G, B) tuples
+    :param lut: Optional color_lut.ColorLUT built for the same targets (and a threshold at least as large), to reuse deltas between frames
+    :param threshold: Pre-filter threshold, minimums that are not under it may be reported as infinity
+    :return: List with the minimum ΔE2000 for each target
+    """
+    codes = unique_color_codes(imageArray, width, height)
+
+    if lut is not None:
+        deltas = lut.deltas(codes, threshold)
+    else:
+        deltas = color_codes_deltas(codes, targets, threshold)
+
+    if np is None or lut is not None:
+        return [min(column) for column in zip(*deltas)]
+    return [float(delta) for delta in deltas.min(axis=0)]
+
+@timed('color_detect.get_colors_deltas')
+def get_colors_deltas(imageArray, targets, width=64, height=64, threshold=20, lut=None):
+    """Batched get_color_deltas, returns the minimum ΔE2000 under the threshold (or None) for each target."""
+    return [delta if delta < threshold else None for delta in min_color_deltas(imageArray, targets, width, height, lut, threshold)]
+
+@timed('color_detect.are_colors_exist')
+def are_colors_exist(imageArray, targets, width=64, height=64, threshold=10, lut=None):
+    """Batched is_color_exists, returns whether any pixel is under the threshold for each target."""
+    return [delta < threshold for delta in min_color_deltas(imageArray, targets, width, height, lut, threshold)]
+
+#----------------------------------------------
+# Single pass palette scan
+#----------------------------------------------
+
+class ColorMatch:
+    """Pixels of a scan that are under the threshold for one palette color."""
+
+    def __init__(self):
+        self.min_delta = None
+        self.count = 0
+        self.x_sum = 0
+        self.y_sum = 0
+
+    def add(self, delta, x, y, count=1):
+        """Add a matching pixel, or count of them at once with x and y being the sums of their coordinates."""
+        if self.min_delta is None or delta < self.min_delta:
+            self.min_delta = delta
+        self.count += count
+        self.x_sum += x
+        self.y_sum += y
+
+    def centroid(self):
+        if self.count == 0:
+            return None
+        return (self.x_sum / self.count, self.y_sum / self.count)
+
+@timed('color_detect.scan_palette')
+def scan_palette(imageArray, palette, width=64, height=64, threshold=20, stride=1, roi=None, stop_count=None, lut=None, block_rows=8):
+    """
+    Scan an image once for every color of a palette.
+
+    :param imageArray: Image indexed as imageArray[y][x] -> (R, G, B)
+    :param palette: Sequence of target (R, G, B) tuples (see colors.py)
+    :param threshold: ΔE2000 under which a pixel matches a palette color
+    :param stride: Only every stride-th pixel of every stride-th row is scanned
+    :param roi: Region (x_min, y_min, x_max, y_max) to scan, the whole image by default
+    :param stop_count: Stop the scan as soon as one palette color has this many matching pixels
+    :param lut: Optional color_lut.ColorLUT built for the same palette (and a threshold at least as large)
+    :param block_rows: Rows scanned at once with NumPy, early exits are checked between blocks
+    :return: One ColorMatch (min delta, pixel count and centroid) per palette color
+    """
+    x_min, y_min, x_max, y_max = roi if roi is not None else (0, 0, width, height)
+    matches = [ColorMatch() for _ in palette]
+
+    if np is None:
+        row_cache = {}
+        for y in range(y_min, y_max, stride):
+            for x in range(x_min, x_max, stride):
+                r, g, b = imageArray[y][x][:3]
+                code = (r << 16) | (g << 8) | b
+
+                row = row_cache.get(code)
+                if row is None:
+                    row = lut.deltas((code,), threshold)[0] if lut is not None else color_codes_deltas((code,), palette, threshold)[0]
+                    row_cache[code] = row
+
+                matched = False
+                for match, delta in zip(matches, row):
+                    if delta < threshold:
+                        match.add(delta, x, y)
+                        matched = True
+
+                if matched and stop_count is not None and any(match.count >= stop_count for match in matches):
+                    return matches
+        return matches
+
+    pixels = np.asarray(imageArray)[y_min:y_max:stride, x_min:x_max:stride, :3]
+    xs = np.arange(x_min, x_max, stride)[:pixels.shape[1]]
+
+    for block_start in range(0, pixels.shape[0], block_rows):
+        block = pixels[block_start:block_start + block_rows].reshape(-1, 3)
+        codes, inverse = np.unique((block[:, 0].astype(np.uint32) << 16) | (block[:, 1].astype(np.uint32) << 8) | block[:, 2], return_inverse=True)
+
+        deltas = np.asarray(lut.deltas(codes, threshold)) if lut is not None else color_codes_deltas(codes, palette, threshold)
+        deltas = deltas[inverse.reshape(-1)]
+        under = deltas < threshold
+
+        rows = min(block_rows, pixels.shape[0] - block_start)
+        block_xs = np.tile(xs, rows)
+        block_ys = np.repeat(y_min + (block_start + np.arange(rows)) * stride, len(xs))
+
+        for i, match in enumerate(matches):
+            mask = under[:, i]
+            count = int(mask.sum())
+            if count:
+                match.add(float(deltas[mask, i].min()), int(block_xs[mask].sum()), int(block_ys[mask].sum()), count)
+
+        if stop_count is not None and any(match.count >= stop_count for match in matches):
+            break
+
+    return matches
+
+
+#----------------------------------------------
+# Coarse-to-fine detection
+#----------------------------------------------
+
+class CoarseToFine:
+    """
+    Color detection that bounds whole tiles of the frame first and scores single pixels only where it matters.
+
+    The frame is cut into blocks x blocks tiles (8x8 pixels each on a 64x64 camera). Each tile gets a
+    lower bound on the ΔE2000 of its pixels to each target from its per-channel min / max box
+    (deltaE_box_lower_bound), and one of its pixels is scored exactly. Tiles are refined (every
+    distinct pixel color in them scored exactly, as min_color_deltas does) by lowest bound first, only
+    while the bounds leave the decision open: a target that may come closer than the closest one found,
+    or the closest one being on either side of the threshold. A single color tile is exact already.
+
+    The decisions (closest target under the threshold, any pixel under the threshold for a target) are
+    the full scan's. The reported deltas are the closest pixels found, which may be larger than the full
+    scan's for targets that did not decide anything.
+    """
+
+    REFINE_BATCH = 4 # tiles refined first while a decision is open, before all the other candidates
+
+    def __init__(self, blocks=8):
+        self.blocks = blocks
+
+        self.frames = 0
+        self.scored_blocks = 0
+        self.refined_blocks = 0
+        self.full_scans = 0 # frames that can not be cut into tiles
+
+    def tiles(self, imageArray, width, height):
+        """
+        Pixels of each tile, tile i being at row i // blocks and column i % blocks of the grid: with NumPy a
+        (tiles, 3, pixels) array (the channels of a tile are contiguous, which makes the min / max several
+        times faster), else a list of lists of (R, G, B).
+        """
+        block_width, block_height = width // self.blocks, height // self.blocks
+        if np is not None:
+            pixels = np.asarray(imageArray)[:height, :width, :3]
+            tiles = pixels.reshape(self.blocks, block_height, self.blocks, block_width, 3).transpose(0, 2, 4, 1, 3)
+            return np.ascontiguousarray(tiles).reshape(self.blocks * self.blocks, 3, block_width * block_height)
+
+        tiles = [[] for _ in range(self.blocks * self.blocks)]
+        for y in range(height):
+            row = imageArray[y]
+            first_tile = (y // block_height) * self.blocks
+            for x in range(width):
+                tiles[first_tile + x // block_width].append(tuple(row[x][:3]))
+        return tiles
+
+    def tile_bounds(self, tiles, targets, threshold, lut):
+        """
+        Lower bound rows of each tile, exact rows of the first pixel of each tile and which tiles hold a single color.
+        Pre-filtered pairs are infinite, their pixels are over the threshold and never take part in a decision.
+        """
+        if np is not None:
+            lows, highs = tiles.min(axis=2), tiles.max(axis=2)
+            targets_lab = rgb_to_lab_array(np.asarray(targets, dtype=np.float64))
+            lower = deltaE_box_lower_bound_array(targets_lab[None, :, :], rgb_to_lab_array(lows)[:, None, :], rgb_to_lab_array(highs)[:, None, :])
+            firsts = tiles[:, :, 0].astype(np.uint32)
+            codes, inverse = np.unique((firsts[:, 0] << 16) | (firsts[:, 1] << 8) | firsts[:, 2], return_inverse=True)
+            deltas = lut.deltas(codes, threshold) if lut is not None else color_codes_deltas(codes, targets, threshold)
+            return lower.tolist(), np.asarray(deltas)[inverse.reshape(-1)].tolist(), (lows == highs).all(axis=1).tolist()
+
+        targets_lab = [rgb_to_lab(target_rgb) for target_rgb in targets]
+        lower, codes, uniform = [], [], []
+        for tile in tiles:
+            channels = list(zip(*tile))
+            low, high = tuple(min(channel) for channel in channels), tuple(max(channel) for channel in channels)
+            lab_lo, lab_hi = rgb_to_lab(low), rgb_to_lab(high)
+            lower.append([deltaE_box_lower_bound(target_lab, lab_lo, lab_hi) for target_lab in targets_lab])
+            r, g, b = tile[0]
+            codes.append((r << 16) | (g << 8) | b)
+            uniform.append(low == high)
+        distinct = sorted(set(codes))
+        deltas = lut.deltas(distinct, threshold) if lut is not None else color_codes_deltas(distinct, targets, threshold)
+        rows = dict(zip(distinct, deltas))
+        return lower, [list(rows[code]) for code in codes], uniform
+
+    def exact_minimums(self, tiles, indices, targets, threshold, lut):
+        """Minimum ΔE2000 for each target over the distinct pixel colors of some tiles."""
+        if not indices:
+            return [math.inf] * len(targets)
+        self.refined_blocks += len(indices)
+        profiler.count('color_detect.coarse.refined_blocks', len(indices))
+        if np is None:
+            codes = sorted({(r << 16) | (g << 8) | b for i in indices for r, g, b in tiles[i]})
+            deltas = lut.deltas(codes, threshold) if lut is not None else color_codes_deltas(codes, targets, threshold)
+            return [min(column) for column in zip(*deltas)]
+
+        pixels = tiles[indices].transpose(0, 2, 1).reshape(-1, 3)
+        codes = np.unique((pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2])
+        deltas = np.asarray(lut.deltas(codes, threshold)) if lut is not None else color_codes_deltas(codes, targets, threshold)
+        return deltas.min(axis=0).tolist()
+
+    def score(self, imageArray, targets, width, height, threshold, lut):
+        """Tiles, their lower bound rows, indices of the tiles left to refine and the closest pixels found, None if the frame does not tile."""
+        if width % self.blocks or height % self.blocks:
+            self.full_scans += 1
+            return None
+        self.frames += 1
+        tiles = self.tiles(imageArray, width, height)
+        lower, rows, uniform = self.tile_bounds(tiles, targets, threshold, lut)
+        self.scored_blocks += len(rows)
+        found = [min(column) for column in zip(*rows)]
+        return tiles, lower, {i for i, single_color in enumerate(uniform) if not single_color}, found
+
+    def refine(self, tiles, lower, unrefined, found, involved, targets, threshold, lut, limit=None):
+        """
+        Refine the unrefined tiles with the lowest bounds for the involved targets, at most limit of them.
+
+        :return: the closest pixels found with the refined tiles, None when no unrefined tile can hold a pixel under the threshold for them
+        """
+        def bound(i):
+            return min(lower[i][t] for t in involved)
+        indices = sorted((i for i in unrefined if bound(i) < threshold), key=bound)[:limit]
+        if not indices:
+            return None
+        unrefined.difference_update(indices)
+        return [min(a, b) for a, b in zip(found, self.exact_minimums(tiles, indices, targets, threshold, lut))]
+
+    def lower_bounds(self, lower, unrefined, found, count):
+        """Lower bound on the minimum of each target over the whole frame."""
+        return [min(found[t], min((lower[i][t] for i in unrefined), default=math.inf)) for t in range(count)]
+
+    @timed('color_detect.coarse_colors_deltas')
+    def colors_deltas(self, imageArray, targets, width=64, height=64, threshold=20, lut=None):
+        """get_colors_deltas with the same closest target under the threshold."""
+        scored = self.score(imageArray, targets, width, height, threshold, lut)
+        if scored is None:
+            return get_colors_deltas(imageArray, targets, width, height, threshold, lut)
+        tiles, lower, unrefined, found = scored
+
+        # The few closest tiles usually settle it, the other candidates are refined together after them
+        limit = self.REFINE_BATCH
+        while True:
+            bounds = self.lower_bounds(lower, unrefined, found, len(targets))
+            best = min(range(len(targets)), key=found.__getitem__)
+            # Targets that may still come closer than the best one, or the best one being too close to the threshold to tell
+            contested = [t for t in range(len(targets)) if t != best and bounds[t] < min(found[best], threshold)]
+            if not contested and not bounds[best] < threshold <= found[best]:
+                break
+            refined = self.refine(tiles, lower, unrefined, found, contested + [best], targets, threshold, lut, limit)
+            if refined is None:
+                break
+            found, limit = refined, None
+
+        return [delta if delta < threshold else None for delta in found]
+
+    @timed('color_detect.coarse_colors_exist')
+    def colors_exist(self, imageArray, targets, width=64, height=64, threshold=10, lut=None):
+        """are_colors_exist with the same results."""
+        scored = self.score(imageArray, targets, width, height, threshold, lut)
+        if scored is None:
+            return are_colors_exist(imageArray, targets, width, height, threshold, lut)
+        tiles, lower, unrefined, found = scored
+
+        exists = []
+        for t in range(len(targets)):
+            limit = self.REFINE_BATCH
+            while not found[t] < threshold:
+                refined = self.refine(tiles, lower, unrefined, found, [t], targets, threshold, lut, limit)
+                if refined is None:
+                    break
+                found, limit = refined, None
+            exists.append(found[t] < threshold)
+
+        return exists
+
+    def stats(self):
+        return {'frames': self.frames, 'scored_blocks': self.scored_blocks, 'refined_blocks': self.refined_blocks,
+                'refined_share': self.refined_blocks / self.scored_blocks if self.scored_blocks else 0.0, 'full_scans': self.full_scans}
@@ -0,0 +1,147 @@
+import math
+import os
+import struct
+from array import array
+
+from color_detect import color_codes_deltas
+
+LUT_DIRECTORY = os.path.dirname(os.path.abspath(__file__)) # next to colors.py, where the competition controller keeps its tables
+LUT_MAGIC = b'CLUT'
+LUT_VERSION = 2
+LUT_HEADER = '<4sBBId' # magic, version, target count, entry count, threshold (infinity when None)
+
+class ColorLUT:
+    """
+    Lazily built lookup table from exact RGB colors to their ΔE2000 against a fixed palette.
+
+    Colors are keyed by their 24-bit 0xRRGGBB code. A color is converted to Lab and scored
+    against the palette only the first time it is seen, afterwards it is a dict lookup.
+    The table can be saved to and loaded from a compact binary file so a controller restart
+    does not rebuild it.
+
+    With a threshold, new colors go through the pre-filter of color_codes_deltas: the deltas that
+    are not under it are stored as infinity, and the table only answers queries up to that threshold.
+    """
+
+    def __init__(self, targets, max_entries=1 << 20, threshold=None):
+        self.targets = tuple(tuple(target) for target in targets)
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.table = {} # color code -> tuple of ΔE2000, one per target
+        self.hits = 0
+        self.misses = 0
+
+    def deltas(self, codes, threshold=None):
+        """Return one row of ΔE2000 per color code, with one column per target (infinity when not under the table's threshold)."""
+        if self.threshold is not None and (threshold is None or threshold > self.threshold):
+            raise ValueError(f'color LUT built for a threshold of {self.threshold} can not answer a threshold of {threshold}')
+        rows = []
+        missing = []
+        for code in codes:
+            row = self.table.get(int(code))
+            if row is None:
+                missing.append(int(code))
+            rows.append(row)
+
+        self.hits += len(rows) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = {code: tuple(float(delta) for delta in row) for code, row in zip(missing, color_codes_deltas(missing, self.targets, self.threshold))}
+            if len(self.table) < self.max_entries:
+                self.table.update(computed)
+            rows = [row if row is not None else computed[int(code)] for code, row in zip(codes, rows)]
+
+        return rows
+
+    def classify(self, rgb, threshold=20):
+        """Return the index of the closest target under the threshold, or -1 if there is none."""
+        r, g, b = rgb[:3]
+        row = self.deltas(((r << 16) | (g << 8) | b,), threshold)[0]
+        index = min(range(len(row)), key=row.__getitem__)
+        return index if row[index] < threshold else -1
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'entries': len(self.table), 'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate()}
+
+    #----------------------------------------------
+    # Persistence
+    #----------------------------------------------
+
+    def save(self, file):
+        """
+        Write the table as: header (magic, version, target count, entry count, threshold), the targets as RGB bytes,
+        the color codes as uint32 and the deltas as float64.
+        """
+        codes = array('I', self.table.keys())
+        deltas = array('d', (delta for row in self.table.values() for delta in row))
+
+        # Written aside then renamed, so controllers saving the same table at once (batch runs) never mix their files
+        # and a controller killed while saving leaves the previous table in place
+        temporary_file = f'{file}.{os.getpid()}.tmp'
+        try:
+            with open(temporary_file, 'wb') as f:
+                f.write(struct.pack(LUT_HEADER, LUT_MAGIC, LUT_VERSION, len(self.targets), len(codes),
+                                    math.inf if self.threshold is None else self.threshold))
+                f.write(bytes(channel for target in self.targets for channel in target))
+                f.write(codes.tobytes())
+                f.write(deltas.tobytes())
+            os.replace(temporary_file, file)
+        except BaseException:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+            raise
+
+    @classmethod
+    def load(cls, file, targets, max_entries=1 << 20, threshold=None):
+        """
+        Load a saved table. An empty one is returned if the file is missing, was built for other targets
+        or another threshold, or is not a whole table (truncated or corrupted).
+        """
+        lut = cls(targets, max_entries, threshold)
+        if not os.path.exists(file):
+            return lut
+
+        with open(file, 'rb') as f:
+            data = f.read()
+
+        try:
+            magic, version, target_count, entry_count, saved_threshold = struct.unpack_from(LUT_HEADER, data)
+        except struct.error:
+            return lut
+        if magic != LUT_MAGIC or version != LUT_VERSION:
+            return lut
+        if saved_threshold != (math.inf if threshold is None else threshold):
+            return lut
+
+        offset = struct.calcsize(LUT_HEADER)
+        if len(data) != offset + 3 * target_count + (4 + 8 * target_count) * entry_count:
+            return lut
+
+        saved_targets = tuple(tuple(data[offset + 3 * i:offset + 3 * i + 3]) for i in range(target_count))
+        if saved_targets != lut.targets:
+            return lut
+        offset += 3 * target_count
+
+        codes = array('I')
+        deltas = array('d')
+        try:
+            codes.frombytes(data[offset:offset + 4 * entry_count])
+            offset += 4 * entry_count
+            deltas.frombytes(data[offset:offset + 8 * entry_count * target_count])
+        except ValueError:
+            return lut
+        if len(codes) != entry_count or len(deltas) != entry_count * target_count:
+            return lut
+
+        for i, code in enumerate(codes):
+            lut.table[code] = tuple(deltas[i * target_count:(i + 1) * target_count])
+
+        return lut
+
+def lut_file(name, directory):
+    return os.path.join(directory, name + '.lut')
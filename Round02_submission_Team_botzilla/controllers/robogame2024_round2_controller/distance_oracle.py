@@ -0,0 +1,114 @@
+import heapq
+from maze import DIRECTIONS
+from maze_grid import WALL_BITS, flat_cells
+from instrumentation import profiler, timed
+
+class DistanceOracle:
+    """
+    Cached shortest paths between the key points (entrance, survivors, exit) of a cell map.
+
+    One Dijkstra search is run per source point and stopped once every key point is settled,
+    so the cost between two key points is a dict lookup afterwards. Costs are the same as
+    AStarSolver.a_star: the sum of Cell.get_cost() of every cell entered.
+    """
+
+    def __init__(self, cell_map, key_points=()):
+        self.cell_map = cell_map
+        self.rows = len(cell_map)
+        self.cols = len(cell_map[0])
+        self.key_points = set()
+        self.searches = {} # source -> (settled costs, came_from, complete)
+        self.search_count = 0
+        self.set_key_points(key_points)
+
+    def set_key_points(self, key_points):
+        key_points = set(key_points)
+        if not key_points <= self.key_points:
+            # Searches stopped before settling the new key points have to be extended
+            self.searches = {source: search for source, search in self.searches.items() if search[2]}
+        self.key_points |= key_points
+
+    @timed('planning.distance_oracle')
+    def search(self, source, targets=None):
+        """Dijkstra search from the source, stopped once all targets are settled (or the whole map if None)."""
+        pending = set(targets) if targets is not None else None
+        settled = {}
+        came_from = {source: None}
+        cost_so_far = {source: 0}
+        pq = [(0, source)]
+
+        # Walls and costs are read from the flat arrays (copied on every search from a list of Cell objects)
+        walls, cost = flat_cells(self.cell_map)
+        cols, rows = self.cols, self.rows
+        steps = [(bit, dx, dy, dy * cols + dx) for bit, (dx, dy) in zip(WALL_BITS, DIRECTIONS)]
+
+        while pq:
+            current_cost, current = heapq.heappop(pq)
+            if current in settled: continue
+            settled[current] = current_cost
+
+            if pending is not None:
+                pending.discard(current)
+                if not pending: break
+
+            x, y = current
+            i = y * cols + x
+            cell_walls = walls[i]
+
+            for bit, dx, dy, step in steps:
+                if cell_walls & bit: continue  # Skip if there is a wall
+
+                nx, ny = x + dx, y + dy
+                neighbour = (nx, ny)
+
+                if 0 <= nx < cols and 0 <= ny < rows and neighbour not in settled:
+                    new_cost = current_cost + cost[i + step]
+
+                    if neighbour not in cost_so_far or new_cost < cost_so_far[neighbour]:
+                        cost_so_far[neighbour] = new_cost
+                        came_from[neighbour] = current
+                        heapq.heappush(pq, (new_cost, neighbour))
+
+        self.search_count += 1
+        profiler.count('planning.distance_oracle.settled', len(settled))
+        complete = not pq or pending is None
+        self.searches[source] = (settled, came_from, complete)
+        return self.searches[source]
+
+    def search_from(self, source, target):
+        search = self.searches.get(source)
+        if search is None:
+            search = self.search(source, self.key_points | {target})
+        elif target not in search[0] and not search[2]:
+            search = self.search(source)
+        return search
+
+    def cost(self, start, goal):
+        """Lowest cost from start to goal, infinity if the goal can not be reached."""
+        return self.search_from(start, goal)[0].get(goal, float('inf'))
+
+    def path(self, start, goal):
+        """Lowest cost path from start to goal (both included), None if the goal can not be reached."""
+        settled, came_from, _ = self.search_from(start, goal)
+        if goal not in settled:
+            return None
+
+        path = []
+        current = goal
+        while current is not None:
+            path.append(current)
+            current = came_from[current]
+        path.reverse()
+        return path
+
+    def cost_matrix(self, points):
+        """Costs between every pair of points, as cost_matrix[i][j] from points[i] to points[j]."""
+        self.set_key_points(points)
+        return [[self.cost(a, b) for b in points] for a in points]
+
+    def invalidate_cell(self, x, y):
+        """Forget the searches that reached a cell, to be called when its walls or damage change."""
+        self.searches = {source: search for source, search in self.searches.items() if (x, y) not in search[1]}
+
+    def invalidate(self):
+        self.searches = {}
@@ -0,0 +1,188 @@
+import heapq
+from maze import DIRECTIONS
+from maze_grid import WALL_BITS, flat_cells, copy_cell
+from instrumentation import timed
+
+INF = float('inf')
+
+class DStarLite:
+    """
+    Incremental shortest path from a moving start to a fixed goal (D* Lite, Koenig & Likhachev).
+
+    The search runs backward from the goal and keeps its state between plans: when a cell changes
+    (update_cell, for example as a Maze cell listener) only the cells whose cost to the goal
+    depends on it are searched again by the next compute_path(). Costs are the same as
+    AStarSolver.a_star: the sum of Cell.get_cost() of every cell entered, walls are read from the
+    cell being left.
+
+    D* Lite needs positive edge costs (zero cost cells could keep each other's stale costs up), so
+    the search runs on cost * scale + 1 with scale larger than any path length: edge costs are
+    positive, the cost of a path is its search cost // scale, and among paths of equal cost the
+    one with the fewest moves is taken. The Manhattan heuristic is weighted by the lowest edge cost.
+    """
+
+    def __init__(self, cell_map, start, goal):
+        self.cell_map = cell_map
+        self.rows = len(cell_map)
+        self.cols = len(cell_map[0])
+        self.cell_walls, self.cell_costs = flat_cells(cell_map)  # walls bitmask / cost by y * cols + x, the arrays of a MazeGrid
+        # (wall bit, dx, dy, index step) of the four directions
+        self.steps = [(bit, dx, dy, dy * self.cols + dx) for bit, (dx, dy) in zip(WALL_BITS, DIRECTIONS)]
+        self.scale = self.rows * self.cols
+        self.start = start
+        self.goal = goal
+        self.expansions = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the search state, the next compute_path() is a full search."""
+        self.weight = self.min_cost() * self.scale + 1
+        self.last_start = self.start
+        self.km = 0
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        self.queue = [] # (key, cell) entries, only valid while queued[cell] == key
+        self.queued = {}
+        self.push(self.goal)
+
+    def min_cost(self):
+        grid = getattr(self.cell_map, 'grid', None)
+        if grid is not None:
+            return grid.cost_range()[0]
+        return min(self.cell_costs)
+
+    def edge_cost(self, cell):
+        """Search cost of entering a cell."""
+        return self.cell_costs[cell[1] * self.cols + cell[0]] * self.scale + 1
+
+    def heuristic(self, a, b):
+        return self.weight * (abs(a[0] - b[0]) + abs(a[1] - b[1]))
+
+    def key(self, cell):
+        g = min(self.g.get(cell, INF), self.rhs.get(cell, INF))
+        return (g + self.heuristic(self.start, cell) + self.km, g)
+
+    def push(self, cell):
+        key = self.key(cell)
+        self.queued[cell] = key
+        heapq.heappush(self.queue, (key, cell))
+
+    def top(self):
+        """Lowest valid queue entry, stale entries are dropped on the way."""
+        while self.queue:
+            key, cell = self.queue[0]
+            if self.queued.get(cell) == key:
+                return key, cell
+            heapq.heappop(self.queue)
+        return (INF, INF), None
+
+    #----------------------------------------------
+    # Graph
+    #----------------------------------------------
+
+    def successors(self, cell):
+        x, y = cell
+        cell_walls = self.cell_walls[y * self.cols + x]
+        for bit, dx, dy, _ in self.steps:
+            if cell_walls & bit: continue  # Skip if there is a wall
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.cols and 0 <= ny < self.rows:
+                yield (nx, ny)
+
+    def predecessors(self, cell):
+        x, y = cell
+        walls, i = self.cell_walls, y * self.cols + x
+        for bit, dx, dy, step in self.steps:
+            nx, ny = x - dx, y - dy
+            if 0 <= nx < self.cols and 0 <= ny < self.rows and not walls[i - step] & bit:
+                yield (nx, ny)
+
+    #----------------------------------------------
+    # Search
+    #----------------------------------------------
+
+    def update_vertex(self, cell):
+        if cell != self.goal:
+            g = self.g
+            self.rhs[cell] = min((self.edge_cost(successor) + g.get(successor, INF) for successor in self.successors(cell)), default=INF)
+        self.queued.pop(cell, None)
+        if self.g.get(cell, INF) != self.rhs.get(cell, INF):
+            self.push(cell)
+
+    @timed('planning.dstar_lite')
+    def compute_shortest_path(self):
+        g, rhs = self.g, self.rhs
+        while True:
+            top_key, cell = self.top()
+            start = self.start
+            if cell is None or (top_key >= self.key(start) and rhs.get(start, INF) == g.get(start, INF)):
+                break
+
+            new_key = self.key(cell)
+            if top_key < new_key:
+                self.push(cell)
+                continue
+
+            del self.queued[cell]
+            heapq.heappop(self.queue)
+            self.expansions += 1
+
+            if g.get(cell, INF) > rhs.get(cell, INF):
+                g[cell] = rhs[cell]
+            else:
+                g[cell] = INF
+                self.update_vertex(cell)
+            for predecessor in self.predecessors(cell):
+                self.update_vertex(predecessor)
+
+    def cost(self):
+        """Cost from the start to the goal of the last computed path, infinity if the goal can not be reached."""
+        g = self.g.get(self.start, INF)
+        return g if g == INF else g // self.scale
+
+    def path(self):
+        """
+        Lowest cost path from the start to the goal (both included), None if the goal can not be reached.
+
+        From every cell the successor minimizing edge_cost(next) + g(next) is followed.
+        """
+        if self.cost() == INF:
+            return None
+
+        g = self.g
+        path = [self.start]
+        cell = self.start
+        while cell != self.goal:
+            cell = min(self.successors(cell), key=lambda successor: self.edge_cost(successor) + g.get(successor, INF))
+            path.append(cell)
+        return path
+
+    def compute_path(self):
+        self.compute_shortest_path()
+        return self.path()
+
+    #----------------------------------------------
+    # Changes
+    #----------------------------------------------
+
+    def move_start(self, start):
+        """Move the start (the robot went on along the path), the search state is kept."""
+        self.km += self.heuristic(self.last_start, start)
+        self.last_start = start
+        self.start = start
+
+    def update_cell(self, x, y):
+        """Repair the search after the walls or the damage of a cell changed."""
+        copy_cell(self.cell_map, self.cell_walls, self.cell_costs, x, y)
+        if self.edge_cost((x, y)) < self.weight:
+            # The heuristic would overestimate, the keys in the queue are wrong
+            self.reset()
+            return
+
+        # Edges into the cell changed cost and edges out of it may have opened or closed
+        self.update_vertex((x, y))
+        for i in range(4):
+            dx, dy = DIRECTIONS[i]
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.cols and 0 <= ny < self.rows:
+                self.update_vertex((nx, ny))
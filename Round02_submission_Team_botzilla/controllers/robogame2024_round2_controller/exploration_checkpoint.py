@@ -0,0 +1,231 @@
+import json
+import os
+
+CHECKPOINT_VERSION = 1
+
+class ExplorationCheckpoint:
+    """
+    Append-only log of the exploration state, so a restarted controller goes on where it stopped.
+
+    Every tick appends one JSON line: the cells the maze changed since the previous line (cells still
+    being classified by Perception come again once their colors are attached), the
+    changes of the explorer stacks (entries kept from the previous line and entries pushed after
+    them) and the newly visited positions. Every compact_every lines the maze is written as a
+    snapshot (Maze.save_snapshot) and the log restarts from a line holding the whole state.
+
+    restore() replays the log into a new explorer, which then drives back to where the state says
+    it is before its first tick (Explorer.resume). A log written later in simulated time than the
+    current time is left over from another simulation run and is ignored.
+    """
+
+    def __init__(self, file, compact_every=100):
+        self.file = file
+        self.snapshot_file = file + '.snapshot'
+        self.compact_every = compact_every
+
+        self.log = None
+        self.explorer = None
+        self.lines = 0 # lines in the log since the last compaction
+        self.logged_stacks = {} # stack contents as of the last line
+        self.logged_visited = set()
+        self.changed_cells = set()
+
+        self.bytes_written = 0
+        self.valid_size = 0 # bytes of the log up to its last complete line
+
+    #----------------------------------------------
+    # State
+    #----------------------------------------------
+
+    def stacks(self, explorer):
+        return {
+            'location': explorer.location_stack,
+            'branch': explorer.branch_stack,
+            'cells': explorer.maze.explore_cell_stack,
+        }
+
+    def cell_state(self, x, y):
+        cell = self.explorer.maze.cell_map[y][x]
+        return [x, y, list(cell.wall_data), cell.damage, cell.has_survivor, cell.explored, cell.x, cell.y]
+
+    def stack_delta(self, name, stack):
+        """(entries kept, entries pushed) of a stack since the last line."""
+        logged = self.logged_stacks.get(name, [])
+        kept = 0
+        for logged_entry, entry in zip(logged, stack):
+            if logged_entry != entry:
+                break
+            kept += 1
+        self.logged_stacks[name] = list(stack)
+        return [kept, [list(entry) for entry in stack[kept:]]]
+
+    def visited_delta(self):
+        """Positions visited since the last line (visited only grows)."""
+        visited = self.explorer.visited - self.logged_visited
+        self.logged_visited |= visited
+        return sorted(list(position) for position in visited)
+
+    #----------------------------------------------
+    # Logging
+    #----------------------------------------------
+
+    def attach(self, explorer, restored=False):
+        """Log the exploration of an explorer from now on, after its restored state when restored is set."""
+        self.explorer = explorer
+        explorer.maze.add_cell_listener(self.on_cell_changed)
+        if restored:
+            self.logged_stacks = {name: list(stack) for name, stack in self.stacks(explorer).items()}
+            self.logged_visited = set(explorer.visited)
+            self.log = open(self.file, 'a')
+        else:
+            self.clear()
+            self.log = open(self.file, 'w')
+
+    def on_cell_changed(self, x, y):
+        self.changed_cells.add((x, y))
+
+    def record(self):
+        """Append the changes of the last tick to the log."""
+        explorer = self.explorer
+        if not explorer.started and not explorer.completed:
+            return
+        # Colors the worker is done with are logged now, the others on the tick their result is attached
+        # (a cell restored without its colors is sensed again)
+        if explorer.perception is not None:
+            explorer.perception.apply_ready()
+        if self.lines >= self.compact_every:
+            self.compact()
+            return
+
+        line = {
+            'time': explorer.robot_utils.time(),
+            'cells': [self.cell_state(x, y) for x, y in sorted(self.changed_cells)],
+            'stacks': {name: self.stack_delta(name, stack) for name, stack in self.stacks(explorer).items()},
+            'visited': self.visited_delta(),
+            'completed': explorer.completed,
+        }
+        if self.lines == 0:
+            line['start'] = self.start_state()
+        self.changed_cells.clear()
+        self.write(line)
+
+    def start_state(self):
+        explorer = self.explorer
+        return {
+            'version': CHECKPOINT_VERSION,
+            'initial_bearing': explorer.initial_bearing,
+            'initial_position': list(explorer.initial_position),
+            'entrance_position': list(explorer.entrance_position),
+        }
+
+    def write(self, line):
+        data = json.dumps(line, separators=(',', ':')) + '\n'
+        self.log.write(data)
+        self.log.flush()
+        self.bytes_written += len(data)
+        self.lines += 1
+
+    def compact(self):
+        """Write the maze as a snapshot and restart the log from a line with the whole state."""
+        explorer = self.explorer
+        explorer.maze.save_snapshot(self.snapshot_file)
+        self.changed_cells.clear()
+        self.logged_stacks = {}
+        self.logged_visited = set()
+        line = {
+            'time': explorer.robot_utils.time(),
+            'snapshot': True,
+            'start': self.start_state(),
+            'cells': [],
+            'stacks': {name: self.stack_delta(name, stack) for name, stack in self.stacks(explorer).items()},
+            'visited': self.visited_delta(),
+            'completed': explorer.completed,
+        }
+
+        # The new log replaces the old one in one go, the snapshot holds every cell change of the old one
+        self.log.close()
+        temporary_file = self.file + '.tmp'
+        self.log = open(temporary_file, 'w')
+        self.lines = 0
+        self.write(line)
+        self.log.close()
+        os.replace(temporary_file, self.file)
+        self.log = open(self.file, 'a')
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def clear(self):
+        """Forget the logged exploration."""
+        self.close()
+        for file in (self.file, self.snapshot_file):
+            if os.path.exists(file):
+                os.remove(file)
+        self.lines = 0
+
+    #----------------------------------------------
+    # Restore
+    #----------------------------------------------
+
+    def read(self):
+        """Lines of the log, a last line cut short by the crash is dropped."""
+        if not os.path.exists(self.file):
+            return []
+        lines = []
+        self.valid_size = 0
+        with open(self.file, 'rb') as f:
+            for text in f:
+                if not text.endswith(b'\n'):
+                    break
+                try:
+                    lines.append(json.loads(text))
+                except ValueError:
+                    break
+                self.valid_size += len(text)
+        return lines
+
+    def restore(self, explorer):
+        """Replay the log into a new explorer, returns False if there is nothing to go on with."""
+        lines = self.read()
+        if not lines or 'start' not in lines[0] or lines[0]['start']['version'] != CHECKPOINT_VERSION:
+            return False
+        if lines[-1]['time'] > explorer.robot_utils.time():
+            return False # another simulation run
+
+        maze = explorer.maze
+        stacks = self.stacks(explorer)
+        for line in lines:
+            if line.get('snapshot'):
+                maze.load_snapshot(self.snapshot_file)
+            if 'start' in line:
+                explorer.initial_bearing = line['start']['initial_bearing']
+                explorer.initial_position = line['start']['initial_position']
+                explorer.entrance_position = line['start']['entrance_position']
+
+            for x, y, wall_data, damage, survivor, explored, gps_x, gps_y in line['cells']:
+                cell = maze.cell_map[y][x]
+                cell.wall_data = wall_data
+                cell.damage = damage
+                cell.has_survivor = survivor
+                cell.explored = explored
+                cell.x, cell.y = gps_x, gps_y
+
+            for name, (kept, pushed) in line['stacks'].items():
+                del stacks[name][kept:]
+                stacks[name].extend(tuple(entry) if name == 'cells' else entry for entry in pushed)
+
+            explorer.visited.update(tuple(position) for position in line['visited'])
+            explorer.completed = line['completed']
+
+        # Colors still being classified when the controller stopped are lost, those cells are sensed again
+        for row in maze.cell_map:
+            for cell in row:
+                if cell.explored and cell.has_survivor is None:
+                    cell.explored = False
+
+        # Lines are appended after the last complete one
+        os.truncate(self.file, self.valid_size)
+        self.lines = len(lines)
+        return True
@@ -1,14 +1,15 @@
-from controller import Robot
+import math
+import time
+from collections import deque
+
 from robot_utils import RobotUtils
 from navigation_utils import NavigationUtils
-from maze import Maze
-from colors import *
-from color_detect import is_color_exists, get_color_deltas
+from maze import Maze, DIRECTIONS
+from color_lut import ColorLUT, lut_file
+from perception import Perception, BOTTOM_COLORS, FRONT_COLORS, BOTTOM_DETECTION, FRONT_DETECTION, DETECTION_THRESHOLD, classify_floor, detect_survivor, coarse_detection
+from instrumentation import timed
 
-robot = Robot()
-robot_utils = RobotUtils(robot)
-nav_utils = NavigationUtils(robot_utils)
-maze = Maze()
+OPPOSITE_WALL = [1, 0, 3, 2] # South, North, West, East
 
 # Cardinal bearings (ENU)
 CARDINAL_BEARING = {
@@ -34,185 +35,395 @@ CELL_STEPPING = {
     'E': lambda step: (+step, 0),
 }
 
-INITIAL_DIRECTION_BEARING = 0
-INITIAL_POSITION = None
-
-def get_direction():
-    bearing = robot_utils.direction_bearing()
-    return CARDINAL_BEARING[bearing]
-
-def get_direction_relative_to_initial(abosolute_direction_bearing):
-    return CARDINAL_BEARING[(abosolute_direction_bearing - INITIAL_DIRECTION_BEARING) % 360]
-
-def get_direction_bearing_relative_to_initial(abosolute_direction_bearing):
-    return (abosolute_direction_bearing - INITIAL_DIRECTION_BEARING) % 360
-
-def stepped_position(current_position, step, direction=None, stepper=CARDINAL_STEPPING):
-    if direction is None:
-        direction = get_direction()
-    stepping = stepper[direction](step)
-    return [current_position[0] + stepping[0], current_position[1] + stepping[1]]
-
-def scan_available_directions():
-    bearing = robot_utils.direction_bearing()
-    available_directions = []
-    if not robot_utils.ds_front_detected():
-        available_directions.append(bearing)
-    if not robot_utils.ds_right_detected():
-        available_directions.append((bearing - 90) % 360)
-    if not robot_utils.ds_left_detected():
-        available_directions.append((bearing + 90) % 360)
-    return available_directions
-
-def maze_set_new_cell(selected_direction_bearing, next_position):
-    relative_direction = get_direction_relative_to_initial(selected_direction_bearing)
-    next_cell = stepped_position(maze.current_cell(), 1, relative_direction, CELL_STEPPING)
-    maze.set_cell(next_cell[0], next_cell[1], next_position[0], next_position[1])
-
-def maze_update_current_cell():
-    bearing = get_direction_bearing_relative_to_initial(robot_utils.direction_bearing())
-    
-    # Wall data [North, South, East, West]
-    walls = []
-
-    if robot_utils.ds_front_detected():
-        walls.append(CARDINAL_BEARING[bearing])
-    if robot_utils.ds_right_detected():
-        walls.append(CARDINAL_BEARING[(bearing - 90) % 360])
-    if robot_utils.ds_left_detected():
-        walls.append(CARDINAL_BEARING[(bearing + 90) % 360])
-    
-    wall_data = [0, 0, 0, 0]
-
-    if 'N' in walls:
-        wall_data[0] = 1
-    if 'S' in walls:
-        wall_data[1] = 1
-    if 'E' in walls:
-        wall_data[2] = 1
-    if 'W' in walls:
-        wall_data[3] = 1
-
-    # Color detection (bottom camera)
-    damage = -1
-
-    image_array = robot_utils.camera_bottom.getImageArray()
-    color_deltas_array = [get_color_deltas(image_array, RED), get_color_deltas(image_array, ORANGE), get_color_deltas(image_array, YELLOW)]
-    min_delta = float('inf')
-    min_delta_index = -1
-
-    for i in range(3):
-        if color_deltas_array[i] is not None and color_deltas_array[i] < min_delta:
-            min_delta = color_deltas_array[i]
-            min_delta_index = i
-
-    if min_delta_index == 0:
-        damage = 40
-    elif min_delta_index == 1:
-        damage = 10
-    elif min_delta_index == 2:
-        damage = 0
-
-    # Color detection (front camera)
-    survivor = 0
-
-    image_array = robot_utils.camera_front.getImageArray()
-
-    if robot_utils.ds_front_detected() and is_color_exists(image_array, GREEN, threshold=20):
-        survivor = 1
-
-    # Update the current cell of maze
-    maze.update_current_cell(wall_data, damage, survivor)
-
-while robot_utils.step(): break
-
-# Use initial cardinal bearing as initial direction
-INITIAL_DIRECTION_BEARING = robot_utils.direction_bearing()
-# Initialize initial position
-INITIAL_POSITION = robot_utils.gps.getValues()
-
-# Move to the entrance cell (it is located after 0.455m (radius + tile + tile / 2 = 0.08 + 0.25 + 0.125) north from the initial position)
-entarnce_position = stepped_position(INITIAL_POSITION, 0.455)
-
-# Normalize the entrance position (to nearest factor of 0.125)
-entarnce_position[0] = round(entarnce_position[0] / 0.125) * 0.125
-entarnce_position[1] = round(entarnce_position[1] / 0.125) * 0.125
-
-# Move to the entrance position
-nav_utils.move_to_point(entarnce_position[0], entarnce_position[1])
-maze.set_entrance(entarnce_position[0], entarnce_position[1])
-
-location_stack = []
-branch_stack = []
-visited = set()
-
-location_stack.append(entarnce_position)
-visited.add(tuple(entarnce_position))
-
-print('Exploration started...')
-
-while robot_utils.step():
-    # update the current cell of maze
-    maze_update_current_cell()
-
-    # scan available directions
-    available_directions = scan_available_directions()
-
-    # check those visited
-    for direction in available_directions[:]:
-        next_position = stepped_position(location_stack[-1], 0.25, CARDINAL_BEARING[direction])
-        if tuple(next_position) in visited:
-            available_directions.remove(direction)
-
-    # return to initial position if all directions are visited
-    if len(visited) == 400:
+class Explorer:
+    """
+    Depth first exploration of the maze, one cell per tick().
+
+    Nothing runs at construction: the robot only moves when tick() (or run(), or iterating over
+    steps()) is called, so exploration can be interleaved with other per-tick work and several
+    explorers can live in one process.
+    """
+
+    def __init__(self, robot, maze=None, async_perception=True, checkpoint=None, lut_directory=None, motion_control=False):
+        self.robot = robot
+        self.robot_utils = RobotUtils(robot)
+        self.nav_utils = NavigationUtils(self.robot_utils, motion_control)
+        self.maze = maze if maze is not None else Maze()
+
+        # Color lookup tables, loaded from and saved to lut_directory to be reused between runs (built from scratch when None)
+        self.lut_directory = lut_directory
+        if lut_directory is not None:
+            self.bottom_lut = ColorLUT.load(lut_file('bottom', lut_directory), BOTTOM_COLORS, threshold=DETECTION_THRESHOLD)
+            self.front_lut = ColorLUT.load(lut_file('front', lut_directory), FRONT_COLORS, threshold=DETECTION_THRESHOLD)
+        else:
+            self.bottom_lut = ColorLUT(BOTTOM_COLORS, threshold=DETECTION_THRESHOLD)
+            self.front_lut = ColorLUT(FRONT_COLORS, threshold=DETECTION_THRESHOLD)
+
+        # Color classification on a worker thread while the robot moves on (inline when None)
+        self.perception = Perception(self.maze, self.bottom_lut, self.front_lut) if async_perception else None
+        self.bottom_coarse = coarse_detection(BOTTOM_DETECTION)
+        self.front_coarse = coarse_detection(FRONT_DETECTION)
+
+        self.initial_bearing = 0
+        self.initial_position = None
+        self.entrance_position = None
+
+        self.location_stack = []
+        self.branch_stack = []
+        self.visited = set()
+
+        self.started = False
+        self.completed = False
+
+        # Sensing stats: cells sensed and the CPU time it took, cells skipped because they were known
+        self.sensed_cells = 0
+        self.sensing_time = 0.0
+        self.skipped_cells = 0
+
+        # Exploration state logged every tick (ExplorationCheckpoint), and restored from it after a controller restart
+        self.checkpoint = checkpoint
+        self.restored = False
+        if checkpoint is not None:
+            self.restored = checkpoint.restore(self)
+            checkpoint.attach(self, self.restored)
+
+    def get_direction(self):
+        bearing = self.robot_utils.direction_bearing()
+        return CARDINAL_BEARING[bearing]
+
+    def get_direction_relative_to_initial(self, abosolute_direction_bearing):
+        return CARDINAL_BEARING[(abosolute_direction_bearing - self.initial_bearing) % 360]
+
+    def get_direction_bearing_relative_to_initial(self, abosolute_direction_bearing):
+        return (abosolute_direction_bearing - self.initial_bearing) % 360
+
+    def stepped_position(self, current_position, step, direction=None, stepper=CARDINAL_STEPPING):
+        if direction is None:
+            direction = self.get_direction()
+        stepping = stepper[direction](step)
+        return [current_position[0] + stepping[0], current_position[1] + stepping[1]]
+
+    def scan_available_directions(self):
+        bearing = self.robot_utils.direction_bearing()
+        available_directions = []
+        if not self.robot_utils.ds_front_detected():
+            available_directions.append(bearing)
+        if not self.robot_utils.ds_right_detected():
+            available_directions.append((bearing - 90) % 360)
+        if not self.robot_utils.ds_left_detected():
+            available_directions.append((bearing + 90) % 360)
+        return available_directions
+
+    def maze_set_new_cell(self, selected_direction_bearing, next_position):
+        relative_direction = self.get_direction_relative_to_initial(selected_direction_bearing)
+        next_cell = self.stepped_position(self.maze.current_cell(), 1, relative_direction, CELL_STEPPING)
+        self.maze.set_cell(next_cell[0], next_cell[1], next_position[0], next_position[1])
+
+    @timed('sensing.maze_update_current_cell')
+    def maze_update_current_cell(self):
+        if self.perception is not None:
+            self.perception.apply_ready()
+
+        # Walls and colors of an explored cell are known already (revisits after backtracking)
+        x, y = self.maze.current_cell()
+        if self.maze.cell_map[y][x].explored:
+            self.skipped_cells += 1
+            return
+
+        start = time.thread_time()
+        self.sense_current_cell()
+        self.sensing_time += time.thread_time() - start
+        self.sensed_cells += 1
+
+    def avoided_sensing_time(self):
+        """CPU time saved by skipping known cells, estimated from the mean sensing time of a cell."""
+        if self.sensed_cells == 0:
+            return 0.0
+        return self.skipped_cells * self.sensing_time / self.sensed_cells
+
+    def sense_current_cell(self):
+        bearing = self.get_direction_bearing_relative_to_initial(self.robot_utils.direction_bearing())
+
+        # Wall data [North, South, East, West]
+        walls = []
+
+        if self.robot_utils.ds_front_detected():
+            walls.append(CARDINAL_BEARING[bearing])
+        if self.robot_utils.ds_right_detected():
+            walls.append(CARDINAL_BEARING[(bearing - 90) % 360])
+        if self.robot_utils.ds_left_detected():
+            walls.append(CARDINAL_BEARING[(bearing + 90) % 360])
+
+        wall_data = [0, 0, 0, 0]
+
+        if 'N' in walls:
+            wall_data[0] = 1
+        if 'S' in walls:
+            wall_data[1] = 1
+        if 'E' in walls:
+            wall_data[2] = 1
+        if 'W' in walls:
+            wall_data[3] = 1
+
+        # Camera frames, survivors are only seen on a wall in front so the front frame is not grabbed otherwise
+        bottom_frame = self.robot_utils.bottom_camera_frame()
+        front_frame = self.robot_utils.front_camera_frame() if self.robot_utils.ds_front_detected() else None
+
+        if self.perception is not None:
+            # Walls now, colors attached to the cell once the worker has classified them
+            self.maze.update_current_cell(wall_data, None, None)
+            x, y = self.maze.current_cell()
+            self.perception.submit(x, y, bottom_frame, front_frame)
+        else:
+            damage = classify_floor(bottom_frame, self.bottom_lut, self.bottom_coarse)
+            survivor = detect_survivor(front_frame, self.front_lut, self.front_coarse)
+            self.maze.update_current_cell(wall_data, damage, survivor)
+
+    def start(self):
+        """Move from the initial position to the entrance cell."""
+        self.robot_utils.step()
+
+        if self.restored:
+            self.resume()
+            self.started = True
+            return
+
+        # Use initial cardinal bearing as initial direction
+        self.initial_bearing = self.robot_utils.direction_bearing()
+        # Initialize initial position
+        self.initial_position = self.robot_utils.gps_values()
+
+        # Move to the entrance cell (it is located after 0.455m (radius + tile + tile / 2 = 0.08 + 0.25 + 0.125) north from the initial position)
+        entarnce_position = self.stepped_position(self.initial_position, 0.455)
+
+        # Normalize the entrance position (to nearest factor of 0.125)
+        entarnce_position[0] = round(entarnce_position[0] / 0.125) * 0.125
+        entarnce_position[1] = round(entarnce_position[1] / 0.125) * 0.125
+
+        # Move to the entrance position
+        self.nav_utils.move_to_point(entarnce_position[0], entarnce_position[1])
+        self.maze.set_entrance(entarnce_position[0], entarnce_position[1])
+        self.entrance_position = entarnce_position
+
+        self.location_stack.append(entarnce_position)
+        self.visited.add(tuple(entarnce_position))
+
+        self.started = True
+        print('Exploration started...')
+
+    def resume(self):
+        """Drive back to the top of the location stack, where the restored exploration goes on."""
+        print(f'Resuming exploration, {len(self.visited)}/{self.cell_count()} cells explored...')
+        self.nav_utils.stop()
+
+        # The robot was stopped on its way down the stack (backtracking) or to the next cell (moving forward)
+        x, y = self.robot_utils.current_position()
+        distances = [self.nav_utils.distance_of_two_points(x, y, *position) for position in self.location_stack]
+        nearest = min(range(len(distances)), key=distances.__getitem__)
+        if distances[nearest] < 0.125:
+            self.nav_utils.follow_path(self.location_stack[nearest:])
+        else:
+            self.nav_utils.move_to_point(*self.location_stack[-1])
+        # Only the front and the sides are sensed, the back is turned to the cell the robot came from
+        if len(self.location_stack) > 1:
+            self.nav_utils.rotate_to_angle(self.nav_utils.direction_of_tow_poits(*self.location_stack[-2], *self.location_stack[-1]))
+
+        # A cell is only logged once sensed, the top of the stack may not have its gps position yet
+        x, y = self.maze.current_cell()
+        self.maze.cell_map[y][x].x, self.maze.cell_map[y][x].y = self.location_stack[-1]
+        self.resense_lost_cells()
+
+    def open_neighbours(self, cell):
+        """Cells next to an explored cell that are not behind one of its walls."""
+        grid = self.maze.grid
+        x, y = cell
+        wall_data = grid.wall_data(x, y)
+        for side, (dx, dy) in enumerate(DIRECTIONS):
+            nx, ny = x + dx, y + dy
+            if wall_data[side] or not (0 <= nx < grid.width and 0 <= ny < grid.height): continue
+            if grid.explored[grid.index(nx, ny)] and grid.wall_data(nx, ny)[OPPOSITE_WALL[side]]: continue
+            yield (nx, ny)
+
+    def shortest_known_path(self, start, targets):
+        """BFS from start through explored cells to the closest of targets, as a list of cells (None if none is reachable)."""
+        grid = self.maze.grid
+        came_from = {start: None}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            if cell in targets:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = came_from[cell]
+                path.reverse()
+                return path
+            if not grid.explored[grid.index(*cell)]: continue  # Only travel through known cells
+            for neighbour in self.open_neighbours(cell):
+                if neighbour not in came_from:
+                    came_from[neighbour] = cell
+                    queue.append(neighbour)
+        return None
+
+    def resense_lost_cells(self):
+        """
+        Sense again the cells restored without their colors (still being classified when the controller
+        stopped), then come back to the current cell.
+        """
+        grid = self.maze.grid
+        home = self.maze.current_cell()
+        lost = {(x, y) for y in range(grid.height) for x in range(grid.width)
+                if not grid.explored[grid.index(x, y)] and not math.isnan(grid.x[grid.index(x, y)])}
+        lost.discard(home)
+        if not lost:
+            return
+        print(f'Sensing {len(lost)} cells again...')
+        self.maze_update_current_cell()
+
+        cell = home
+        while lost:
+            path = self.shortest_known_path(cell, lost)
+            if path is None:
+                break
+            self.follow_cells(path)
+            cell = path[-1]
+            lost.discard(cell)
+            self.maze.set_cell(cell[0], cell[1], grid.x[grid.index(*cell)], grid.y[grid.index(*cell)])
+            self.maze_update_current_cell()
+            self.maze.back_track()
+
+        path = self.shortest_known_path(cell, {home})
+        if path is not None:
+            self.follow_cells(path)
+
+    def follow_cells(self, path):
+        """Drive along a path of known cells, through their gps positions."""
+        grid = self.maze.grid
+        self.nav_utils.follow_path([[grid.x[grid.index(*cell)], grid.y[grid.index(*cell)]] for cell in path[1:]])
+
+    def return_to_entrance(self):
         print('Backtracking to entrance...')
+        path = []
         while True:
-            previous = location_stack[-1]
-            nav_utils.move_to_point(previous[0], previous[1])
+            previous = self.location_stack[-1]
+            path.append(previous)
 
-            if (previous == location_stack[0]):
+            if (previous == self.location_stack[0]):
                 break
-            else: 
-                location_stack.pop()
-                maze.back_track()
+            else:
+                self.location_stack.pop()
+                self.maze.back_track()
+        self.nav_utils.follow_path(path)
+
+    def finish(self):
+        """Return from the last explored cell to the initial position."""
+        self.return_to_entrance()
         print('Returning to initial position...')
-        nav_utils.move_to_point(INITIAL_POSITION[0], INITIAL_POSITION[1])
-        nav_utils.rotate_to_angle(INITIAL_DIRECTION_BEARING)
-        # maze.save('maze.json') For testing purposes
+        self.nav_utils.move_to_point(self.initial_position[0], self.initial_position[1])
+        self.nav_utils.rotate_to_angle(self.initial_bearing)
+        # The worker uses the color LUTs until every frame is classified
+        if self.perception is not None:
+            self.perception.wait()
+        # self.maze.save('maze.json') For testing purposes
+        if self.lut_directory is not None:
+            self.bottom_lut.save(lut_file('bottom', self.lut_directory))
+            self.front_lut.save(lut_file('front', self.lut_directory))
+        print(f'Color LUT hit rate: bottom {self.bottom_lut.hit_rate() * 100:.2f}%, front {self.front_lut.hit_rate() * 100:.2f}%')
+        print(f'Sensor reads: {self.robot_utils.device_reads} from devices, {self.robot_utils.saved_reads} from step snapshots')
+        print(f'Cell sensing: {self.sensed_cells} cells sensed in {self.sensing_time:.2f} s, {self.skipped_cells} known cells skipped '
+              f'(~{self.avoided_sensing_time():.2f} s avoided)')
+        if self.perception is not None:
+            print(f'Perception: {self.perception.classified_cells} cells classified on the worker in {self.perception.worker_time:.2f} s, '
+                  f'{self.perception.wait_time:.2f} s spent waiting for it')
         print('Exploration completed!')
-        break
-
-    # if there are no available directions, backtrack
-    if len(available_directions) == 0:
-        print('Backtracking...')
-        while True:
-            previous = location_stack[-1]
-            nav_utils.move_to_point(previous[0], previous[1])
-
-            if (previous == branch_stack[-1]):
-                branch_stack.pop()
-                break
-            else: 
-                location_stack.pop()
-                maze.back_track()
-        continue
-
-    # select the next direction
-    selected_direction_bearing = available_directions.pop()
-
-    # append the current position to the branches if there are more than one available directions after popping the selected direction
-    if len(available_directions) > 0:
-        branch_stack.append(location_stack[-1])
-
-    # move to the next position
-    next_position = stepped_position(location_stack[-1], 0.25, CARDINAL_BEARING[selected_direction_bearing])
-    nav_utils.move_to_point(next_position[0], next_position[1])
-
-    location_stack.append(next_position)
-    visited.add(tuple(next_position))
-
-    # set the new cell of maze
-    maze_set_new_cell(selected_direction_bearing, next_position)
-
-    print(f'Explored: {len(visited)}/400 --> {len(visited) / 400 * 100:.2f}%')
+        self.completed = True
+
+    def tick(self):
+        """
+        Run one iteration of the exploration, returns False once it is completed or the simulation stopped.
+        The checkpoint, when there is one, logs every iteration.
+        """
+        if self.completed:
+            return False
+        running = self.explore_step()
+        if self.checkpoint is not None:
+            self.checkpoint.record()
+        return running
+
+    def explore_step(self):
+        """One iteration of the exploration, see tick()."""
+        if not self.started:
+            self.start()
+            return True
+        if not self.robot_utils.step():
+            return False
+
+        # update the current cell of maze
+        self.maze_update_current_cell()
+
+        # scan available directions
+        available_directions = self.scan_available_directions()
+
+        # check those visited
+        for direction in available_directions[:]:
+            next_position = self.stepped_position(self.location_stack[-1], 0.25, CARDINAL_BEARING[direction])
+            if tuple(next_position) in self.visited:
+                available_directions.remove(direction)
+
+        # return to initial position if all cells are visited, or every reachable one (no branch left to backtrack to)
+        if len(self.visited) == self.cell_count() or (len(available_directions) == 0 and not self.branch_stack):
+            self.finish()
+            return False
+
+        # if there are no available directions, backtrack
+        if len(available_directions) == 0:
+            print('Backtracking...')
+            path = []
+            while True:
+                previous = self.location_stack[-1]
+                path.append(previous)
+
+                if (previous == self.branch_stack[-1]):
+                    self.branch_stack.pop()
+                    break
+                else:
+                    self.location_stack.pop()
+                    self.maze.back_track()
+            self.nav_utils.follow_path(path)
+            return True
+
+        # select the next direction
+        selected_direction_bearing = available_directions.pop()
+
+        # append the current position to the branches if there are more than one available directions after popping the selected direction
+        if len(available_directions) > 0:
+            self.branch_stack.append(self.location_stack[-1])
+
+        # move to the next position
+        next_position = self.stepped_position(self.location_stack[-1], 0.25, CARDINAL_BEARING[selected_direction_bearing])
+        self.nav_utils.move_to_point(next_position[0], next_position[1])
+
+        self.location_stack.append(next_position)
+        self.visited.add(tuple(next_position))
+
+        # set the new cell of maze
+        self.maze_set_new_cell(selected_direction_bearing, next_position)
+
+        self.report_progress()
+        return True
+
+    def cell_count(self):
+        return self.maze.grid.width * self.maze.grid.height
+
+    def report_progress(self):
+        print(f'Explored: {len(self.visited)}/{self.cell_count()} --> {len(self.visited) / self.cell_count() * 100:.2f}%')
+
+    def steps(self):
+        """Generator over the exploration, yields after every tick."""
+        while self.tick():
+            yield self
+
+    @timed('phase.explore')
+    def run(self):
+        for _ in self.steps():
+            pass
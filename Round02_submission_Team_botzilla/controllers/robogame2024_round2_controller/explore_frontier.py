@@ -0,0 +1,131 @@
+import math
+
+from maze import DIRECTIONS
+from explore_dfs import Explorer, CARDINAL_BEARING, OPPOSITE_WALL
+
+class FrontierExplorer(Explorer):
+    """
+    Frontier based exploration of the maze, one frontier cell per tick().
+
+    The frontier is the set of unexplored cells seen through an open side of an explored cell.
+    Every tick senses the current cell, then drives along the shortest known path (BFS over the
+    explored cells) to the nearest frontier cell, so dead ends are left by the shortest way instead
+    of walking back the whole DFS stack. Exploration completes once the frontier is empty, which
+    also ends it in mazes where some cells can not be reached.
+    """
+
+    def __init__(self, robot, maze=None, async_perception=True, checkpoint=None, lut_directory=None, motion_control=False):
+        self.frontier = set()
+        super().__init__(robot, maze, async_perception, checkpoint, lut_directory, motion_control)
+
+    def cell_position(self, cell):
+        """gps position of the centre of a maze cell, from the entrance position and the initial bearing."""
+        entrance = self.maze.explore_cell_stack[0]
+        east = self.stepped_position([0, 0], 0.25, CARDINAL_BEARING[(self.initial_bearing + 270) % 360])
+        south = self.stepped_position([0, 0], 0.25, CARDINAL_BEARING[(self.initial_bearing + 180) % 360])
+        dx, dy = cell[0] - entrance[0], cell[1] - entrance[1]
+        return [self.entrance_position[0] + dx * east[0] + dy * south[0],
+                self.entrance_position[1] + dx * east[1] + dy * south[1]]
+
+    def update_frontier(self, cell):
+        grid = self.maze.grid
+        self.frontier.discard(cell)
+        for neighbour in self.open_neighbours(cell):
+            if not grid.explored[grid.index(*neighbour)]:
+                self.frontier.add(neighbour)
+
+    def follow_path(self, path):
+        self.nav_utils.follow_path([self.cell_position(cell) for cell in path[1:]])
+
+    def position_cell(self, position):
+        """Maze cell a gps position is in, the inverse of cell_position."""
+        entrance = self.maze.explore_cell_stack[0]
+        east = self.stepped_position([0, 0], 0.25, CARDINAL_BEARING[(self.initial_bearing + 270) % 360])
+        south = self.stepped_position([0, 0], 0.25, CARDINAL_BEARING[(self.initial_bearing + 180) % 360])
+        dx, dy = position[0] - self.entrance_position[0], position[1] - self.entrance_position[1]
+        return (entrance[0] + round((dx * east[0] + dy * east[1]) / 0.0625),
+                entrance[1] + round((dx * south[0] + dy * south[1]) / 0.0625))
+
+    def resume(self):
+        """Rebuild the frontier and go on from the cell the robot stopped in."""
+        grid = self.maze.grid
+        for y in range(grid.height):
+            for x in range(grid.width):
+                if grid.explored[grid.index(x, y)]:
+                    self.update_frontier((x, y))
+        print(f'Resuming exploration, {grid.explored.count()} cells explored, {len(self.frontier)} in the frontier...')
+        self.nav_utils.stop()
+
+        # The robot was on a path through explored cells to a frontier cell, both can be sensed from
+        cell = self.position_cell(self.robot_utils.current_position())
+        position = self.cell_position(cell)
+        self.nav_utils.move_to_point(*position)
+
+        # Only the front and the sides are sensed, the back is turned to a sensed cell open to this one
+        # (cells restored without their colors still have their walls and gps position)
+        grid = self.maze.grid
+        bearing = self.robot_utils.direction_bearing()
+        for side, (dx, dy) in enumerate(DIRECTIONS):
+            nx, ny = cell[0] + dx, cell[1] + dy
+            if not (0 <= nx < grid.width and 0 <= ny < grid.height): continue
+            index = grid.index(nx, ny)
+            if not math.isnan(grid.x[index]) and not grid.wall_data(nx, ny)[OPPOSITE_WALL[side]]:
+                bearing = self.nav_utils.direction_of_tow_poits(grid.x[index], grid.y[index], *position)
+                break
+        self.nav_utils.rotate_to_angle(bearing)
+        if len(self.maze.explore_cell_stack) > 1:
+            self.maze.back_track()
+        self.maze.set_cell(cell[0], cell[1], position[0], position[1])
+        self.visited.add(tuple(position))
+
+    def return_to_entrance(self):
+        print('Returning to entrance...')
+        path = self.shortest_known_path(self.maze.current_cell(), {self.maze.explore_cell_stack[0]})
+        if path is None:
+            path = [self.maze.current_cell(), self.maze.explore_cell_stack[0]]
+        self.follow_path(path)
+        del self.maze.explore_cell_stack[1:]
+
+    def explore_step(self):
+        """One iteration of the exploration, see tick()."""
+        if not self.started:
+            self.start()
+            return True
+        if not self.robot_utils.step():
+            return False
+
+        # update the current cell of maze and the frontier around it
+        current = self.maze.current_cell()
+        self.maze_update_current_cell()
+        self.update_frontier(current)
+
+        # return to initial position once there is nothing left to explore
+        if not self.frontier:
+            self.finish()
+            return False
+
+        path = self.shortest_known_path(current, self.frontier)
+        if path is None:
+            # Frontier cells are always next to an explored cell, so this only happens on inconsistent wall data
+            self.frontier.clear()
+            self.finish()
+            return False
+
+        self.follow_path(path)
+
+        # the current cell is the top of the stack, keep the entrance below it for return_to_entrance
+        target = path[-1]
+        position = self.cell_position(target)
+        if len(self.maze.explore_cell_stack) > 1:
+            self.maze.back_track()
+        self.maze.set_cell(target[0], target[1], position[0], position[1])
+        self.visited.add(tuple(position))
+
+        self.report_progress()
+        return True
+
+# Exploration strategies, by name
+EXPLORERS = {
+    'dfs': Explorer,
+    'frontier': FrontierExplorer,
+}
@@ -0,0 +1,133 @@
+import math
+
+def encode_bgra(image_array, width=64, height=64):
+    """Encode an image indexed as image_array[y][x] -> [R, G, B] into a raw BGRA buffer like camera.getImage()."""
+    buffer = bytearray(4 * width * height)
+    offset = 0
+    for y in range(height):
+        for x in range(width):
+            r, g, b = image_array[y][x][:3]
+            buffer[offset:offset + 4] = bytes((b, g, r, 255))
+            offset += 4
+    return bytes(buffer)
+
+class FakeCamera:
+    """
+    Stand-in for a Webots camera that serves recorded raw BGRA frames.
+
+    Each call to getImage() returns the next frame, the last one is repeated once all of them are served.
+    """
+
+    def __init__(self, frames, width=64, height=64):
+        self.frames = list(frames)
+        self.width = width
+        self.height = height
+        self.index = 0
+        self.sampling_period = 0
+
+    @classmethod
+    def from_files(cls, files, width=64, height=64):
+        frames = []
+        for file in files:
+            with open(file, 'rb') as f:
+                frames.append(f.read())
+        return cls(frames, width, height)
+
+    def enable(self, sampling_period):
+        self.sampling_period = sampling_period
+
+    def getWidth(self):
+        return self.width
+
+    def getHeight(self):
+        return self.height
+
+    def getImage(self):
+        frame = self.frames[min(self.index, len(self.frames) - 1)]
+        self.index += 1
+        return frame
+
+    def getImageArray(self):
+        # Webots returns the image column first (image[x][y][channel])
+        image = self.getImage()
+        return [[[image[4 * (y * self.width + x) + c] for c in (2, 1, 0)] for y in range(self.height)] for x in range(self.width)]
+
+def solid_frame(rgb, width=64, height=64):
+    """Raw BGRA buffer of a frame filled with one color."""
+    r, g, b = rgb
+    return bytes((b, g, r, 255)) * (width * height)
+
+class FakeMotor:
+    """
+    Rotational motor with the Webots position control behaviour.
+
+    The wheel turns toward the target position at the set velocity, or keeps turning at that
+    velocity when the target position is infinity (velocity control).
+    """
+
+    def __init__(self, max_velocity=10):
+        self.max_velocity = max_velocity
+        self.target_position = 0.0
+        self.velocity = max_velocity
+        self.position = 0.0
+
+    def setPosition(self, position):
+        self.target_position = position
+
+    def setVelocity(self, velocity):
+        self.velocity = max(-self.max_velocity, min(self.max_velocity, velocity))
+
+    def getVelocity(self):
+        return self.velocity
+
+    def getTargetPosition(self):
+        return self.target_position
+
+    def advance(self, dt):
+        """Turn the wheel for dt seconds and return the angle it moved."""
+        if math.isinf(self.target_position):
+            delta = self.velocity * dt
+        else:
+            remaining = self.target_position - self.position
+            max_delta = abs(self.velocity) * dt
+            delta = max(-max_delta, min(max_delta, remaining))
+        self.position += delta
+        return delta
+
+class FakePositionSensor:
+    def __init__(self, motor):
+        self.motor = motor
+        self.sampling_period = 0
+
+    def enable(self, sampling_period):
+        self.sampling_period = sampling_period
+
+    def getValue(self):
+        return self.motor.position
+
+class FakeSensor:
+    """Sensor whose readings are computed on demand by a function."""
+
+    def __init__(self, read):
+        self.read = read
+        self.sampling_period = 0
+
+    def enable(self, sampling_period):
+        self.sampling_period = sampling_period
+
+    def getValue(self):
+        return self.read()
+
+    def getValues(self):
+        return self.read()
+
+class FakeWorldCamera(FakeCamera):
+    """Camera whose frame is picked from the state of the simulated world at every getImage()."""
+
+    def __init__(self, frame, width=64, height=64):
+        super().__init__([], width, height)
+        self.frame = frame
+
+    def getImage(self):
+        self.index += 1
+        return self.frame()
@@ -0,0 +1,170 @@
+import math
+import os
+
+from colors import *
+from fake_devices import FakeMotor, FakePositionSensor, FakeSensor, FakeWorldCamera, solid_frame
+from maze import Maze, ENTRANCE_CELL
+from robot_utils import RobotUtils
+
+TILE_SIZE = 0.25 # in meters
+ENTRANCE_OFFSET = 0.455 # the robot starts this far south of the entrance cell (see explore_dfs.py)
+DS_RANGE = 0.2 # distance (in meters) read as 1000, the detection threshold of RobotUtils
+DS_MAX_VALUE = 4000
+
+FLOOR_COLORS = {40: RED, 10: ORANGE, 0: YELLOW}
+FLOOR_COLOR = (210, 210, 210)
+WALL_COLOR = (240, 240, 240)
+
+MAZE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'maze.json')
+
+# Cardinal directions of the world (angle from +x counterclockwise, in quarter turns) -> wall data index
+QUARTER_TURN_WALLS = {0: 2, 1: 0, 2: 3, 3: 1} # East, North, West, South
+OPPOSITE_WALL = [1, 0, 3, 2]
+WALL_STEPS = [(0, -1), (0, 1), (1, 0), (-1, 0)] # cell (dx, dy) for North, South, East, West
+
+class FakeRobot:
+    """
+    Headless stand-in for the Webots Robot, with the devices RobotUtils uses.
+
+    The world is a grid maze in the Maze.to_array layout (maze.json by default): walls are read
+    by the distance sensors, the damage of a cell is the floor color seen by the bottom camera and
+    a survivor shows up green on the front camera when facing a wall of its cell. Every step()
+    advances the wheels with the Webots position control behaviour and integrates the differential
+    drive kinematics, there are no collisions.
+    """
+
+    def __init__(self, maze=None, max_time=None):
+        if maze is None:
+            maze = Maze()
+            maze.from_file(MAZE_FILE)
+        self.maze = maze
+        self.cell_map = maze.cell_map
+        self.max_time = max_time # step() returns -1 after this many simulated seconds, like a stopped simulation
+
+        # Cell (x, y) is centred on (origin_x + x * TILE_SIZE, origin_y - y * TILE_SIZE)
+        corner = self.cell_map[0][0]
+        self.origin_x = corner.x if corner.x is not None else -(len(self.cell_map[0]) / 2 - 0.5) * TILE_SIZE
+        self.origin_y = corner.y if corner.y is not None else (len(self.cell_map) / 2 - 0.5) * TILE_SIZE
+
+        entrance_x, entrance_y = self.cell_center(ENTRANCE_CELL[0], ENTRANCE_CELL[1])
+        self.x = entrance_x
+        self.y = entrance_y - ENTRANCE_OFFSET
+        self.heading = math.pi / 2 # facing north (bearing 0)
+
+        self.time = 0.0
+        self.steps = 0
+
+        self.left_motor = FakeMotor()
+        self.right_motor = FakeMotor()
+
+        self.floor_frames = {damage: solid_frame(rgb) for damage, rgb in FLOOR_COLORS.items()}
+        self.floor_frame = solid_frame(FLOOR_COLOR)
+        self.wall_frame = solid_frame(WALL_COLOR)
+        self.survivor_frame = solid_frame(GREEN)
+
+        self.devices = {
+            'left motor': self.left_motor,
+            'right motor': self.right_motor,
+            'left motor sensor': FakePositionSensor(self.left_motor),
+            'right motor sensor': FakePositionSensor(self.right_motor),
+            'compass': FakeSensor(lambda: [math.sin(self.heading), math.cos(self.heading), 0.0]),
+            'gps': FakeSensor(lambda: [self.x, self.y, 0.0]),
+            'ds front': FakeSensor(lambda: self.distance_sensor_value(0)),
+            'ds left': FakeSensor(lambda: self.distance_sensor_value(math.pi / 2)),
+            'ds right': FakeSensor(lambda: self.distance_sensor_value(-math.pi / 2)),
+            'camera front': FakeWorldCamera(self.front_frame),
+            'camera bottom': FakeWorldCamera(self.bottom_frame),
+        }
+
+    #----------------------------------------------
+    # Robot API
+    #----------------------------------------------
+
+    def getDevice(self, name):
+        return self.devices[name]
+
+    def getTime(self):
+        return self.time
+
+    def getBasicTimeStep(self):
+        return RobotUtils.TIME_STEP
+
+    def step(self, duration):
+        if self.max_time is not None and self.time >= self.max_time:
+            return -1
+
+        dt = duration / 1000
+        left = self.left_motor.advance(dt) * RobotUtils.WHEEL_RADIUS
+        right = self.right_motor.advance(dt) * RobotUtils.WHEEL_RADIUS
+
+        forward = (left + right) / 2
+        turn = (right - left) / RobotUtils.AXLE_LENGTH
+        self.x += forward * math.cos(self.heading + turn / 2)
+        self.y += forward * math.sin(self.heading + turn / 2)
+        self.heading = (self.heading + turn) % (2 * math.pi)
+
+        self.time += dt
+        self.steps += 1
+        return 0
+
+    #----------------------------------------------
+    # World
+    #----------------------------------------------
+
+    def cell_center(self, x, y):
+        return self.origin_x + x * TILE_SIZE, self.origin_y - y * TILE_SIZE
+
+    def current_cell(self):
+        """Maze cell (x, y) under the robot, None outside of the maze."""
+        x = round((self.x - self.origin_x) / TILE_SIZE)
+        y = round((self.origin_y - self.y) / TILE_SIZE)
+        if 0 <= x < len(self.cell_map[0]) and 0 <= y < len(self.cell_map):
+            return x, y
+        return None
+
+    def has_wall(self, x, y, wall):
+        """Whether the side of a cell has a wall, read from both cells sharing it (the maze border is a wall)."""
+        if self.cell_map[y][x].wall_data[wall]:
+            return True
+        dx, dy = WALL_STEPS[wall]
+        nx, ny = x + dx, y + dy
+        if not (0 <= nx < len(self.cell_map[0]) and 0 <= ny < len(self.cell_map)):
+            return True
+        return bool(self.cell_map[ny][nx].wall_data[OPPOSITE_WALL[wall]])
+
+    def wall_distance(self, angle_offset):
+        """Distance from the robot to the first wall in the cardinal direction closest to heading + angle_offset."""
+        cell = self.current_cell()
+        if cell is None:
+            return math.inf
+
+        quarter_turns = round((self.heading + angle_offset) / (math.pi / 2)) % 4
+        wall = QUARTER_TURN_WALLS[quarter_turns]
+        x, y = cell
+        center_x, center_y = self.cell_center(x, y)
+
+        # Distance to the side of the current cell, then whole tiles until a wall
+        offset = {0: self.x - center_x, 1: self.y - center_y, 2: center_x - self.x, 3: center_y - self.y}[quarter_turns]
+        distance = TILE_SIZE / 2 - offset
+        dx, dy = WALL_STEPS[wall]
+        while not self.has_wall(x, y, wall):
+            x, y = x + dx, y + dy
+            distance += TILE_SIZE
+            if distance > DS_RANGE * DS_MAX_VALUE / 1000:
+                return math.inf
+        return distance
+
+    def distance_sensor_value(self, angle_offset):
+        return min(DS_MAX_VALUE, self.wall_distance(angle_offset) / DS_RANGE * 1000)
+
+    def bottom_frame(self):
+        cell = self.current_cell()
+        if cell is None:
+            return self.floor_frame
+        return self.floor_frames.get(self.cell_map[cell[1]][cell[0]].damage, self.floor_frame)
+
+    def front_frame(self):
+        cell = self.current_cell()
+        if cell is not None and self.cell_map[cell[1]][cell[0]].has_survivor and self.wall_distance(0) < DS_RANGE:
+            return self.survivor_frame
+        return self.wall_frame
@@ -0,0 +1,161 @@
+import contextlib
+import functools
+import json
+import threading
+import time
+
+class Span:
+    """One timed run of an instrumented block, recorded when the block exits."""
+    __slots__ = ('profiler', 'name', 'start', 'steps')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.steps = self.profiler.steps
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        # Steps are only taken by the control thread, spans of other threads just overlap them
+        steps = self.profiler.steps - self.steps if threading.get_ident() == self.profiler.step_thread else 0
+        self.profiler.record(self.name, self.start, end, steps)
+        return False
+
+NULL_SPAN = contextlib.nullcontext()
+
+class Profiler:
+    """
+    Timers and counters of the controller hot paths, off by default.
+
+    Instrumented code calls count(), step() and span(), or is wrapped with timed(); when the
+    profiler is disabled each of them costs an attribute check (and a call for timed() wrappers,
+    about 0.2 us, so they are kept off the per-pixel and per-node loops). When enabled, every span adds
+    to the timer of its name (calls, total and max time, robot steps taken inside it) and is kept
+    as an event (up to max_events) for save_chrome_trace(), which chrome://tracing and Perfetto
+    open. Spans may run on several threads (the perception worker), counters and timers are
+    updated under a lock.
+    """
+
+    def __init__(self, max_events=200000):
+        self.enabled = False
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.timers = {} # name -> {'calls', 'time', 'max', 'steps'}
+        self.events = [] # (name, start, end, steps, thread id)
+        self.dropped_events = 0
+        self.steps = 0 # robot.step() calls, spans record how many were taken inside them
+        self.step_thread = None # thread calling robot.step()
+        self.origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    #----------------------------------------------
+    # Recording
+    #----------------------------------------------
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def step(self):
+        """Count one robot.step() call."""
+        if self.enabled:
+            self.steps += 1
+            self.step_thread = threading.get_ident()
+
+    def span(self, name):
+        """Context manager timing a block, a shared no-op one when disabled."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name, start, end, steps):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = {'calls': 0, 'time': 0.0, 'max': 0.0, 'steps': 0}
+            timer['calls'] += 1
+            timer['time'] += end - start
+            timer['max'] = max(timer['max'], end - start)
+            timer['steps'] += steps
+            if len(self.events) < self.max_events:
+                self.events.append((name, start, end, steps, threading.get_ident()))
+            else:
+                self.dropped_events += 1
+
+    #----------------------------------------------
+    # Export
+    #----------------------------------------------
+
+    def to_dict(self):
+        return {
+            'counters': dict(self.counters),
+            'timers': {name: dict(timer) for name, timer in self.timers.items()},
+            'steps': self.steps,
+            'dropped_events': self.dropped_events,
+        }
+
+    def save_json(self, file):
+        """Counters and timers, with every recorded span in start order."""
+        trace = self.to_dict()
+        trace['events'] = [{'name': name, 'start': start - self.origin, 'duration': end - start, 'steps': steps, 'thread': thread}
+                           for name, start, end, steps, thread in sorted(self.events, key=lambda event: event[1])]
+        with open(file, 'w') as f:
+            json.dump(trace, f, indent=1)
+
+    def chrome_trace(self):
+        """Trace event format: a complete ('X') event per span, the counters as 'C' events at the end."""
+        threads = {}
+        events = []
+        for name, start, end, steps, thread in self.events:
+            events.append({
+                'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': 1,
+                'tid': threads.setdefault(thread, len(threads) + 1),
+                'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6,
+                'args': {'steps': steps},
+            })
+        end = max((event['ts'] + event['dur'] for event in events), default=0.0)
+        for name, value in self.counters.items():
+            events.append({'name': name, 'cat': name.split('.')[0], 'ph': 'C', 'pid': 1, 'tid': 1, 'ts': end, 'args': {name: value}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_chrome_trace(self, file):
+        with open(file, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self):
+        """Text table of the timers, longest total first, then the counters."""
+        lines = [f'{"timer":40} {"calls":>8} {"total ms":>10} {"max ms":>9} {"steps":>8}']
+        for name, timer in sorted(self.timers.items(), key=lambda item: -item[1]['time']):
+            lines.append(f'{name:40} {timer["calls"]:8} {timer["time"] * 1000:10.1f} {timer["max"] * 1000:9.2f} {timer["steps"]:8}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'{name:40} {value:8}')
+        return '\n'.join(lines)
+
+# Shared by every instrumented module
+profiler = Profiler()
+
+def timed(name):
+    """Decorator timing every call of a function as a span of the shared profiler."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            with Span(profiler, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,14 +1,28 @@
-# from maze_visualizer import MazeVisualizer
 import json
+import mmap
+import os
+from maze_grid import MazeGrid, snapshot_size
 
 MAZE_CELL_SIZE = 20
 ENTRANCE_CELL = (10, 19)
 
+# Movement directions in the order of the wall data (North, South, East, West)
+DIRECTIONS = [(0, -1), (0, 1), (1, 0), (-1, 0)]
+
 class Maze:
-    def __init__(self):
-        self.cell_map = [[Cell() for _ in range(MAZE_CELL_SIZE)] for _ in range(MAZE_CELL_SIZE)]
+    def __init__(self, width=MAZE_CELL_SIZE, height=None):
+        # Cells are stored in flat arrays, cell_map[y][x] gives Cell-like views of them
+        self.grid = MazeGrid(width, width if height is None else height)
+        self.cell_map = self.grid.cell_map
         self.explore_cell_stack = []
-        # self.visualizer = MazeVisualizer(self)
+        self.cell_listeners = [] # called with (x, y) whenever the data of a cell changes
+
+    def add_cell_listener(self, listener):
+        self.cell_listeners.append(listener)
+
+    def notify_cell_changed(self, x, y):
+        for listener in self.cell_listeners:
+            listener(x, y)
 
     def current_cell(self):
         return self.explore_cell_stack[-1]
@@ -24,7 +38,6 @@ class Maze:
         cell.x = x_coord
         cell.y = y_coord
         self.explore_cell_stack.append((x, y))
-        # self.visualizer.draw()
 
     def update_current_cell(self, wall_data=[0,0,0,0], damage=0, survivor=0):
         cell = self.cell_map[self.explore_cell_stack[-1][1]][self.explore_cell_stack[-1][0]]
@@ -33,13 +46,13 @@ class Maze:
         cell.damage = damage
         cell.has_survivor = survivor
         cell.explored = True
-        # self.visualizer.draw()
+        self.notify_cell_changed(self.explore_cell_stack[-1][0], self.explore_cell_stack[-1][1])
 
     def back_track(self):
         self.explore_cell_stack.pop()
 
     def to_array(self):
-        return [[cell.to_array() for cell in row] for row in self.cell_map]
+        return self.grid.to_array()
 
     def to_json(self):
         return json.dumps(self.to_array())
@@ -49,19 +62,61 @@ class Maze:
             json_data = f.read()
             json_data = json.loads(json_data)
 
-            for y in range(MAZE_CELL_SIZE):
-                for x in range(MAZE_CELL_SIZE):
+            if len(json_data) != self.grid.height or len(json_data[0]) != self.grid.width:
+                self.grid = MazeGrid(len(json_data[0]), len(json_data))
+                self.cell_map = self.grid.cell_map
+
+            for y in range(self.grid.height):
+                for x in range(self.grid.width):
                     cell = self.cell_map[y][x]
                     cell.wall_data = json_data[y][x][0]
                     cell.damage = json_data[y][x][1]
                     cell.has_survivor = json_data[y][x][2]
                     cell.x = json_data[y][x][3][0]
                     cell.y = json_data[y][x][3][1]
+                    self.notify_cell_changed(x, y)
 
     def save(self, file):
         with open(file, 'w') as f:
             f.write(self.to_json())
-        
+
+    def save_snapshot(self, file):
+        """
+        Write a binary snapshot of the maze (MazeGrid.to_snapshot), explored cells included.
+
+        The file is replaced in one go, so a snapshot written after every explored cell is never
+        left half written.
+        """
+        temporary_file = file + '.tmp'
+        with open(temporary_file, 'wb') as f:
+            f.write(self.grid.to_snapshot())
+        os.replace(temporary_file, file)
+
+    def load_snapshot(self, file):
+        """Load a snapshot written by save_snapshot, raises ValueError if the file is not one."""
+        with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            width, height = snapshot_size(data)
+            if height != self.grid.height or width != self.grid.width:
+                self.grid = MazeGrid(width, height)
+                self.cell_map = self.grid.cell_map
+            self.grid.load_snapshot(data)
+
+        for y in range(self.grid.height):
+            for x in range(self.grid.width):
+                self.notify_cell_changed(x, y)
+
+def json_to_snapshot(json_file, snapshot_file):
+    """Convert a maze saved by Maze.save to a snapshot (nothing is explored, the JSON does not keep it)."""
+    maze = Maze()
+    maze.from_file(json_file)
+    maze.save_snapshot(snapshot_file)
+
+def snapshot_to_json(snapshot_file, json_file):
+    """Convert a snapshot to the JSON of Maze.save (explored cells are not kept)."""
+    maze = Maze()
+    maze.load_snapshot(snapshot_file)
+    maze.save(json_file)
+
 
 class Cell:
     def __init__(self):
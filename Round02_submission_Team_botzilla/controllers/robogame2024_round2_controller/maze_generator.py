@@ -0,0 +1,128 @@
+"""
+Seeded random mazes in the Maze.from_file layout (maze.json), for the benchmarks and the batch runner.
+
+    python maze_generator.py mazes --count 50 --size 20 --loops 0.1 --fire-pits 0.1 --survivors 3
+
+The same seed and settings always give the same maze. The walls are a spanning tree of the grid
+(every cell is reachable) with a share of the remaining inner walls knocked down to make loops,
+the outer walls are closed but for the south side of the entrance cell, like the competition world.
+"""
+import argparse
+import os
+import random
+
+from maze import Maze, MAZE_CELL_SIZE, DIRECTIONS
+from fake_robot import TILE_SIZE
+
+OPPOSITE_WALL = [1, 0, 3, 2] # wall index on the other side of a North, South, East, West wall
+FIRE_PIT_DAMAGES = (10, 40)
+NO_DAMAGE = -1 # floor of the cells without a fire pit, as in maze.json
+
+def entrance_cell(width, height):
+    """The entrance is in the middle of the south side, ENTRANCE_CELL on a 20x20 maze."""
+    return (width // 2, height - 1)
+
+def carve_walls(width, height, rng):
+    """Flat wall data lists (index y * width + x) of a random depth-first spanning tree of the grid."""
+    walls = [[1, 1, 1, 1] for _ in range(width * height)]
+    visited = bytearray(width * height)
+    start = entrance_cell(width, height)
+    stack = [start]
+    visited[start[1] * width + start[0]] = 1
+
+    while stack:
+        x, y = stack[-1]
+        options = []
+        for direction, (dx, dy) in enumerate(DIRECTIONS):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height and not visited[ny * width + nx]:
+                options.append((direction, nx, ny))
+        if not options:
+            stack.pop()
+            continue
+        direction, nx, ny = rng.choice(options)
+        walls[y * width + x][direction] = 0
+        walls[ny * width + nx][OPPOSITE_WALL[direction]] = 0
+        visited[ny * width + nx] = 1
+        stack.append((nx, ny))
+    return walls
+
+def add_loops(walls, width, height, loop_density, rng):
+    """Knock down loop_density of the inner walls left by carve_walls (their East and South sides)."""
+    inner_walls = []
+    for y in range(height):
+        for x in range(width):
+            cell_walls = walls[y * width + x]
+            if x + 1 < width and cell_walls[2]:
+                inner_walls.append((x, y, 2))
+            if y + 1 < height and cell_walls[1]:
+                inner_walls.append((x, y, 1))
+
+    for x, y, direction in rng.sample(inner_walls, round(len(inner_walls) * loop_density)):
+        dx, dy = DIRECTIONS[direction]
+        walls[y * width + x][direction] = 0
+        walls[(y + dy) * width + x + dx][OPPOSITE_WALL[direction]] = 0
+
+def generate_maze(size=MAZE_CELL_SIZE, height=None, seed=0, loop_density=0.1, fire_pit_density=0.1, survivor_count=3):
+    """
+    A random maze of size x height cells.
+
+    :param loop_density: share (0 to 1) of the inner walls of the spanning tree removed, 0 gives a perfect maze
+    :param fire_pit_density: share of the cells (the entrance aside) with a fire pit, of damage 10 or 40 with equal odds
+    :param survivor_count: survivors, put in dead ends without a fire pit first (the explorers only
+        see survivors on a wall in front of them, which dead ends always have), then in other free cells
+    """
+    width, height = size, size if height is None else height
+    rng = random.Random(seed)
+    entrance = entrance_cell(width, height)
+
+    walls = carve_walls(width, height, rng)
+    add_loops(walls, width, height, loop_density, rng)
+    walls[entrance[1] * width + entrance[0]][1] = 0 # the way in
+
+    cells = [(x, y) for y in range(height) for x in range(width) if (x, y) != entrance]
+    fire_pits = set(rng.sample(cells, round(len(cells) * fire_pit_density)))
+    free_cells = [cell for cell in cells if cell not in fire_pits]
+    if survivor_count > len(free_cells):
+        raise ValueError(f'{survivor_count} survivors do not fit in the {len(free_cells)} free cells of the maze')
+    dead_ends = [(x, y) for x, y in free_cells if sum(walls[y * width + x]) == 3]
+    survivors = rng.sample(dead_ends, min(survivor_count, len(dead_ends)))
+    if len(survivors) < survivor_count:
+        chosen = set(survivors)
+        survivors += rng.sample([cell for cell in free_cells if cell not in chosen], survivor_count - len(survivors))
+    survivors = set(survivors)
+
+    # Cell centres as FakeRobot places a maze without coordinates, centred on the origin
+    origin_x = -(width / 2 - 0.5) * TILE_SIZE
+    origin_y = (height / 2 - 0.5) * TILE_SIZE
+
+    maze = Maze(width, height)
+    for y in range(height):
+        for x in range(width):
+            cell = maze.cell_map[y][x]
+            cell.wall_data = walls[y * width + x]
+            cell.damage = rng.choice(FIRE_PIT_DAMAGES) if (x, y) in fire_pits else NO_DAMAGE
+            cell.has_survivor = int((x, y) in survivors)
+            cell.x = origin_x + x * TILE_SIZE
+            cell.y = origin_y - y * TILE_SIZE
+    return maze
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write seeded random mazes in the maze.json layout.')
+    parser.add_argument('directory', help='where the maze_<seed>.json files are written')
+    parser.add_argument('--count', type=int, default=1, help='mazes to write, with consecutive seeds')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first maze')
+    parser.add_argument('--size', type=int, default=MAZE_CELL_SIZE, help='cells per side')
+    parser.add_argument('--loops', type=float, default=0.1, help='share of the inner walls removed to make loops')
+    parser.add_argument('--fire-pits', type=float, default=0.1, help='share of the cells with a fire pit')
+    parser.add_argument('--survivors', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.directory, exist_ok=True)
+    for seed in range(args.seed, args.seed + args.count):
+        maze = generate_maze(args.size, seed=seed, loop_density=args.loops, fire_pit_density=args.fire_pits, survivor_count=args.survivors)
+        maze.save(os.path.join(args.directory, f'maze_{seed}.json'))
+    print(f'{args.count} mazes of {args.size}x{args.size} written to {args.directory}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+import math
+import struct
+from array import array
+
+WALL_BITS = (1, 2, 4, 8) # North, South, East, West, in the order of Cell.wall_data
+NO_DAMAGE = -128 # damage of a cell that was never sensed (Cell.damage is None)
+WALL_TUPLES = [tuple(1 if walls & bit else 0 for bit in WALL_BITS) for walls in range(16)]
+
+SNAPSHOT_MAGIC = b'MAZE'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = '<4sBHH' # magic, version, width, height
+
+# Byte translation tables packing two 4-bit wall masks per byte
+LOW_NIBBLE = bytes(byte & 0x0F for byte in range(256))
+HIGH_NIBBLE = bytes(byte >> 4 for byte in range(256))
+TO_HIGH_NIBBLE = bytes((byte & 0x0F) << 4 for byte in range(256))
+
+def flat_cells(cell_map):
+    """
+    Return (walls, cost) of every cell indexed by y * width + x, for the inner loops of the planners: the
+    arrays of a MazeGrid cell_map themselves, copies of a list of Cell objects (kept up to date with copy_cell).
+    """
+    grid = getattr(cell_map, 'grid', None)
+    if grid is not None:
+        return grid.walls, grid.cost
+    width, height = len(cell_map[0]), len(cell_map)
+    walls, cost = bytearray(width * height), array('h', [0]) * (width * height)
+    for y in range(height):
+        for x in range(width):
+            copy_cell(cell_map, walls, cost, x, y)
+    return walls, cost
+
+def copy_cell(cell_map, walls, cost, x, y):
+    """Copy a changed cell of a list of Cell objects into the arrays of flat_cells, nothing to do on a MazeGrid."""
+    if getattr(cell_map, 'grid', None) is not None:
+        return
+    cell = cell_map[y][x]
+    i = y * len(cell_map[0]) + x
+    walls[i] = wall_bits(cell.wall_data)
+    cost[i] = cell.get_cost()
+
+def wall_bits(wall_data):
+    """Walls bitmask (WALL_BITS) of a [North, South, East, West] wall list."""
+    walls = 0
+    for bit, wall in zip(WALL_BITS, wall_data):
+        if wall: walls |= bit
+    return walls
+
+def damage_cost(damage):
+    """Same as Cell.get_cost for a damage code."""
+    if damage == NO_DAMAGE or damage == -1: return 1
+    return damage
+
+def snapshot_size(data):
+    """(width, height) of the maze in a snapshot, ValueError if it is not a snapshot of this version."""
+    if len(data) < struct.calcsize(SNAPSHOT_HEADER):
+        raise ValueError('maze snapshot is truncated')
+    magic, version, width, height = struct.unpack_from(SNAPSHOT_HEADER, data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError('not a maze snapshot')
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f'unsupported maze snapshot version {version}')
+    return width, height
+
+class BitSet:
+    __slots__ = ('bits',)
+
+    def __init__(self, size):
+        self.bits = bytearray((size + 7) >> 3)
+
+    def __getitem__(self, i):
+        return (self.bits[i >> 3] >> (i & 7)) & 1
+
+    def __setitem__(self, i, value):
+        if value:
+            self.bits[i >> 3] |= 1 << (i & 7)
+        else:
+            self.bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+    def count(self):
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+class MazeGrid:
+    """
+    Compact grid of maze cells stored in flat arrays indexed by y * width + x.
+
+    Walls are a bitmask byte per cell (WALL_BITS), damage and cost are int arrays, explored and
+    survivors are bitsets. cell_map gives Cell-like views on top of it, so code written for the
+    list of Cell objects (cell_map[y][x].damage, .wall_data[i], .get_cost(), ...) runs unchanged.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        size = width * height
+
+        self.walls = bytearray(size)
+        self.damage = array('h', [NO_DAMAGE]) * size
+        self.cost = array('h', [1]) * size
+        self.cost_counts = {1: size} # cells of each cost, for cost_range()
+        self.x = array('d', [math.nan]) * size # gps coordinates
+        self.y = array('d', [math.nan]) * size
+        self.explored = BitSet(size)
+        self.survivors = BitSet(size)
+        self.survivors_known = BitSet(size) # Cell.has_survivor is None until it is set
+
+        self.cell_map = GridRows(self)
+
+    def index(self, x, y):
+        return y * self.width + x
+
+    def cell(self, x, y):
+        return CellView(self, y * self.width + x)
+
+    def wall_data(self, x, y):
+        return WALL_TUPLES[self.walls[y * self.width + x]]
+
+    def get_cost(self, x, y):
+        return self.cost[y * self.width + x]
+
+    def cost_range(self):
+        """Lowest and highest cell cost, kept up to date by set_damage and load_snapshot."""
+        return min(self.cost_counts), max(self.cost_counts)
+
+    def set_damage(self, i, damage):
+        damage = NO_DAMAGE if damage is None else damage
+        self.damage[i] = damage
+        old_cost, cost = self.cost[i], damage_cost(damage)
+        if cost != old_cost:
+            self.cost[i] = cost
+            self.cost_counts[cost] = self.cost_counts.get(cost, 0) + 1
+            self.cost_counts[old_cost] -= 1
+            if not self.cost_counts[old_cost]:
+                del self.cost_counts[old_cost]
+
+    def set_walls(self, i, wall_data):
+        self.walls[i] = wall_bits(wall_data)
+
+    def to_array(self):
+        return [[cell.to_array() for cell in row] for row in self.cell_map]
+
+    #----------------------------------------------
+    # Snapshots
+    #----------------------------------------------
+
+    def to_snapshot(self):
+        """
+        Binary snapshot of every cell: header (magic, version, width, height), the wall masks packed
+        two cells per byte, the damage as int8 (NO_DAMAGE when unknown), the survivor, known survivor
+        and explored bitsets, then the gps x and y coordinates as float32 (NaN when unknown).
+        """
+        size = self.width * self.height
+        low = self.walls[0::2]
+        high = self.walls[1::2].translate(TO_HIGH_NIBBLE)
+        walls = (int.from_bytes(low, 'little') | int.from_bytes(high, 'little')).to_bytes(len(low), 'little')
+
+        return b''.join((
+            struct.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.width, self.height),
+            walls,
+            array('b', self.damage).tobytes(),
+            bytes(self.survivors.bits),
+            bytes(self.survivors_known.bits),
+            bytes(self.explored.bits),
+            array('f', self.x).tobytes(),
+            array('f', self.y).tobytes(),
+        ))
+
+    def load_snapshot(self, data):
+        """Overwrite every cell from a snapshot (bytes, mmap, ...) of a maze of the same size."""
+        if snapshot_size(data) != (self.width, self.height):
+            raise ValueError(f'maze snapshot is {snapshot_size(data)}, the grid is {(self.width, self.height)}')
+
+        size = self.width * self.height
+        bitset_size = len(self.explored.bits)
+        wall_size = (size + 1) // 2
+        offset = struct.calcsize(SNAPSHOT_HEADER)
+        if len(data) != offset + wall_size + size + 3 * bitset_size + 8 * size:
+            raise ValueError('maze snapshot is truncated')
+
+        # The arrays are updated in place, searches may hold on to them
+        with memoryview(data) as view:
+            walls = bytes(view[offset:offset + wall_size])
+            self.walls[0::2] = walls.translate(LOW_NIBBLE)
+            self.walls[1::2] = walls.translate(HIGH_NIBBLE)[:size // 2]
+            offset += wall_size
+
+            damage = array('b')
+            damage.frombytes(view[offset:offset + size])
+            self.damage[:] = array('h', damage)
+            self.cost[:] = array('h', (damage_cost(value) for value in damage))
+            self.cost_counts = {}
+            for cost in self.cost:
+                self.cost_counts[cost] = self.cost_counts.get(cost, 0) + 1
+            offset += size
+
+            for bitset in (self.survivors, self.survivors_known, self.explored):
+                bitset.bits[:] = view[offset:offset + bitset_size]
+                offset += bitset_size
+
+            for coordinates in (self.x, self.y):
+                values = array('f')
+                values.frombytes(view[offset:offset + 4 * size])
+                coordinates[:] = array('d', values)
+                offset += 4 * size
+
+class GridRows:
+    __slots__ = ('grid',)
+
+    def __init__(self, grid):
+        self.grid = grid
+
+    def __len__(self):
+        return self.grid.height
+
+    def __getitem__(self, y):
+        if y < 0: y += self.grid.height
+        if not 0 <= y < self.grid.height: raise IndexError(y)
+        return GridRow(self.grid, y)
+
+    def __iter__(self):
+        for y in range(self.grid.height):
+            yield GridRow(self.grid, y)
+
+class GridRow:
+    __slots__ = ('grid', 'offset')
+
+    def __init__(self, grid, y):
+        self.grid = grid
+        self.offset = y * grid.width
+
+    def __len__(self):
+        return self.grid.width
+
+    def __getitem__(self, x):
+        if x < 0: x += self.grid.width
+        if not 0 <= x < self.grid.width: raise IndexError(x)
+        return CellView(self.grid, self.offset + x)
+
+    def __iter__(self):
+        for x in range(self.grid.width):
+            yield CellView(self.grid, self.offset + x)
+
+class WallView:
+    """List-like [north, south, east, west] view of the wall bits of a cell."""
+    __slots__ = ('grid', 'index')
+
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, i):
+        return 1 if self.grid.walls[self.index] & WALL_BITS[i] else 0
+
+    def __setitem__(self, i, value):
+        if value:
+            self.grid.walls[self.index] |= WALL_BITS[i]
+        else:
+            self.grid.walls[self.index] &= ~WALL_BITS[i] & 0xFF
+
+    def __iter__(self):
+        walls = self.grid.walls[self.index]
+        return iter([1 if walls & bit else 0 for bit in WALL_BITS])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+class CellView:
+    """Cell-compatible view of one cell of a MazeGrid."""
+    __slots__ = ('grid', 'index')
+
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+
+    @property
+    def explored(self):
+        return bool(self.grid.explored[self.index])
+
+    @explored.setter
+    def explored(self, value):
+        self.grid.explored[self.index] = value
+
+    @property
+    def x(self):
+        x = self.grid.x[self.index]
+        return None if math.isnan(x) else x
+
+    @x.setter
+    def x(self, value):
+        self.grid.x[self.index] = math.nan if value is None else value
+
+    @property
+    def y(self):
+        y = self.grid.y[self.index]
+        return None if math.isnan(y) else y
+
+    @y.setter
+    def y(self, value):
+        self.grid.y[self.index] = math.nan if value is None else value
+
+    @property
+    def wall_data(self):
+        return WallView(self.grid, self.index)
+
+    @wall_data.setter
+    def wall_data(self, wall_data):
+        self.grid.set_walls(self.index, wall_data)
+
+    @property
+    def damage(self):
+        damage = self.grid.damage[self.index]
+        return None if damage == NO_DAMAGE else damage
+
+    @damage.setter
+    def damage(self, value):
+        self.grid.set_damage(self.index, value)
+
+    @property
+    def has_survivor(self):
+        if not self.grid.survivors_known[self.index]:
+            return None
+        return self.grid.survivors[self.index]
+
+    @has_survivor.setter
+    def has_survivor(self, value):
+        self.grid.survivors_known[self.index] = value is not None
+        self.grid.survivors[self.index] = value
+
+    def get_cost(self):
+        return self.grid.cost[self.index]
+
+    def to_array(self):
+        return [list(self.wall_data), self.damage, self.has_survivor, [self.x, self.y]]
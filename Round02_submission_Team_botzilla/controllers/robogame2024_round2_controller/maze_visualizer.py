@@ -1,58 +1,183 @@
-import pygame
+import os
+import time
 from colors import *
-from threading import Thread
+
+# Imported by the first MazeVisualizer, so the controller does not need pygame unless it draws
+pygame = None
 
 # Constants
 CELL_SIZE = 20
-GRID_SIZE = 20
-WIDTH, HEIGHT = GRID_SIZE * CELL_SIZE + 50, GRID_SIZE * CELL_SIZE + 50
+MARGIN = 50
 
 # Grid Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 BLUE = (173, 216, 230)
 PINK = (255, 192, 203)
+GREEN = (0, 255, 0)
 
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Real-Time Maze Drawer")
-clock = pygame.time.Clock()
+def import_pygame(headless):
+    """Import pygame on first use, with SDL's dummy video driver when nothing is to be shown."""
+    global pygame
+    if headless:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    if pygame is None:
+        os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+        import pygame as module
+        pygame = module
+    return pygame
 
 class MazeVisualizer:
-    def __init__(self, maze):
+    """
+    Drawing of a maze that follows its changes, in a window or offscreen.
+
+    The visualizer listens to the cells of the maze and only repaints the ones that changed
+    (and the walls around them) since the previous frame. Frames are drawn at most max_fps times
+    a second, changes in between are kept for the next frame, so draw() can be called from the
+    control loop as often as it likes. When headless nothing is shown and the picture is only
+    kept for save_png().
+    """
+
+    def __init__(self, maze, headless=False, max_fps=10, caption="Real-Time Maze Drawer"):
+        import_pygame(headless)
         self.maze = maze
+        self.headless = headless
+        self.frame_interval = 1 / max_fps if max_fps else 0
+
+        width, height = maze.grid.width * CELL_SIZE + MARGIN, maze.grid.height * CELL_SIZE + MARGIN
+        if headless:
+            self.screen = pygame.Surface((width, height))
+        else:
+            pygame.display.init()
+            self.screen = pygame.display.set_mode((width, height))
+            pygame.display.set_caption(caption)
+
+        self.route = set()
+        self.dirty_cells = set()
+        self.full_redraw = True
+        self.last_frame = None
+
+        self.frames = 0
+        self.frames_skipped = 0
+        self.cells_drawn = 0
+
+        maze.add_cell_listener(self.on_cell_changed)
+
+    def on_cell_changed(self, x, y):
+        self.dirty_cells.add((x, y))
+        self.draw()
+
+    def set_route(self, route):
+        """Mark the cells of a route, only the cells joining or leaving it are repainted."""
+        route = set(route or ())
+        self.dirty_cells |= route ^ self.route
+        self.route = route
+
+    #----------------------------------------------
+    # Drawing
+    #----------------------------------------------
+
+    def draw(self, best_route=None, force=False):
+        """Draw a frame with the pending changes, returns False when it is too early for one (unless forced)."""
+        if best_route is not None:
+            self.set_route(best_route)
+        if not self.full_redraw and not self.dirty_cells:
+            return False
+        now = time.perf_counter()
+        if not force and self.last_frame is not None and now - self.last_frame < self.frame_interval:
+            self.frames_skipped += 1
+            return False
+        self.last_frame = now
+
+        # The cells are only read here, the maze may have changed the grid (Maze.from_file)
+        width, height = self.maze.grid.width, self.maze.grid.height
+        if self.full_redraw or self.screen.get_size() != (width * CELL_SIZE + MARGIN, height * CELL_SIZE + MARGIN):
+            self.redraw(width, height)
+        else:
+            self.draw_dirty_cells(width, height)
+
+        self.frames += 1
+        if not self.headless:
+            pygame.display.flip()
+            pygame.event.pump()
+        return True
+
+    def redraw(self, width, height):
+        size = (width * CELL_SIZE + MARGIN, height * CELL_SIZE + MARGIN)
+        if self.screen.get_size() != size:
+            self.screen = pygame.Surface(size) if self.headless else pygame.display.set_mode(size)
+        self.screen.fill(WHITE)
+        for y in range(height):
+            for x in range(width):
+                self.draw_cell(x, y)
+        for y in range(height):
+            for x in range(width):
+                self.draw_walls(x, y)
+        self.draw_boundary(width, height)
+        self.cells_drawn += width * height
+        self.full_redraw = False
+        self.dirty_cells.clear()
+
+    def draw_dirty_cells(self, width, height):
+        # Wall lines are 2 pixels wide and overlap the cells around them, they are drawn after the fills
+        walls = set()
+        for x, y in self.dirty_cells:
+            self.draw_cell(x, y)
+            walls.update((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+        for x, y in walls:
+            if 0 <= x < width and 0 <= y < height:
+                self.draw_walls(x, y)
+        self.draw_boundary(width, height)
+        self.cells_drawn += len(self.dirty_cells)
+        self.dirty_cells.clear()
+
+    def draw_cell(self, x, y):
+        cell = self.maze.cell_map[y][x]
+        px, py = x * CELL_SIZE, y * CELL_SIZE
+
+        if cell.damage == 0:
+            color = YELLOW
+        elif cell.damage == 10:
+            color = ORANGE
+        elif cell.damage == 40:
+            color = RED
+        elif cell.explored:
+            color = BLUE
+        else:
+            color = WHITE
+        pygame.draw.rect(self.screen, color, (px, py, CELL_SIZE, CELL_SIZE))
+
+        if cell.has_survivor:
+            pygame.draw.circle(self.screen, GREEN, (px + CELL_SIZE // 2, py + CELL_SIZE // 2), 5)
+
+        if (x, y) in self.route:
+            pygame.draw.circle(self.screen, BLACK, (px + CELL_SIZE // 2, py + CELL_SIZE // 2), 2.5)
+
+    def draw_walls(self, x, y):
+        wall_data = self.maze.cell_map[y][x].wall_data
+        px, py = x * CELL_SIZE, y * CELL_SIZE
+        if wall_data[0]:  # North
+            pygame.draw.line(self.screen, BLACK, (px, py), (px + CELL_SIZE, py), 2)
+        if wall_data[1]:  # South
+            pygame.draw.line(self.screen, BLACK, (px, py + CELL_SIZE), (px + CELL_SIZE, py + CELL_SIZE), 2)
+        if wall_data[2]:  # East
+            pygame.draw.line(self.screen, BLACK, (px + CELL_SIZE, py), (px + CELL_SIZE, py + CELL_SIZE), 2)
+        if wall_data[3]:  # West
+            pygame.draw.line(self.screen, BLACK, (px, py), (px, py + CELL_SIZE), 2)
+
+    def draw_boundary(self, width, height):
+        # maze boundaries in red lines
+        pygame.draw.rect(self.screen, RED, (0, 0, width * CELL_SIZE, height * CELL_SIZE), 2)
+
+    #----------------------------------------------
+    # Output
+    #----------------------------------------------
+
+    def save_png(self, file):
+        """Write the maze as it is now to a PNG file, pending changes included."""
+        self.draw(force=True)
+        pygame.image.save(self.screen, file)
 
-    def draw(self, best_route=None):
-        screen.fill(WHITE)
-        # draw maze boundaries in red lines
-        pygame.draw.rect(screen, RED, (0, 0, GRID_SIZE * CELL_SIZE, GRID_SIZE * CELL_SIZE), 2)
-        for y in range(GRID_SIZE):
-            for x in range(GRID_SIZE):
-                cell = self.maze.cell_map[y][x]
-                px, py = x * CELL_SIZE, y * CELL_SIZE
-                
-                if cell.damage == 0:
-                    pygame.draw.rect(screen, YELLOW, (px, py, CELL_SIZE, CELL_SIZE))
-                elif cell.damage == 10:
-                    pygame.draw.rect(screen, ORANGE, (px, py, CELL_SIZE, CELL_SIZE))
-                elif cell.damage == 40:
-                    pygame.draw.rect(screen, RED, (px, py, CELL_SIZE, CELL_SIZE))
-                elif cell.explored:
-                    pygame.draw.rect(screen, BLUE, (px, py, CELL_SIZE, CELL_SIZE))
-
-                if cell.has_survivor:
-                    pygame.draw.circle(screen, (0, 255, 0), (px + CELL_SIZE // 2, py + CELL_SIZE // 2), 5)
-
-                if best_route and (x, y) in best_route:
-                    pygame.draw.circle(screen,  BLACK, (px + CELL_SIZE // 2, py + CELL_SIZE // 2), 2.5)
-
-                if cell.wall_data[0]:  # North
-                    pygame.draw.line(screen, BLACK, (px, py), (px + CELL_SIZE, py), 2)
-                if cell.wall_data[1]:  # South
-                    pygame.draw.line(screen, BLACK, (px, py + CELL_SIZE), (px + CELL_SIZE, py + CELL_SIZE), 2)
-                if cell.wall_data[2]:  # East
-                    pygame.draw.line(screen, BLACK, (px + CELL_SIZE, py), (px + CELL_SIZE, py + CELL_SIZE), 2)
-                if cell.wall_data[3]:  # West
-                    pygame.draw.line(screen, BLACK, (px, py), (px, py + CELL_SIZE), 2)
-        pygame.display.flip()
-        pygame.event.get()
\ No newline at end of file
+    def close(self):
+        if not self.headless:
+            pygame.display.quit()
@@ -1,27 +1,42 @@
+import time
+
 from robot_utils import RobotUtils
 from navigation_utils import NavigationUtils
 from maze import Maze
-# from maze_visualizer import MazeVisualizer
 from astar_solver import AStarSolver
-import time
+from distance_oracle import DistanceOracle
+from dstar_lite import DStarLite
+from instrumentation import timed
 
 ENTRANCE_CELL = (10, 19)
 
 class Mission:
-    def __init__(self, maze, initial_position, initial_bearing, entarnce_position, robot):
+    def __init__(self, maze, initial_position, initial_bearing, entarnce_position, robot, planning_mode='optimal', perception=None, visualizer=None, motion_control=False, wait_clock=time.time):
         self.initial_position = initial_position
         self.initial_bearing = initial_bearing
         self.entrance_position = entarnce_position
 
         self.robot_utils = RobotUtils(robot)
-        self.nav_utils = NavigationUtils(self.robot_utils)
+        self.nav_utils = NavigationUtils(self.robot_utils, motion_control)
         self.maze = maze
+        self.planning_mode = planning_mode # 'optimal' (lowest damage-weighted cost) or 'greedy' (nearest survivor first)
+        self.perception = perception # colors of cells may still be classified in the background
+        self.wait_clock = wait_clock # clock in seconds of the wait at each survivor (wall clock, the simulated one on FakeRobot runs)
 
         self.survivor_cells = self.find_survivor_cells()
 
+        # Path costs between key points, dropped when the maze updates a cell they depend on
+        self.oracle = DistanceOracle(self.maze.cell_map)
+        self.maze.add_cell_listener(self.oracle.invalidate_cell)
+
+        # Incremental planner of the leg being driven, repaired when a cell changes during the run
+        self.planner = None
+        self.changed_cells = set()
+        self.maze.add_cell_listener(self.on_cell_changed)
+
         self.p_millis = 0
 
-        # self.maze_visualizer = MazeVisualizer(self.maze)
+        self.visualizer = visualizer # MazeVisualizer of the maze, shows the route
 
     def get_normalized_shortest_path(self, points):
         if len(points) <= 2:
@@ -58,6 +73,63 @@ class Mission:
 
         return normalized_points
     
+    def split_legs(self, route):
+        """Split a route (without its start cell) into legs ending at each survivor reached first time, and at the exit."""
+        legs = []
+        leg = []
+        rescued = set()
+        survivors = set(self.survivor_cells)
+        for point in route:
+            leg.append(point)
+            if point in survivors and point not in rescued:
+                rescued.add(point)
+                legs.append(leg)
+                leg = []
+        if leg:
+            legs.append(leg)
+        return legs
+
+    def drive_cells(self, path, reverse):
+        """
+        Drive along a path of cells, the first one being the current cell.
+
+        Stops early, at the next waypoint, when a cell of the maze changed. Returns the cell reached
+        and whether the robot drives in reverse from there.
+        """
+        normalized_route = self.get_normalized_shortest_path(path)
+        reached = path[0]
+        segment = [] # waypoints driven in one go, up to a survivor or a change of direction
+        segment_cells = {} # cell of each waypoint of the segment
+
+        for i, point in enumerate(normalized_route):
+            cell = self.maze.cell_map[point[1]][point[0]]
+            segment.append((cell.x, cell.y))
+            segment_cells[(cell.x, cell.y)] = point
+
+            next_reverse = reverse
+            if (cell.has_survivor):
+                next_reverse = True
+            elif (cell.damage <= 0):
+                next_reverse = False
+
+            if cell.has_survivor or next_reverse != reverse or i == len(normalized_route) - 1:
+                stopped = self.nav_utils.follow_path(segment, reverse, stop=lambda: bool(self.changed_cells))
+                if stopped is not None and segment_cells[stopped] != point:
+                    return segment_cells[stopped], reverse
+                segment = []
+                segment_cells = {}
+                reached = point
+                if self.changed_cells and i < len(normalized_route) - 1:
+                    return reached, next_reverse
+            reverse = next_reverse
+
+        return reached, reverse
+
+    def on_cell_changed(self, x, y):
+        self.changed_cells.add((x, y))
+        if self.planner is not None:
+            self.planner.update_cell(x, y)
+
     def find_survivor_cells(self):
         survivor_cells = []
         for y in range(0, len(self.maze.cell_map)):
@@ -67,38 +139,59 @@ class Mission:
                     survivor_cells.append((x, y))
         return survivor_cells
 
+    @timed('phase.mission')
     def run(self):
         # Move to the entrance position
         self.nav_utils.move_to_point(self.entrance_position[0], self.entrance_position[1])
 
-        # Start solving the maze
-        solver = AStarSolver(self.maze.cell_map, ENTRANCE_CELL, self.survivor_cells, ENTRANCE_CELL)
-
-        best_route = solver.find_rescue_route()
-        normalized_route = self.get_normalized_shortest_path(best_route)
+        # The route depends on the damage and survivors of every cell
+        if self.perception is not None:
+            self.perception.wait()
+            self.survivor_cells = self.find_survivor_cells()
 
-        survivor_detected = False
+        # Start solving the maze
+        solver = AStarSolver(self.maze.cell_map, ENTRANCE_CELL, self.survivor_cells, ENTRANCE_CELL, self.oracle)
+
+        # Only the plan of the planning mode is made, benchmarks.py compares both
+        if self.planning_mode == 'optimal':
+            best_route = solver.find_optimal_rescue_route()
+        else:
+            best_route = solver.find_rescue_route()
+        report = solver.route_report(best_route)
+        print(f"{self.planning_mode} plan: {report['cells']} cells, {report['damage']} damage, {report['travel_time']:.0f} s of travel")
+        if self.visualizer is not None:
+            self.visualizer.draw(best_route, force=True)
+
+        current = ENTRANCE_CELL
         reverse = False
 
-        for point in normalized_route:
-            cell = self.maze.cell_map[point[1]][point[0]]
-
-            if reverse:
-                self.nav_utils.move_to_point_reverse(cell.x, cell.y)
-            else:
-                self.nav_utils.move_to_point(cell.x, cell.y)
-
-            if (cell.has_survivor):
-                reverse = True
-            elif (cell.damage <= 0):
-                reverse = False
-
-            if cell.has_survivor:
+        for leg in self.split_legs(best_route):
+            goal = leg[-1]
+            # Kept up to date by on_cell_changed, so a change only repairs the affected part of the leg
+            self.planner = DStarLite(self.maze.cell_map, current, goal)
+            self.planner.compute_shortest_path()
+            path = [current] + leg
+
+            while True:
+                self.changed_cells.clear()
+                current, reverse = self.drive_cells(path, reverse)
+                if current == goal:
+                    break
+
+                print(f"Maze changed at {sorted(self.changed_cells)}, replanning...")
+                self.planner.move_start(current)
+                path = self.planner.compute_path()
+                if path is None:
+                    print("Target can not be reached anymore!")
+                    break
+            self.planner = None
+
+            if self.maze.cell_map[goal[1]][goal[0]].has_survivor:
                 print("Extracting Survivor... Wait for 3 seconds")
-                # wait for 3 seconds (3000000000 nanoseconds)
-                self.p_millis = time.time_ns()
-                while (time.time_ns() - self.p_millis < 3000000000):
-                    self.robot_utils.step()
+                # wait for 3 seconds
+                self.p_millis = self.wait_clock()
+                while (self.wait_clock() - self.p_millis < 3):
+                    if not self.robot_utils.step(): break
                 print("Survivor Extracted!")
 
         print("Returning to Initial Position...")
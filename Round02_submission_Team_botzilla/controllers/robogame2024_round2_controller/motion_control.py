@@ -0,0 +1,170 @@
+import math
+
+class MoveStats:
+    """Timing of one move: simulation steps and simulated seconds it took, and the error left at the end."""
+
+    def __init__(self, kind, target, start_time):
+        self.kind = kind # 'straight' (target in meters) or 'rotate' (target bearing in degrees)
+        self.target = target
+        self.start_time = start_time
+        self.steps = 0
+        self.time = 0.0
+        self.error = 0.0
+
+class MotionController:
+    """
+    Closed loop moves with velocity controlled wheels.
+
+    Every step the wheel speed follows a trapezoidal profile (accelerate, cruise, decelerate) over
+    the remaining travel measured by the GPS (straight moves) or the compass (rotations), capped so
+    the last step lands on the target instead of creeping toward it. Straight moves also steer
+    against the heading error read from the compass, so drift does not build up along a run.
+
+    The wheels are left in position control at the end of every move, with RobotUtils motor
+    position targets synced to the sensors, so position based moves can follow.
+    """
+
+    def __init__(self, robot, max_speed=None, rotation_speed=None, acceleration=40,
+                 distance_tolerance=0.002, angle_tolerance=0.2, heading_gain=0.2):
+        """
+        :param robot: RobotUtils of the robot to move
+        :param max_speed: wheel speed of straight moves in rad/s (RobotUtils.MAX_SPEED by default)
+        :param rotation_speed: wheel speed of rotations in rad/s (RobotUtils.MAX_SPEED by default)
+        :param acceleration: wheel acceleration in rad/s^2
+        :param distance_tolerance: distance to the target in meters at which a straight move is done
+        :param angle_tolerance: bearing error in degrees at which a rotation is done
+        :param heading_gain: wheel speed difference in rad/s per degree of heading error on straight moves
+        """
+        self.robot = robot
+        self.max_speed = robot.MAX_SPEED if max_speed is None else max_speed
+        self.rotation_speed = robot.MAX_SPEED if rotation_speed is None else rotation_speed
+        self.acceleration = acceleration
+        self.distance_tolerance = distance_tolerance
+        self.angle_tolerance = angle_tolerance
+        self.heading_gain = heading_gain
+        self.dt = robot.TIME_STEP / 1000
+
+        self.speed = 0.0 # wheel speed at the end of the last move
+        self.stats = []
+
+    #----------------------------------------------
+    # Wheels
+    #----------------------------------------------
+
+    def set_wheel_speeds(self, left, right):
+        limit = self.robot.MAX_SPEED
+        self.robot.left_motor.setPosition(float('inf'))
+        self.robot.right_motor.setPosition(float('inf'))
+        self.robot.set_left_motor_speed(max(-limit, min(limit, left)), False)
+        self.robot.set_right_motor_speed(max(-limit, min(limit, right)), False)
+
+    def sync_positions(self, hold=True):
+        """Sync the RobotUtils motor position targets to the wheels, and stop them there when hold is set."""
+        self.robot.left_motor_position = self.robot.left_wheel_sensor_value()
+        self.robot.right_motor_position = self.robot.right_wheel_sensor_value()
+        if hold:
+            self.robot.left_motor.setPosition(self.robot.left_motor_position)
+            self.robot.right_motor.setPosition(self.robot.right_motor_position)
+            self.speed = 0.0
+
+    def profile_speed(self, remaining, speed, max_speed, end_speed=0.0):
+        """Next wheel speed of a trapezoidal profile with `remaining` wheel radians to go."""
+        speed = min(max_speed, speed + self.acceleration * self.dt)
+        speed = min(speed, math.sqrt(end_speed ** 2 + 2 * self.acceleration * remaining))
+        return min(speed, remaining / self.dt)
+
+    #----------------------------------------------
+    # Moves
+    #----------------------------------------------
+
+    def begin(self, kind, target):
+        stats = MoveStats(kind, target, self.robot.time())
+        self.stats.append(stats)
+        return stats
+
+    def end(self, stats, error):
+        stats.time = self.robot.time() - stats.start_time
+        stats.error = error
+        return stats
+
+    def move_straight(self, distance, direction=1, bearing=None, end_speed=0.0, tolerance=None):
+        """
+        Move distance meters forward (direction 1) or backward (direction -1) along a bearing.
+
+        :param bearing: bearing to hold in degrees, the current one when None
+        :param end_speed: wheel speed to keep at the end of the move, to go on with another move without stopping
+        :param tolerance: distance to the target in meters at which the move is done, distance_tolerance when None
+        """
+        stats = self.begin('straight', distance)
+        if tolerance is None:
+            tolerance = self.distance_tolerance
+        if bearing is None:
+            bearing = self.robot.bearing()
+
+        # Unit vector of the bearing (0 is north, +y, and it grows counterclockwise)
+        ux, uy = -math.sin(math.radians(bearing)), math.cos(math.radians(bearing))
+        start_x, start_y = self.robot.current_position()
+        speed = self.speed
+        remaining = distance
+
+        while True:
+            x, y = self.robot.current_position()
+            remaining = distance - ((x - start_x) * ux + (y - start_y) * uy) * direction
+            if remaining < tolerance:
+                break
+
+            speed = self.profile_speed(remaining / self.robot.WHEEL_RADIUS, speed, self.max_speed, end_speed)
+            heading_error = (self.robot.bearing() - bearing + 180) % 360 - 180 # positive when turned to the left
+            correction = self.heading_gain * heading_error
+            self.set_wheel_speeds(direction * speed + correction, direction * speed - correction)
+
+            if not self.robot.step():
+                break
+            stats.steps += 1
+
+        self.speed = speed
+        self.sync_positions(hold=end_speed == 0)
+        return self.end(stats, abs(remaining))
+
+    def rotate_to_angle(self, target_degree, tolerance=None):
+        """Rotate in place to a bearing in degrees, within tolerance degrees (angle_tolerance when None)."""
+        stats = self.begin('rotate', target_degree)
+        if tolerance is None:
+            tolerance = self.angle_tolerance
+        speed = 0.0
+        remaining = 0.0
+
+        while True:
+            remaining = (target_degree - self.robot.bearing() + 180) % 360 - 180 # positive to the left
+            if abs(remaining) < tolerance:
+                break
+
+            # Wheel travel left for that rotation
+            wheel_remaining = math.radians(abs(remaining)) * self.robot.AXLE_LENGTH / 2 / self.robot.WHEEL_RADIUS
+            speed = self.profile_speed(wheel_remaining, speed, self.rotation_speed)
+            turn = speed if remaining > 0 else -speed
+            self.set_wheel_speeds(-turn, turn)
+
+            if not self.robot.step():
+                break
+            stats.steps += 1
+
+        self.sync_positions()
+        return self.end(stats, abs(remaining))
+
+    #----------------------------------------------
+    # Stats
+    #----------------------------------------------
+
+    def summary(self):
+        """Moves, steps, simulated time and mean final error per kind of move."""
+        summary = {}
+        for stats in self.stats:
+            entry = summary.setdefault(stats.kind, {'moves': 0, 'steps': 0, 'time': 0.0, 'error': 0.0})
+            entry['moves'] += 1
+            entry['steps'] += stats.steps
+            entry['time'] += stats.time
+            entry['error'] += stats.error
+        for entry in summary.values():
+            entry['error'] /= entry['moves']
+        return summary
@@ -1,8 +1,19 @@
 import math
+from motion_control import MotionController
+from instrumentation import timed
 
 class NavigationUtils:
-    def __init__(self, robot):
+    ANGLE_TOLERANCE = 0.5        # in degrees, smaller heading errors are not corrected by follow_path
+    HANDOVER_TOLERANCE = 0.05    # in wheel radians, remaining motor travel at which follow_path starts the next move
+    SAME_POINT_DISTANCE = 0.001  # in meters
+    TURN_RADIUS = 0.125          # in meters, radius of the corners driven without stopping by follow_path (half a tile)
+    MOTOR_TOLERANCE = 0.01       # in wheel radians, remaining motor travel at which a move is done
+    ROTATION_SPEED = 2.512       # in rad/s, wheel speed of rotations in place with position targets
+
+    def __init__(self, robot, motion_control=False):
         self.robot = robot
+        # Closed loop moves with velocity controlled wheels, position targets and busy-waits are used when None
+        self.motion = MotionController(robot) if motion_control else None
 
     def shortest_diff_degree(self, current_degree, target_degree):
         return (current_degree - target_degree + 180) % 360 - 180
@@ -17,7 +28,27 @@ class NavigationUtils:
     def distance_of_two_points(self, x1, y1, x2, y2):
         return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
 
-    def rotate_to_angle(self, target_degree):
+    def wait_for_motors(self, tolerance=0.01):
+        while self.robot.step():
+            # Check if the motors have reached their target positions
+            left_position = self.robot.left_wheel_sensor_value()
+            right_position = self.robot.right_wheel_sensor_value()
+
+            if abs(left_position - self.robot.left_motor_position) < tolerance and abs(right_position - self.robot.right_motor_position) < tolerance:
+                break
+
+    @timed('motion.rotate_to_angle')
+    def rotate_to_angle(self, target_degree, tolerance=None):
+        """Rotate in place to a bearing, tolerance is the remaining wheel travel in radians (the motion layer default when None)."""
+        if self.motion is not None:
+            if tolerance is not None:
+                # Wheel travel to the rotation of the robot around its centre
+                tolerance = math.degrees(tolerance * self.robot.WHEEL_RADIUS / (self.robot.AXLE_LENGTH / 2))
+            self.motion.rotate_to_angle(target_degree, tolerance)
+            return
+        if tolerance is None:
+            tolerance = self.MOTOR_TOLERANCE
+
         current_bearing = self.robot.bearing()
         target_bearing = target_degree
 
@@ -38,20 +69,25 @@ class NavigationUtils:
             self.robot.add_right_motor_position(-wheel_rotation)
 
         # Start the motors
-        self.robot.set_left_motor_speed(2.512, False)
-        self.robot.set_right_motor_speed(2.512, False)
+        self.robot.set_left_motor_speed(self.ROTATION_SPEED, False)
+        self.robot.set_right_motor_speed(self.ROTATION_SPEED, False)
 
         # Wait for the motion to complete
-        while self.robot.step():
-            # Check if the motors have reached their target positions
-            left_position = self.robot.left_wheel_sensor_value()
-            right_position = self.robot.right_wheel_sensor_value()
-
-            if abs(left_position - self.robot.left_motor_position) < 0.01 and abs(right_position - self.robot.right_motor_position) < 0.01:
-                break
+        self.wait_for_motors(tolerance)
 
         # Stop the motors
-        self.robot.set_speed(0) # TODO: Do we need to stop the motors?
+        if tolerance <= self.MOTOR_TOLERANCE:
+            self.robot.set_speed(0) # TODO: Do we need to stop the motors?
+
+    def stop(self):
+        """Hold the wheels where they are, they may still be turning from before a controller restart."""
+        self.robot.left_motor_position = self.robot.left_wheel_sensor_value()
+        self.robot.right_motor_position = self.robot.right_wheel_sensor_value()
+        self.robot.left_motor.setPosition(self.robot.left_motor_position)
+        self.robot.right_motor.setPosition(self.robot.right_motor_position)
+        self.robot.set_left_motor_speed(100)
+        self.robot.set_right_motor_speed(100)
+        self.wait_for_motors()
 
     def rotate_left(self):
         bearing = self.robot.direction_bearing()
@@ -69,7 +105,18 @@ class NavigationUtils:
         target_degree = (bearing + 180) % 360
         self.rotate_to_angle(target_degree)
 
-    def move_straight(self, distance, speed_factor=1):
+    @timed('motion.move_straight')
+    def move_straight(self, distance, speed_factor=1, tolerance=None, bearing=None, keep_moving=False):
+        """Move distance meters straight ahead, tolerance is the remaining wheel travel in radians (the motion layer default when None)."""
+        if self.motion is not None:
+            end_speed = self.motion.max_speed if keep_moving else 0.0
+            if tolerance is not None:
+                tolerance *= self.robot.WHEEL_RADIUS
+            self.motion.move_straight(distance, -1 if speed_factor < 0 else 1, bearing, end_speed, tolerance)
+            return
+        if tolerance is None:
+            tolerance = self.MOTOR_TOLERANCE
+
         # Calculate the required wheel rotation in radians
         wheel_rotation = distance / self.robot.WHEEL_RADIUS
 
@@ -82,28 +129,112 @@ class NavigationUtils:
         self.robot.set_right_motor_speed(100)
 
         # Wait for the motion to complete
-        while self.robot.step():
-            # Check if the motors have reached their target positions
-            left_position = self.robot.left_wheel_sensor_value()
-            right_position = self.robot.right_wheel_sensor_value()
-
-            if abs(left_position - self.robot.left_motor_position) < 0.01 and abs(right_position - self.robot.right_motor_position) < 0.01:
-                break
-
-    def move_to_point(self, x, y):        
-        current_x, current_y = self.robot.current_position()
-
-        target_degree = self.direction_of_tow_poits(current_x, current_y, x, y)
-        self.rotate_to_angle(target_degree)
-
-        distance = self.distance_of_two_points(current_x, current_y, x, y)
-        self.move_straight(distance)
-
-    def move_to_point_reverse(self, x, y):        
-        current_x, current_y = self.robot.current_position()
-
-        target_degree = self.direction_of_tow_poits(current_x, current_y, x, y)
-        self.rotate_to_angle((target_degree + 180) % 360)
-
-        distance = self.distance_of_two_points(current_x, current_y, x, y)
-        self.move_straight(distance, -1)
\ No newline at end of file
+        self.wait_for_motors(tolerance)
+
+    def move_to_point(self, x, y):
+        self.follow_path([(x, y)])
+
+    def move_to_point_reverse(self, x, y):
+        self.follow_path([(x, y)], reverse=True)
+
+    #----------------------------------------------
+    # Trajectory execution
+    #----------------------------------------------
+
+    def merge_straight_runs(self, points):
+        """Drop the waypoints in the middle of straight runs, keeping the corners and the last point."""
+        merged = []
+        for point in points:
+            point = (point[0], point[1])
+            if len(merged) >= 2:
+                (x1, y1), (x2, y2) = merged[-2], merged[-1]
+                # Collinear and in the same direction (cross product zero, dot product positive)
+                cross = (x2 - x1) * (point[1] - y2) - (y2 - y1) * (point[0] - x2)
+                dot = (x2 - x1) * (point[0] - x2) + (y2 - y1) * (point[1] - y2)
+                if abs(cross) < 1e-9 and dot > 0:
+                    merged[-1] = point
+                    continue
+            if merged and self.distance_of_two_points(*merged[-1], *point) < self.SAME_POINT_DISTANCE:
+                continue
+            merged.append(point)
+        return merged
+
+    @timed('motion.turn_arc')
+    def turn_arc(self, turn_degree, radius, tolerance=0.01):
+        """Drive a circular arc of the given radius, turning by turn_degree (positive to the left) with both wheels moving."""
+        angle = math.radians(abs(turn_degree))
+        outer_rotation = (radius + self.robot.AXLE_LENGTH / 2) * angle / self.robot.WHEEL_RADIUS
+        inner_rotation = (radius - self.robot.AXLE_LENGTH / 2) * angle / self.robot.WHEEL_RADIUS
+
+        if turn_degree > 0:
+            self.robot.add_left_motor_position(inner_rotation)
+            self.robot.add_right_motor_position(outer_rotation)
+            left_speed, right_speed = inner_rotation / outer_rotation, 1
+        else:
+            self.robot.add_left_motor_position(outer_rotation)
+            self.robot.add_right_motor_position(inner_rotation)
+            left_speed, right_speed = 1, inner_rotation / outer_rotation
+
+        # Wheel speeds in the ratio of their travel, so both reach their targets together
+        self.robot.set_left_motor_speed(left_speed * 100)
+        self.robot.set_right_motor_speed(right_speed * 100)
+
+        self.wait_for_motors(tolerance)
+
+    def corner_turn(self, previous, corner, following):
+        """Left (positive) or right turn in degrees at a corner of a path, None if it is not a quarter turn."""
+        turn = -self.shortest_diff_degree(self.direction_of_tow_poits(*previous, *corner), self.direction_of_tow_poits(*corner, *following))
+        if abs(abs(turn) - 90) > self.ANGLE_TOLERANCE:
+            return None
+        return turn
+
+    @timed('motion.follow_path')
+    def follow_path(self, points, reverse=False, stop=None):
+        """
+        Drive through a list of (x, y) waypoints in one go.
+
+        Straight runs are merged into a single move and rotations smaller than ANGLE_TOLERANCE are
+        skipped. The wheels are only brought to a full stop at the last waypoint: quarter turns
+        with room for it are driven as TURN_RADIUS arcs instead of stopping to rotate in place, and
+        intermediate moves hand over to the next one as soon as the motors are within
+        HANDOVER_TOLERANCE of their target (motor targets are absolute, so the remaining travel is
+        still done). Segments after the first start from where the previous one was planned to end
+        rather than the GPS reading, which lags behind while the previous move finishes.
+
+        :param stop: called before each segment, when it returns True the robot stops at the end of that segment
+        :return: the waypoint the robot stopped at
+        """
+        points = self.merge_straight_runs(points)
+        current = self.robot.current_position()
+
+        for i, target in enumerate(points):
+            distance = self.distance_of_two_points(*current, *target)
+            if distance < self.SAME_POINT_DISTANCE:
+                continue
+            last = i == len(points) - 1 or (stop is not None and stop())
+
+            target_degree = self.direction_of_tow_poits(*current, *target)
+            facing_degree = (target_degree + 180) % 360 if reverse else target_degree
+            if abs(self.shortest_diff_degree(self.robot.bearing(), facing_degree)) > self.ANGLE_TOLERANCE:
+                self.rotate_to_angle(facing_degree, self.HANDOVER_TOLERANCE)
+
+            # Cut the corner at the end of this segment when both sides of it are long enough
+            turn = None
+            if not last and not reverse and distance >= self.TURN_RADIUS and \
+                    self.distance_of_two_points(*target, *points[i + 1]) >= self.TURN_RADIUS:
+                turn = self.corner_turn(current, target, points[i + 1])
+
+            if turn is None:
+                self.move_straight(distance, -1 if reverse else 1, None if last else self.HANDOVER_TOLERANCE, facing_degree)
+                current = target
+            else:
+                self.move_straight(distance - self.TURN_RADIUS, 1, self.HANDOVER_TOLERANCE, facing_degree, keep_moving=True)
+                self.turn_arc(turn, self.TURN_RADIUS, self.HANDOVER_TOLERANCE)
+                following = points[i + 1]
+                following_distance = self.distance_of_two_points(*target, *following)
+                ratio = self.TURN_RADIUS / following_distance
+                current = (target[0] + (following[0] - target[0]) * ratio, target[1] + (following[1] - target[1]) * ratio)
+
+            if last:
+                return target
+        return points[-1] if points else None
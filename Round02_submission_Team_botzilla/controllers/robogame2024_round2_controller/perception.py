@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from colors import *
+from color_detect import CoarseToFine, get_colors_deltas, scan_palette
+from robot_utils import CameraFrame
+from instrumentation import timed
+
+# Colors looked for by each camera
+BOTTOM_COLORS = (RED, ORANGE, YELLOW)
+FRONT_COLORS = (GREEN,)
+
+# Damage of the floor colors, in the order of BOTTOM_COLORS
+FLOOR_DAMAGES = (40, 10, 0)
+
+# ΔE2000 under which a camera pixel matches a color, also the threshold the color LUTs are built for
+DETECTION_THRESHOLD = 20
+
+# Coarse-to-fine detection of each camera (color_detect.CoarseToFine), False to score every pixel
+BOTTOM_DETECTION = False
+FRONT_DETECTION = False
+
+def coarse_detection(enabled):
+    """CoarseToFine of one camera of one robot, its counters are not shared with other threads."""
+    return CoarseToFine() if enabled else None
+
+def classify_floor(frame, lut=None, coarse=None):
+    """Damage of a cell from its bottom camera frame, -1 when no floor color is seen."""
+    if coarse is not None:
+        color_deltas_array = coarse.colors_deltas(frame, BOTTOM_COLORS, threshold=DETECTION_THRESHOLD, lut=lut)
+    else:
+        color_deltas_array = get_colors_deltas(frame, BOTTOM_COLORS, threshold=DETECTION_THRESHOLD, lut=lut)
+    min_delta = float('inf')
+    min_delta_index = -1
+
+    for i in range(len(BOTTOM_COLORS)):
+        if color_deltas_array[i] is not None and color_deltas_array[i] < min_delta:
+            min_delta = color_deltas_array[i]
+            min_delta_index = i
+
+    if min_delta_index == -1:
+        return -1
+    return FLOOR_DAMAGES[min_delta_index]
+
+def detect_survivor(frame, lut=None, coarse=None):
+    """1 when a survivor shows up on the front camera frame (None when there was no wall to look at), else 0."""
+    if frame is None:
+        return 0
+    if coarse is not None:
+        return 1 if coarse.colors_exist(frame, FRONT_COLORS, threshold=DETECTION_THRESHOLD, lut=lut)[0] else 0
+    return 1 if scan_palette(frame, FRONT_COLORS, threshold=DETECTION_THRESHOLD, stop_count=1, lut=lut)[0].count else 0
+
+def detached_frame(frame):
+    """Frame that stays valid after the next robot step: CameraFrame buffers are copied unless they are immutable bytes."""
+    if frame is None or not isinstance(frame, CameraFrame) or frame.buffer.readonly:
+        return frame
+    return CameraFrame(bytes(frame.buffer), frame.width, frame.height)
+
+class Perception:
+    """
+    Color classification of camera frames on a worker thread.
+
+    The explorer hands the frames of a cell over with submit() and goes on moving. Results are
+    attached to their maze cell on the control thread, by apply_ready() (non blocking, called once
+    per tick) or wait() (blocking, for decisions that need every cell classified, like planning
+    the rescue route). One worker keeps the color LUTs used by a single thread; they must not be
+    saved before wait() returns.
+    """
+
+    def __init__(self, maze, bottom_lut=None, front_lut=None, workers=1, bottom_detection=BOTTOM_DETECTION, front_detection=FRONT_DETECTION):
+        self.maze = maze
+        self.bottom_lut = bottom_lut
+        self.front_lut = front_lut
+        self.bottom_coarse = coarse_detection(bottom_detection)
+        self.front_coarse = coarse_detection(front_detection)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='perception')
+        self.pending = [] # (x, y, future) in submission order
+
+        self.classified_cells = 0
+        self.worker_time = 0.0 # CPU time of the classifications, on the worker
+        self.wait_time = 0.0 # time the control thread spent blocked in wait()
+
+    @timed('sensing.classify')
+    def classify(self, bottom_frame, front_frame):
+        start = time.thread_time()
+        damage = classify_floor(bottom_frame, self.bottom_lut, self.bottom_coarse)
+        survivor = detect_survivor(front_frame, self.front_lut, self.front_coarse)
+        self.worker_time += time.thread_time() - start
+        return damage, survivor
+
+    def submit(self, x, y, bottom_frame, front_frame=None):
+        future = self.executor.submit(self.classify, detached_frame(bottom_frame), detached_frame(front_frame))
+        self.pending.append((x, y, future))
+
+    def apply(self, x, y, result):
+        damage, survivor = result
+        cell = self.maze.cell_map[y][x]
+        cell.damage = damage
+        cell.has_survivor = survivor
+        self.classified_cells += 1
+        self.maze.notify_cell_changed(x, y)
+
+    def apply_ready(self):
+        """Attach the results that are ready, without blocking."""
+        while self.pending and self.pending[0][2].done():
+            x, y, future = self.pending.pop(0)
+            self.apply(x, y, future.result())
+
+    def wait(self):
+        """Block until every submitted cell is classified and attached to the maze."""
+        start = time.perf_counter()
+        while self.pending:
+            x, y, future = self.pending.pop(0)
+            self.apply(x, y, future.result())
+        self.wait_time += time.perf_counter() - start
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
@@ -1,5 +1,44 @@
-from explore_dfs import *
+from controller import Robot
+from explore_frontier import EXPLORERS
+from exploration_checkpoint import ExplorationCheckpoint
+from color_lut import LUT_DIRECTORY
 from mission import Mission
+from instrumentation import profiler
+
+# Exploration strategy ('dfs', or 'frontier' which is only validated on FakeRobot so far)
+EXPLORATION_STRATEGY = 'dfs'
+
+# Closed loop wheel speed control (MotionController) instead of motor position targets, only validated on FakeRobot so far
+MOTION_CONTROL = False
+
+# Exploration state log, a restarted controller goes on from it instead of exploring again
+CHECKPOINT_FILE = 'exploration.log'
+
+# Timers and counters of the sensing, planning and motion hot paths, saved as a Chrome trace at the end
+PROFILE = False
+TRACE_FILE = 'trace.json'
+
+# Drawing of the maze as it is explored (needs pygame), in a window or only saved as a PNG at the end when headless
+VISUALIZE = False
+VISUALIZER_HEADLESS = True
+VISUALIZER_SNAPSHOT = 'maze.png'
+
+robot = Robot()
+
+if PROFILE:
+    profiler.enable()
+
+######################################################
+# Exploration.
+######################################################
+
+checkpoint = ExplorationCheckpoint(CHECKPOINT_FILE)
+explorer = EXPLORERS[EXPLORATION_STRATEGY](robot, checkpoint=checkpoint, lut_directory=LUT_DIRECTORY, motion_control=MOTION_CONTROL)
+visualizer = None
+if VISUALIZE:
+    from maze_visualizer import MazeVisualizer
+    visualizer = MazeVisualizer(explorer.maze, headless=VISUALIZER_HEADLESS)
+explorer.run()
 
 ######################################################
 # Mission Started.
@@ -9,8 +48,17 @@ print('==============================')
 print('Mission Started.')
 print('==============================')
 
-mission = Mission(maze, INITIAL_POSITION, INITIAL_DIRECTION_BEARING, entarnce_position, robot)
+mission = Mission(explorer.maze, explorer.initial_position, explorer.initial_bearing, explorer.entrance_position, robot, perception=explorer.perception, visualizer=visualizer, motion_control=MOTION_CONTROL)
 mission.run()
+checkpoint.clear()
+
+if visualizer is not None:
+    visualizer.save_png(VISUALIZER_SNAPSHOT)
+    visualizer.close()
+
+if PROFILE:
+    print(profiler.summary())
+    profiler.save_chrome_trace(TRACE_FILE)
 
 print('==============================')
 print('Mission Completed.')
@@ -26,7 +74,7 @@ print('==============================')
 
 # from maze_visualizer import MazeVisualizer
 # maze_visualizer = MazeVisualizer(maze)
-# maze_visualizer.draw() 
+# maze_visualizer.draw(force=True)
 
 # while robot_utils.step():
-#     pass
\ No newline at end of file
+#     pass
@@ -1,14 +1,76 @@
 import math
 
+from instrumentation import profiler
+
+try:
+    import numpy as np
+except ImportError: # NumPy is optional, frames are then read pixel by pixel
+    np = None
+
+class CameraFrame:
+    """
+    Zero-copy view over the raw BGRA buffer returned by camera.getImage().
+
+    It is indexed like getImageArray() in the color detection code (frame[y][x] -> (R, G, B)),
+    but no per-pixel Python objects are built unless a pixel is actually read.
+    With NumPy, np.asarray(frame) is a (height, width, 3) RGB view of the buffer.
+    """
+
+    def __init__(self, image, width, height):
+        self.buffer = memoryview(image)
+        self.width = width
+        self.height = height
+
+    def pixel(self, x, y):
+        offset = 4 * (y * self.width + x)
+        return (self.buffer[offset + 2], self.buffer[offset + 1], self.buffer[offset])
+
+    def rgb(self):
+        bgra = np.frombuffer(self.buffer, dtype=np.uint8).reshape(self.height, self.width, 4)
+        return bgra[..., 2::-1]
+
+    def __array__(self, dtype=None, copy=None):
+        rgb = self.rgb()
+        return rgb if dtype is None else rgb.astype(dtype)
+
+    def __getitem__(self, y):
+        return CameraFrameRow(self, y)
+
+    def __len__(self):
+        return self.height
+
+    def save(self, file):
+        """Record the raw frame so it can be served again by fake_devices.FakeCamera."""
+        with open(file, 'wb') as f:
+            f.write(self.buffer)
+
+class CameraFrameRow:
+    def __init__(self, frame, y):
+        self.frame = frame
+        self.y = y
+
+    def __getitem__(self, x):
+        return self.frame.pixel(x, self.y)
+
+    def __len__(self):
+        return self.frame.width
+
 class RobotUtils:
     TIME_STEP = 64           # in milliseconds
     MAX_SPEED = 7         # in rad/s
     WHEEL_RADIUS = 0.05      # in meters
     AXLE_LENGTH = 0.142      # in meters
 
-    def __init__(self, robot):
+    def __init__(self, robot, cache_sensors=True):
         self.robot = robot
 
+        # Sensor readings of the current simulation step (see read())
+        self.cache_sensors = cache_sensors
+        self.snapshot = {}
+        self.snapshot_time = None
+        self.device_reads = 0 # device calls made
+        self.saved_reads = 0 # device calls answered from the snapshot instead
+
         # motors
         self.left_motor = self.robot.getDevice('left motor')
         self.right_motor = self.robot.getDevice('right motor')
@@ -44,8 +106,41 @@ class RobotUtils:
         self.right_motor_position = self.right_wheel_sensor_value()
 
     def step(self):
+        profiler.step()
         return self.robot.step(self.TIME_STEP) != -1
 
+    def time(self):
+        """Simulated time in seconds."""
+        return self.robot.getTime()
+
+    #----------------------------------------------
+    # Sensor snapshot
+    #----------------------------------------------
+
+    def read(self, name, read, device=True):
+        """
+        Value of a sensor reading, taken once per simulation step.
+
+        The snapshot is keyed by the simulated time rather than cleared by step(), so it stays
+        right when several RobotUtils share one robot. Values derived from other readings (device
+        is False) are kept too, their device calls are counted by the readings they use.
+        """
+        if not self.cache_sensors:
+            if device: self.device_reads += 1
+            return read()
+
+        time = self.robot.getTime()
+        if time != self.snapshot_time:
+            self.snapshot.clear()
+            self.snapshot_time = time
+        elif name in self.snapshot:
+            self.saved_reads += 1
+            return self.snapshot[name]
+
+        if device: self.device_reads += 1
+        value = self.snapshot[name] = read()
+        return value
+
     #----------------------------------------------
     # Methods for motors
     #----------------------------------------------
@@ -77,19 +172,22 @@ class RobotUtils:
     #----------------------------------------------
 
     def left_wheel_sensor_value(self):
-        return self.left_wheel_sensor.getValue()
+        return self.read('left wheel', self.left_wheel_sensor.getValue)
     
     def right_wheel_sensor_value(self):
-        return self.right_wheel_sensor.getValue()
+        return self.read('right wheel', self.right_wheel_sensor.getValue)
     
     #----------------------------------------------
     # Methods for compass
     #----------------------------------------------
 
     def compass_value(self):
-        return self.compass.getValues()
+        return self.read('compass', self.compass.getValues)
     
     def bearing(self):
+        return self.read('bearing', self.compass_bearing, device=False)
+
+    def compass_bearing(self):
         dir = self.compass_value()
         if math.isnan(dir[0]):
             return None
@@ -112,8 +210,11 @@ class RobotUtils:
     # Methods for gps
     #----------------------------------------------
 
+    def gps_values(self):
+        return self.read('gps', self.gps.getValues)
+
     def current_position(self):
-        x, y, z = self.gps.getValues()
+        x, y, z = self.gps_values()
         return x, y
     
     #----------------------------------------------
@@ -121,10 +222,23 @@ class RobotUtils:
     #----------------------------------------------
 
     def ds_front_detected(self):
-        return self.ds_front.getValue() < 1000
+        return self.read('ds front', self.ds_front.getValue) < 1000
     
     def ds_right_detected(self):
-        return self.ds_right.getValue() < 1000
+        return self.read('ds right', self.ds_right.getValue) < 1000
     
     def ds_left_detected(self):
-        return self.ds_left.getValue() < 1000
\ No newline at end of file
+        return self.read('ds left', self.ds_left.getValue) < 1000
+
+    #----------------------------------------------
+    # Methods for cameras
+    #----------------------------------------------
+
+    def camera_frame(self, camera):
+        return CameraFrame(camera.getImage(), camera.getWidth(), camera.getHeight())
+
+    def front_camera_frame(self):
+        return self.read('camera front', lambda: self.camera_frame(self.camera_front))
+
+    def bottom_camera_frame(self):
+        return self.read('camera bottom', lambda: self.camera_frame(self.camera_bottom))
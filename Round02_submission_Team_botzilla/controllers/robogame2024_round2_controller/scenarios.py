@@ -0,0 +1,176 @@
+"""
+Camera frames, mazes and runs shared by the tests (test_*.py) and the benchmarks (benchmarks.py).
+"""
+import contextlib
+import io
+import random
+import tempfile
+
+from maze import Maze, Cell, ENTRANCE_CELL
+from fake_devices import encode_bgra
+from robot_utils import CameraFrame, RobotUtils
+from fake_robot import FakeRobot, MAZE_FILE
+from mission import Mission
+from explore_dfs import Explorer
+from explore_frontier import FrontierExplorer
+import perception
+
+# Color LUTs of the explorers built by the tests and benchmarks, the controller's bottom.lut / front.lut are never loaded or written
+TEMPORARY_LUTS = tempfile.TemporaryDirectory(prefix='color_luts_')
+LUT_DIRECTORY = TEMPORARY_LUTS.name
+
+def quiet(function, *args, **kwargs):
+    """Call a function without its progress prints."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+#----------------------------------------------
+# Camera frames
+#----------------------------------------------
+
+def synthetic_frame(base_rgb, seed=0, noise=6, width=64, height=64):
+    """Build a camera frame (imageArray[y][x] -> [R, G, B]) of a shaded, noisy tile."""
+    rng = random.Random(seed)
+    frame = []
+    for y in range(height):
+        row = []
+        for x in range(width):
+            shade = 1 - 0.15 * y / height
+            row.append([max(0, min(255, int(c * shade) + rng.randint(-noise, noise))) for c in base_rgb])
+        frame.append(row)
+    return frame
+
+def camera_frame(image_array):
+    return CameraFrame(encode_bgra(image_array), 64, 64)
+
+def blended_frame(rgb, base_rgb, ratio, seed, noise=6):
+    """Noisy frame of a color mixed with a base color, ratio 1 being the color."""
+    return synthetic_frame([round(c * ratio + b * (1 - ratio)) for c, b in zip(rgb, base_rgb)], seed, noise)
+
+def edge_frame(rgb, base_rgb, edge, seed):
+    """Tile of a color seen up to column `edge`, the floor around it after."""
+    frame = synthetic_frame(rgb, seed)
+    floor = synthetic_frame(base_rgb, seed + 1)
+    return [row[:edge] + floor_row[edge:] for row, floor_row in zip(frame, floor)]
+
+def patch_frame(rgb, base_rgb, size, seed):
+    """Wall frame with a small square patch of a color at a random place."""
+    rng = random.Random(seed)
+    frame = synthetic_frame(base_rgb, seed)
+    x0, y0 = rng.randrange(64 - size), rng.randrange(64 - size)
+    for y in range(y0, y0 + size):
+        for x in range(x0, x0 + size):
+            frame[y][x] = list(rgb)
+    return frame
+
+def recorded_frames():
+    """Bottom and front camera frames of the cells of a whole FakeRobot exploration, as the worker gets them."""
+    robot = FakeRobot()
+    explorer = Explorer(robot, lut_directory=LUT_DIRECTORY)
+    frames = []
+    submit = explorer.perception.submit
+
+    def recording_submit(x, y, bottom_frame, front_frame=None):
+        frames.append((perception.detached_frame(bottom_frame), perception.detached_frame(front_frame)))
+        submit(x, y, bottom_frame, front_frame)
+
+    explorer.perception.submit = recording_submit
+    quiet(explorer.run)
+    explorer.perception.close()
+    return frames
+
+#----------------------------------------------
+# Mazes
+#----------------------------------------------
+
+def load_maze(file=MAZE_FILE):
+    maze = Maze()
+    maze.from_file(file)
+    return maze
+
+def randomize_maze(maze, rng, damages=(-1, -1, -1, 0, 10, 40), wall_probability=0.2):
+    for row in maze.cell_map:
+        for cell in row:
+            cell.damage = rng.choice(damages)
+            cell.wall_data = [int(rng.random() < wall_probability) for _ in range(4)]
+    return maze
+
+def recolored_maze(rng, survivor_count=3):
+    """
+    maze.json with its fire pits moved to random cells and its survivors to random dead ends: the
+    explorers only look for survivors on a wall in front of them, which dead ends always have.
+    """
+    maze = load_maze()
+    for row in maze.cell_map:
+        for cell in row:
+            cell.damage = rng.choice((-1, -1, -1, -1, 0, 10, 40))
+            cell.has_survivor = 0
+    dead_ends = [cell for row in maze.cell_map for cell in row if sum(cell.wall_data) == 3]
+    for cell in rng.sample(dead_ends, survivor_count):
+        cell.has_survivor = 1
+    return maze
+
+def path_cost(cell_map, path):
+    return sum(cell_map[y][x].get_cost() for x, y in path[1:])
+
+def cell_list_map(maze):
+    """Copy a maze into the former list of Cell objects layout."""
+    cell_map = [[Cell() for _ in row] for row in maze.cell_map]
+    for y, row in enumerate(maze.cell_map):
+        for x, view in enumerate(row):
+            cell = cell_map[y][x]
+            cell.wall_data = list(view.wall_data)
+            cell.damage = view.damage
+            cell.has_survivor = view.has_survivor
+            cell.x, cell.y = view.x, view.y
+    return cell_map
+
+#----------------------------------------------
+# Runs
+#----------------------------------------------
+
+class ControllerKilled(Exception):
+    """Raised from a robot step to stand for the controller process being killed."""
+
+def check_wall_crossings(robot):
+    """Make every step of a FakeRobot check that the robot only moves between cells through open sides."""
+    step = robot.step
+    previous = [robot.current_cell()]
+
+    def checked_step(duration):
+        result = step(duration)
+        cell = robot.current_cell()
+        if cell != previous[0] and cell is not None and previous[0] is not None:
+            (x, y), (nx, ny) = previous[0], cell
+            assert abs(nx - x) + abs(ny - y) == 1, (previous[0], cell)
+            wall = [(0, -1), (0, 1), (1, 0), (-1, 0)].index((nx - x, ny - y))
+            assert not robot.has_wall(x, y, wall), (previous[0], cell)
+        previous[0] = cell
+        return result
+
+    robot.step = checked_step
+
+def known_maze_mission(robot, maze=None):
+    """Mission of a FakeRobot at its start with the maze (maze.json by default) known already, as after the exploration."""
+    robot_utils = RobotUtils(robot)
+    entrance_cell = robot.maze.cell_map[ENTRANCE_CELL[1]][ENTRANCE_CELL[0]]
+    return Mission(maze if maze is not None else load_maze(), robot_utils.gps_values(), robot_utils.direction_bearing(),
+                   [entrance_cell.x, entrance_cell.y], robot, wait_clock=robot.getTime)
+
+def at_initial_position(mission, tolerance=0.01):
+    """Whether the robot of a mission is back where it started."""
+    x, y = mission.robot_utils.current_position()
+    return abs(x - mission.initial_position[0]) < tolerance and abs(y - mission.initial_position[1]) < tolerance
+
+def full_run(visualizer=None):
+    """Exploration and mission on the FakeRobot, returns the simulated steps."""
+    robot = FakeRobot()
+    explorer = FrontierExplorer(robot, lut_directory=LUT_DIRECTORY)
+    if visualizer is not None:
+        visualizer = visualizer(explorer.maze)
+    quiet(explorer.run)
+    mission = Mission(explorer.maze, explorer.initial_position, explorer.initial_bearing, explorer.entrance_position, robot,
+                      perception=explorer.perception, visualizer=visualizer, wait_clock=robot.getTime)
+    quiet(mission.run)
+    explorer.perception.close()
+    return robot.steps
@@ -0,0 +1,216 @@
+import os
+import random
+import tempfile
+import unittest
+
+from colors import *
+import color_detect
+from color_detect import scan_palette
+from color_lut import ColorLUT
+from fake_devices import FakeCamera, encode_bgra
+from fake_robot import FLOOR_COLOR, WALL_COLOR
+from robot_utils import CameraFrame
+from perception import BOTTOM_COLORS, FRONT_COLORS, Perception, classify_floor, detect_survivor
+from scenarios import recorded_frames, synthetic_frame, camera_frame, blended_frame, edge_frame, patch_frame
+
+TILE_COLORS = (RED, ORANGE, YELLOW, GREEN, (200, 200, 200))
+
+class WithoutNumPy:
+    """Run the scalar fallbacks of color_detect, as on a robot without NumPy."""
+
+    def __enter__(self):
+        self.numpy = color_detect.np
+        color_detect.np = None
+
+    def __exit__(self, *exc_info):
+        color_detect.np = self.numpy
+
+class DeltasTestCase(unittest.TestCase):
+
+    def assertSameDeltas(self, expected, actual):
+        """Detection results (deltas, None or booleans) match, up to float rounding."""
+        self.assertEqual(len(expected), len(actual), (expected, actual))
+        for e, a in zip(expected, actual):
+            if isinstance(e, float) and isinstance(a, float):
+                self.assertAlmostEqual(e, a, delta=1e-6, msg=(expected, actual))
+            else:
+                self.assertEqual(e, a, (expected, actual))
+
+class BatchedDetectionTest(DeltasTestCase):
+
+    def setUp(self):
+        self.frames = [synthetic_frame(rgb, seed) for seed, rgb in enumerate(TILE_COLORS)]
+
+    def test_batched_matches_scalar(self):
+        for frame in self.frames:
+            scalar = [color_detect.get_color_deltas(frame, target) for target in BOTTOM_COLORS]
+            scalar.append(color_detect.is_color_exists(frame, GREEN, threshold=20))
+            batch = color_detect.get_colors_deltas(frame, BOTTOM_COLORS)
+            batch.append(color_detect.are_colors_exist(frame, (GREEN,), threshold=20)[0])
+            self.assertSameDeltas(scalar, batch)
+
+    def test_batched_without_numpy(self):
+        expected = [color_detect.get_colors_deltas(frame, BOTTOM_COLORS) for frame in self.frames[:2]]
+        with WithoutNumPy():
+            for frame, deltas in zip(self.frames[:2], expected):
+                self.assertSameDeltas(deltas, color_detect.get_colors_deltas(frame, BOTTOM_COLORS))
+
+    def test_camera_frame_matches_image_array(self):
+        frames = [encode_bgra(frame) for frame in self.frames]
+        nested_camera, view_camera = FakeCamera(frames), FakeCamera(frames)
+        for _ in frames:
+            self.assertEqual(color_detect.get_colors_deltas(nested_camera.getImageArray(), BOTTOM_COLORS),
+                             color_detect.get_colors_deltas(CameraFrame(view_camera.getImage(), 64, 64), BOTTOM_COLORS))
+
+    def test_palette_scan_matches_per_target_scans(self):
+        palette = BOTTOM_COLORS + (GREEN,)
+        for frame in self.frames:
+            expected = [color_detect.get_color_deltas(frame, target) for target in palette]
+            self.assertSameDeltas(expected, [match.min_delta for match in scan_palette(frame, palette)])
+
+    def test_palette_scan_early_exit(self):
+        matches = scan_palette(self.frames[0], BOTTOM_COLORS, stop_count=32)
+        self.assertGreaterEqual(matches[0].count, 32)
+        self.assertLess(matches[0].count, 64 * 64)
+
+class PrefilterTest(DeltasTestCase):
+
+    def test_only_rejects_pairs_over_the_threshold(self):
+        tiles = TILE_COLORS + ((40, 40, 40), (30, 60, 200))
+        for seed, rgb in enumerate(tiles):
+            frame = synthetic_frame(rgb, seed, noise=12)
+            codes = color_detect.unique_color_codes(frame)
+            exact = color_detect.color_codes_deltas(codes, BOTTOM_COLORS)
+            filtered = color_detect.color_codes_deltas(codes, BOTTOM_COLORS, threshold=20)
+            for exact_row, filtered_row in zip(exact, filtered):
+                for exact_delta, filtered_delta in zip(exact_row, filtered_row):
+                    if filtered_delta == float('inf'):
+                        self.assertGreaterEqual(exact_delta, 20)
+                    else:
+                        self.assertAlmostEqual(exact_delta, filtered_delta, delta=1e-9)
+
+            self.assertSameDeltas([color_detect.get_color_deltas(frame, target) for target in BOTTOM_COLORS],
+                                  color_detect.get_colors_deltas(frame, BOTTOM_COLORS))
+
+class ColorLUTTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frames = [synthetic_frame(rgb, seed) for seed, rgb in enumerate(TILE_COLORS)]
+        self.expected = [color_detect.get_colors_deltas(frame, BOTTOM_COLORS) for frame in self.frames]
+
+    def test_cold_and_warm_lookups(self):
+        lut = ColorLUT(BOTTOM_COLORS)
+        for _ in range(2):
+            self.assertEqual([color_detect.get_colors_deltas(frame, BOTTOM_COLORS, lut=lut) for frame in self.frames], self.expected)
+        self.assertGreater(lut.hit_rate(), 0)
+
+    def test_save_and_load(self):
+        lut = ColorLUT(BOTTOM_COLORS)
+        for frame in self.frames:
+            color_detect.get_colors_deltas(frame, BOTTOM_COLORS, lut=lut)
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'bottom.lut')
+            lut.save(file)
+            loaded = ColorLUT.load(file, BOTTOM_COLORS)
+        self.assertEqual([color_detect.get_colors_deltas(frame, BOTTOM_COLORS, lut=loaded) for frame in self.frames], self.expected)
+        self.assertEqual(loaded.misses, 0)
+
+    def test_threshold_capped_table(self):
+        lut = ColorLUT(BOTTOM_COLORS, threshold=20)
+        for _ in range(2):
+            self.assertEqual([color_detect.get_colors_deltas(frame, BOTTOM_COLORS, lut=lut) for frame in self.frames], self.expected)
+        self.assertTrue(any(delta == float('inf') for row in lut.table.values() for delta in row))
+        with self.assertRaises(ValueError):
+            color_detect.get_colors_deltas(self.frames[0], BOTTOM_COLORS, threshold=30, lut=lut)
+
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'bottom.lut')
+            lut.save(file)
+            self.assertEqual(ColorLUT.load(file, BOTTOM_COLORS, threshold=20).table, lut.table)
+            self.assertEqual(ColorLUT.load(file, BOTTOM_COLORS).table, {})
+
+    def test_damaged_files_load_empty(self):
+        lut = ColorLUT(BOTTOM_COLORS)
+        color_detect.get_colors_deltas(self.frames[0], BOTTOM_COLORS, lut=lut)
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'bottom.lut')
+            lut.save(file)
+            self.assertEqual(os.listdir(directory), ['bottom.lut'])
+            with open(file, 'rb') as f:
+                data = f.read()
+            for damaged in (data[:5], data[:-1], data[:-8], data + b'\0', data[:6] + b'\xff\xff\xff\x00' + data[10:]):
+                with open(file, 'wb') as f:
+                    f.write(damaged)
+                self.assertEqual(ColorLUT.load(file, BOTTOM_COLORS).table, {})
+
+class CoarseToFineTest(unittest.TestCase):
+
+    def frames(self, seed=0):
+        """Frames where the pooled scores are close calls: noisy tiles, blends into the floor and walls, edges, patches."""
+        rng = random.Random(seed)
+        return ([camera_frame(synthetic_frame(rgb, rng.randrange(1000), noise)) for rgb in BOTTOM_COLORS + (GREEN, FLOOR_COLOR, WALL_COLOR)
+                 for noise in (3, 10)] +
+                [camera_frame(blended_frame(rgb, base, ratio / 10, rng.randrange(1000)))
+                 for rgb in BOTTOM_COLORS + (GREEN,) for base in (FLOOR_COLOR, WALL_COLOR) for ratio in range(11)] +
+                [camera_frame(edge_frame(rgb, FLOOR_COLOR, rng.randrange(1, 64), rng.randrange(1000))) for rgb in BOTTOM_COLORS] +
+                [camera_frame(patch_frame(GREEN, WALL_COLOR, size, rng.randrange(1000))) for size in (1, 2, 3, 5)])
+
+    def assertSameDecisions(self, frames, bottom_lut=None, front_lut=None):
+        bottom, front = color_detect.CoarseToFine(), color_detect.CoarseToFine()
+        expected = [(classify_floor(frame, bottom_lut, None), detect_survivor(frame, front_lut, None)) for frame in frames]
+        actual = [(classify_floor(frame, bottom_lut, bottom), detect_survivor(frame, front_lut, front)) for frame in frames]
+        self.assertEqual(expected, actual)
+
+    def test_same_decisions_as_the_full_scan(self):
+        self.assertSameDecisions(self.frames())
+
+    def test_same_decisions_on_recorded_frames(self):
+        frames = recorded_frames()
+        self.assertSameDecisions([bottom for bottom, _ in frames] + [front for _, front in frames if front is not None])
+
+    def test_same_decisions_with_luts(self):
+        self.assertSameDecisions(self.frames(1), ColorLUT(BOTTOM_COLORS), ColorLUT(FRONT_COLORS))
+
+    def test_same_decisions_without_numpy(self):
+        frames = random.Random(2).sample(self.frames(2), 6)
+        with WithoutNumPy():
+            self.assertSameDecisions(frames)
+
+    def test_tile_mean_far_from_every_pixel(self):
+        # The tile mean is a yellow, its two pixels are not; the full scan sees the floor as undamaged
+        frame = [[[128, 128, 200] for _ in range(64)] for _ in range(64)]
+        for y in range(8):
+            for x in range(8):
+                frame[y][x] = [227, 213, 177] if (x + y) % 2 else [243, 197, 193]
+        self.assertEqual(classify_floor(frame, None, None), 0)
+        self.assertSameDecisions([frame])
+        with WithoutNumPy():
+            self.assertSameDecisions([frame])
+
+    def test_box_bound_under_every_color_of_the_box(self):
+        rng = random.Random(3)
+        targets = BOTTOM_COLORS + (GREEN,)
+        for _ in range(300):
+            lo = [rng.randrange(256) for _ in range(3)]
+            hi = [min(255, c + rng.choice((0, 4, 16, 64))) for c in lo]
+            lab_lo, lab_hi = color_detect.rgb_to_lab(lo), color_detect.rgb_to_lab(hi)
+            colors = [lo, hi] + [[rng.randint(l, h) for l, h in zip(lo, hi)] for _ in range(20)]
+            for target in targets:
+                target_lab = color_detect.rgb_to_lab(target)
+                bound = color_detect.deltaE_box_lower_bound(target_lab, lab_lo, lab_hi)
+                array_bound = color_detect.deltaE_box_lower_bound_array(color_detect.rgb_to_lab_array(target),
+                                                                        color_detect.rgb_to_lab_array(lo), color_detect.rgb_to_lab_array(hi))
+                self.assertAlmostEqual(bound, float(array_bound), delta=1e-9)
+                for color in colors:
+                    self.assertLessEqual(bound, color_detect.deltaE_ciede2000(target_lab, color_detect.rgb_to_lab(color)), (lo, hi, color, target))
+
+    def test_each_perception_has_its_own_detection(self):
+        perceptions = [Perception(None, bottom_detection=True, front_detection=True) for _ in range(2)]
+        for perception in perceptions:
+            perception.executor.shutdown()
+        self.assertIsNot(perceptions[0].bottom_coarse, perceptions[1].bottom_coarse)
+        self.assertIsNot(perceptions[0].bottom_coarse, perceptions[0].front_coarse)
+        self.assertIsNone(Perception(None).bottom_coarse)
+
+if __name__ == '__main__':
+    unittest.main()
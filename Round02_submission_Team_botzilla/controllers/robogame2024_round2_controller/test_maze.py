@@ -0,0 +1,108 @@
+import os
+import random
+import tempfile
+import unittest
+
+from maze import Maze, DIRECTIONS, json_to_snapshot, snapshot_to_json
+from distance_oracle import DistanceOracle
+from fake_robot import FakeRobot, MAZE_FILE
+from explore_frontier import FrontierExplorer
+from maze_generator import generate_maze, entrance_cell, OPPOSITE_WALL
+import maze_generator
+from scenarios import LUT_DIRECTORY, quiet, load_maze, randomize_maze
+
+class MazeSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.snapshot_file = os.path.join(self.directory.name, 'maze.snapshot')
+
+    def test_json_round_trip(self):
+        json_file = os.path.join(self.directory.name, 'maze.json')
+        json_to_snapshot(MAZE_FILE, self.snapshot_file)
+        snapshot_to_json(self.snapshot_file, json_file)
+        self.assertEqual(load_maze(json_file).to_array(), load_maze().to_array())
+
+    def test_random_mazes(self):
+        for size in (20, 100):
+            rng = random.Random(size)
+            # Odd sized, so the last byte of the packed walls only holds one cell
+            maze = randomize_maze(Maze(size + 1, size), rng)
+            for row in maze.cell_map:
+                for cell in row:
+                    cell.has_survivor = rng.choice((None, 0, 0, 1))
+                    cell.explored = rng.random() < 0.5
+                    if rng.random() < 0.9:
+                        cell.x, cell.y = rng.randrange(-400, 400) / 8, rng.randrange(-400, 400) / 8
+                    if rng.random() < 0.1:
+                        cell.damage = None
+
+            maze.save_snapshot(self.snapshot_file)
+            loaded = Maze(1)
+            loaded.load_snapshot(self.snapshot_file)
+            self.assertEqual(loaded.to_array(), maze.to_array())
+            self.assertEqual(loaded.grid.explored.bits, maze.grid.explored.bits)
+            self.assertEqual(list(loaded.grid.cost), list(maze.grid.cost))
+
+    def test_snapshot_after_every_explored_cell(self):
+        explorer = FrontierExplorer(FakeRobot(), async_perception=False, lut_directory=LUT_DIRECTORY)
+        checkpoints = []
+
+        def checkpoint(x, y):
+            explorer.maze.save_snapshot(self.snapshot_file)
+            checkpoints.append((x, y))
+
+        explorer.maze.add_cell_listener(checkpoint)
+        quiet(explorer.run)
+        loaded = Maze()
+        loaded.load_snapshot(self.snapshot_file)
+        self.assertEqual(loaded.to_array(), explorer.maze.to_array())
+        self.assertEqual(loaded.grid.explored.count(), 400)
+        self.assertEqual(len(checkpoints), 400)
+
+class MazeGeneratorTest(unittest.TestCase):
+
+    def generate(self, size, seed=0, loop_density=0.1):
+        return generate_maze(size, seed=seed, loop_density=loop_density, fire_pit_density=0.15, survivor_count=5)
+
+    def test_same_seed_same_maze(self):
+        self.assertEqual(self.generate(20).to_json(), self.generate(20).to_json())
+        self.assertNotEqual(self.generate(20).to_json(), self.generate(20, seed=1).to_json())
+
+    def test_walls_and_densities(self):
+        for size, loop_density in ((20, 0.0), (20, 0.2), (60, 0.1)):
+            maze = self.generate(size, loop_density=loop_density)
+            cells = [(x, y, maze.cell_map[y][x]) for y in range(size) for x in range(size)]
+            open_sides = 0
+            for x, y, cell in cells:
+                for direction, (dx, dy) in enumerate(DIRECTIONS):
+                    nx, ny = x + dx, y + dy
+                    if 0 <= nx < size and 0 <= ny < size:
+                        # Both sides of a wall agree
+                        self.assertEqual(cell.wall_data[direction], maze.cell_map[ny][nx].wall_data[OPPOSITE_WALL[direction]])
+                        open_sides += not cell.wall_data[direction]
+                    elif (x, y) != entrance_cell(size, size) or direction != 1:
+                        self.assertEqual(cell.wall_data[direction], 1)
+
+            # A spanning tree has one passage less than cells, the loops add to it
+            inner_walls = 2 * size * (size - 1) - (size * size - 1)
+            self.assertEqual(open_sides // 2, size * size - 1 + round(inner_walls * loop_density))
+            self.assertEqual(len(DistanceOracle(maze.cell_map).search(entrance_cell(size, size))[0]), size * size)
+            self.assertEqual(sum(cell.damage in (10, 40) for _, _, cell in cells), round((size * size - 1) * 0.15))
+            self.assertEqual(sum(cell.has_survivor for _, _, cell in cells), 5)
+
+    def test_non_square_maze(self):
+        maze = generate_maze(30, height=10, seed=0)
+        self.assertEqual((maze.grid.width, maze.grid.height), (30, 10))
+        self.assertEqual(len(DistanceOracle(maze.cell_map).search(entrance_cell(30, 10))[0]), 300)
+
+    def test_command_line(self):
+        with tempfile.TemporaryDirectory() as directory:
+            quiet(maze_generator.main, [directory, '--count', '2', '--seed', '3'])
+            self.assertEqual(sorted(os.listdir(directory)), ['maze_3.json', 'maze_4.json'])
+            loaded = load_maze(os.path.join(directory, 'maze_3.json'))
+        self.assertEqual(loaded.to_array(), generate_maze(seed=3).to_array())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import contextlib
+import io
+import random
+import unittest
+
+from maze import Maze, ENTRANCE_CELL
+from astar_solver import AStarSolver
+from distance_oracle import DistanceOracle
+from dstar_lite import DStarLite
+from bucket_astar import BucketAStar
+from fake_robot import FakeRobot
+from maze_generator import generate_maze, entrance_cell
+from scenarios import load_maze, randomize_maze, path_cost, cell_list_map, known_maze_mission, at_initial_position
+
+def random_pairs(maze, rng, count, start=(0, 0)):
+    """Pairs of cells reachable from start."""
+    reachable = list(DistanceOracle(maze.cell_map).search(start)[0])
+    return [(rng.choice(reachable), rng.choice(reachable)) for _ in range(count)]
+
+class DistanceOracleTest(unittest.TestCase):
+
+    def test_costs_are_exact(self):
+        maze = load_maze()
+        rng = random.Random(0)
+        points = [ENTRANCE_CELL] + rng.sample([(x, y) for y in range(20) for x in range(20)], 8)
+        solver = AStarSolver(maze.cell_map, ENTRANCE_CELL, points[1:], ENTRANCE_CELL)
+        matrix = DistanceOracle(maze.cell_map).cost_matrix(points)
+        # The paths of a_star can only cost as much or more
+        for i, a in enumerate(points):
+            for j, b in enumerate(points):
+                self.assertLessEqual(matrix[i][j], path_cost(maze.cell_map, solver.a_star(a, b)), (a, b))
+
+    def test_invalidated_cell(self):
+        maze = load_maze()
+        oracle = DistanceOracle(maze.cell_map)
+        start, goal = ENTRANCE_CELL, (3, 4)
+        x, y = oracle.path(start, goal)[1]
+        maze.cell_map[y][x].damage = 40
+        oracle.invalidate_cell(x, y)
+        self.assertEqual(oracle.cost(start, goal), DistanceOracle(maze.cell_map).cost(start, goal))
+
+class RescuePlansTest(unittest.TestCase):
+
+    def test_optimal_route_costs_at_most_the_greedy_one(self):
+        maze = load_maze()
+        rng = random.Random(0)
+        cells = [(x, y) for y in range(20) for x in range(20)]
+        for x, y in rng.sample(cells, len(cells) // 6):
+            maze.cell_map[y][x].damage = rng.choice((10, 40))
+        for survivor_count in (3, 6, 10, 16):
+            survivors = rng.sample(cells, survivor_count)
+            reports = AStarSolver(maze.cell_map, ENTRANCE_CELL, survivors, ENTRANCE_CELL).compare_plans()
+            self.assertLessEqual(reports['optimal']['cost'], reports['greedy']['cost'])
+
+    def test_rescue_route_visits_every_survivor(self):
+        maze = generate_maze(50, seed=0, survivor_count=8)
+        entrance = entrance_cell(50, 50)
+        survivors = [(x, y) for y in range(50) for x in range(50) if maze.cell_map[y][x].has_survivor]
+        route = AStarSolver(maze.cell_map, entrance, survivors, entrance).find_rescue_route()
+        self.assertLessEqual(set(survivors), set(route))
+        self.assertEqual(route[-1], entrance)
+
+    def test_travel_time_estimate(self):
+        maze = load_maze()
+        solver = AStarSolver(maze.cell_map, (0, 0), [], (0, 0))
+        report = solver.route_report([(1, 0), (2, 0), (2, 1), (1, 1), (2, 1)])
+        self.assertEqual((report['corners'], report['turn_backs']), (2, 1))
+        self.assertAlmostEqual(report['travel_time'], 5 * solver.CELL_TIME + 2 * solver.CORNER_TIME + solver.TURN_BACK_TIME)
+
+        # Close to the simulated time of the mission, the 3 s waits at the survivors and the way back to the initial position left out
+        robot = FakeRobot()
+        mission = known_maze_mission(robot)
+        solver = AStarSolver(mission.maze.cell_map, ENTRANCE_CELL, mission.survivor_cells, ENTRANCE_CELL)
+        estimate = solver.route_report(solver.find_optimal_rescue_route())['travel_time']
+        with contextlib.redirect_stdout(io.StringIO()):
+            mission.run()
+        travel_time = robot.getTime() - 3 * len(mission.survivor_cells)
+        self.assertLess(abs(estimate - travel_time) / travel_time, 0.2)
+
+    def test_survivors_cut_off_from_the_exit(self):
+        maze = load_maze()
+        start, exit_point = ENTRANCE_CELL, (0, 0)
+        for x, y, side in ((0, 0, 1), (0, 0, 2), (1, 0, 3), (0, 1, 0)):
+            maze.cell_map[y][x].wall_data[side] = 1
+        for x, y in ((0, 0), (19, 19)):
+            maze.cell_map[y][x].has_survivor = 1
+        solver = AStarSolver(maze.cell_map, start, [(0, 0), (19, 19)], exit_point)
+        for plan in (solver.find_rescue_route, solver.find_optimal_rescue_route):
+            with self.assertRaisesRegex(ValueError, 'can not be reached'):
+                plan()
+
+        # A survivor the exit can not be reached from is left out, by both plans
+        solver = AStarSolver(maze.cell_map, start, [(0, 0), (19, 19)], start)
+        for plan in (solver.find_rescue_route, solver.find_optimal_rescue_route):
+            route = plan()
+            self.assertIn((19, 19), route)
+            self.assertNotIn((0, 0), route)
+            self.assertEqual(route[-1], start)
+
+class AStarEnginesTest(unittest.TestCase):
+
+    def test_grid_and_cell_list_paths(self):
+        for size in (20, 60):
+            maze = randomize_maze(Maze(size), random.Random(size))
+            start = (0, size - 1)
+            reachable = DistanceOracle(maze.cell_map).search(start)[0]
+            goal = max(reachable, key=lambda cell: abs(cell[0] - start[0]) + abs(cell[1] - start[1]))
+            self.assertEqual(AStarSolver(maze.cell_map, start, [], goal).a_star(start, goal),
+                             AStarSolver(cell_list_map(maze), start, [], goal).a_star(start, goal))
+
+    def test_heap_and_bucket_costs(self):
+        for size in (20, 50):
+            for damages in ((-1, -1, -1, 10, 40), (-1, -1, -1, 0, 10, 40)):
+                rng = random.Random(size)
+                maze = randomize_maze(Maze(size), rng, damages)
+                heap_solver = AStarSolver(maze.cell_map, (0, 0), [], (0, 0))
+                bucket_solver = AStarSolver(maze.cell_map, (0, 0), [], (0, 0), engine='bucket')
+                # The heap heuristic is weighted by the lowest cell cost, 0 with the 0 damage cells
+                list_solver = AStarSolver(cell_list_map(maze), (0, 0), [], (0, 0))
+                self.assertEqual(list_solver.weight, heap_solver.weight)
+                for a, b in random_pairs(maze, rng, 20):
+                    heap_cost = path_cost(maze.cell_map, heap_solver.a_star(a, b))
+                    self.assertEqual(path_cost(maze.cell_map, bucket_solver.a_star(a, b)), heap_cost)
+                    self.assertEqual(path_cost(maze.cell_map, list_solver.a_star(a, b)), heap_cost)
+                    self.assertEqual(heap_cost, DistanceOracle(maze.cell_map).cost(a, b))
+
+    def test_non_square_maze(self):
+        maze = generate_maze(30, height=10, seed=0)
+        start, goal = (0, 0), (29, 9)
+        cost = DistanceOracle(maze.cell_map).cost(start, goal)
+        for engine in ('heap', 'bucket'):
+            path = AStarSolver(maze.cell_map, start, [], goal, engine=engine).a_star(start, goal)
+            self.assertEqual((path[0], path[-1]), (start, goal))
+            self.assertEqual(path_cost(maze.cell_map, path), cost)
+
+    def test_cost_range_follows_the_cells(self):
+        maze = randomize_maze(Maze(20), random.Random(0), (-1, 10, 40))
+        cells = [cell for row in maze.cell_map for cell in row]
+        self.assertEqual(maze.grid.cost_range(), (1, 40))
+        for cell in cells:
+            if cell.get_cost() == 40:
+                cell.damage = 0
+        self.assertEqual(maze.grid.cost_range(), (0, 10))
+        loaded = Maze(20)
+        loaded.grid.load_snapshot(maze.grid.to_snapshot())
+        self.assertEqual(loaded.grid.cost_range(), (0, 10))
+
+class DStarLiteTest(unittest.TestCase):
+
+    def test_repairs_match_fresh_searches(self):
+        for damages in ((-1, -1, -1, 10, 40), (-1, -1, -1, 0, 10, 40)):
+            rng = random.Random(50)
+            maze = randomize_maze(Maze(50), rng, damages)
+            start, goal = max(random_pairs(maze, rng, 20), key=lambda pair: abs(pair[0][0] - pair[1][0]) + abs(pair[0][1] - pair[1][1]))
+
+            planner = DStarLite(maze.cell_map, start, goal)
+            maze.add_cell_listener(planner.update_cell)
+            # The same repairs on a list of Cell objects, its copy of the cells follows update_cell
+            cell_list = cell_list_map(maze)
+            list_planner = DStarLite(cell_list, start, goal)
+            bucket = BucketAStar(maze.cell_map)
+            path = planner.compute_path()
+            list_planner.compute_path()
+            for _ in range(20):
+                if path is None or len(path) < 4:
+                    break
+                # Drive a few cells, then a cell a few cells ahead turns out worse than mapped
+                planner.move_start(path[min(3, len(path) - 2)])
+                list_planner.move_start(planner.start)
+                x, y = path[rng.randrange(min(4, len(path) - 1), min(8, len(path)))]
+                if (x, y) == goal:
+                    continue
+                maze.cell_map[y][x].damage = 40
+                maze.notify_cell_changed(x, y)
+                cell_list[y][x].damage = 40
+                list_planner.update_cell(x, y)
+
+                path = planner.compute_path()
+                list_planner.compute_path()
+                self.assertEqual(list_planner.cost(), planner.cost())
+                try:
+                    fresh_path = bucket.search(planner.start, goal)
+                except KeyError:
+                    fresh_path = None
+                if fresh_path is None:
+                    self.assertIsNone(path)
+                else:
+                    self.assertEqual(path_cost(maze.cell_map, path), path_cost(maze.cell_map, fresh_path))
+                    self.assertEqual(path_cost(maze.cell_map, path), planner.cost())
+
+    def test_mission_replans_when_a_cell_changes(self):
+        robot = FakeRobot()
+        maze = load_maze()
+        mission = known_maze_mission(robot, maze)
+        step = robot.step
+        changed = []
+
+        def step_and_change(duration):
+            # A cell of the route gets worse while the mission drives it
+            if not changed and robot.steps >= 100 and mission.planner is not None:
+                current = robot.current_cell()
+                path = mission.planner.path()
+                ahead = [cell for cell in path[path.index(current) + 3:] if cell != mission.planner.goal] if current in path else []
+                if ahead:
+                    x, y = ahead[0]
+                    maze.cell_map[y][x].damage = 40
+                    changed.append((x, y))
+                    maze.notify_cell_changed(x, y)
+            return step(duration)
+
+        robot.step = step_and_change
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            mission.run()
+        self.assertTrue(changed)
+        self.assertIn('replanning', output.getvalue())
+        self.assertTrue(at_initial_position(mission))
+
+if __name__ == '__main__':
+    unittest.main()
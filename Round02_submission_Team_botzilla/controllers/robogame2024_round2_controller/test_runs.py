@@ -0,0 +1,283 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from maze import ENTRANCE_CELL
+from navigation_utils import NavigationUtils
+from distance_oracle import DistanceOracle
+from fake_robot import FakeRobot
+from mission import Mission
+from explore_dfs import Explorer
+from explore_frontier import FrontierExplorer
+from exploration_checkpoint import ExplorationCheckpoint
+import batch_runner
+from instrumentation import profiler
+from color_lut import LUT_DIRECTORY as CONTROLLER_LUT_DIRECTORY, lut_file
+from maze_visualizer import MazeVisualizer, import_pygame
+from scenarios import LUT_DIRECTORY, ControllerKilled, quiet, load_maze, recolored_maze, check_wall_crossings, known_maze_mission, at_initial_position, full_run
+
+EXPLORERS = (Explorer, FrontierExplorer)
+
+def controller_luts():
+    """Modification times of the color LUTs of the competition controller, None when there is none."""
+    files = (lut_file('bottom', CONTROLLER_LUT_DIRECTORY), lut_file('front', CONTROLLER_LUT_DIRECTORY))
+    return [os.stat(file).st_mtime_ns if os.path.exists(file) else None for file in files]
+
+class MissionTest(unittest.TestCase):
+
+    def test_mission_returns_to_its_initial_position(self):
+        for motion_control in (False, True):
+            robot = FakeRobot()
+            check_wall_crossings(robot)
+            mission = known_maze_mission(robot)
+            mission.nav_utils = NavigationUtils(mission.robot_utils, motion_control)
+            quiet(mission.run)
+            self.assertTrue(at_initial_position(mission))
+
+class ExplorationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reference = load_maze().to_array()
+
+    def assertExploredMaze(self, explorer):
+        self.assertTrue(explorer.completed)
+        self.assertEqual(explorer.maze.to_array(), self.reference)
+
+    def test_explorers_map_the_maze(self):
+        for explorer_class in EXPLORERS:
+            for motion_control in (False, True):
+                robot = FakeRobot()
+                check_wall_crossings(robot)
+                explorer = explorer_class(robot, lut_directory=LUT_DIRECTORY)
+                explorer.nav_utils = NavigationUtils(explorer.robot_utils, motion_control)
+                quiet(explorer.run)
+                self.assertExploredMaze(explorer)
+
+    def test_interleaved_explorers(self):
+        explorers = [Explorer(FakeRobot(), lut_directory=LUT_DIRECTORY) for _ in range(3)]
+        running = list(explorers)
+        while running:
+            running = [explorer for explorer in running if quiet(explorer.tick)]
+        for explorer in explorers:
+            self.assertExploredMaze(explorer)
+
+    def test_walled_off_corner(self):
+        maze = load_maze()
+        for x, y in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            maze.cell_map[y][x].wall_data = [1, 1, 1, 1]
+        for x, y, side in ((2, 0, 3), (2, 1, 3), (0, 2, 0), (1, 2, 0)):
+            maze.cell_map[y][x].wall_data[side] = 1
+        reference = maze.to_array()
+        reachable = set(DistanceOracle(maze.cell_map).search(ENTRANCE_CELL)[0])
+
+        for explorer_class in EXPLORERS:
+            explorer = explorer_class(FakeRobot(maze), lut_directory=LUT_DIRECTORY)
+            quiet(explorer.run)
+            explorer.perception.wait()
+            self.assertTrue(explorer.completed)
+            explored = [(x, y) for y, row in enumerate(explorer.maze.cell_map) for x, cell in enumerate(row) if cell.explored]
+            self.assertEqual(set(explored), reachable)
+            for x, y in explored:
+                self.assertEqual(explorer.maze.cell_map[y][x].to_array()[:3], reference[y][x][:3])
+
+    def test_sensor_cache_keeps_the_same_moves(self):
+        for explorer_class in EXPLORERS:
+            steps = []
+            for cache_sensors in (False, True):
+                robot = FakeRobot()
+                explorer = explorer_class(robot, lut_directory=LUT_DIRECTORY)
+                explorer.robot_utils.cache_sensors = cache_sensors
+                quiet(explorer.run)
+                self.assertExploredMaze(explorer)
+                steps.append(robot.steps)
+            self.assertEqual(steps[0], steps[1])
+
+    def test_known_cells_are_not_sensed_again(self):
+        for explorer_class in EXPLORERS:
+            explorer = explorer_class(FakeRobot(), async_perception=False, lut_directory=LUT_DIRECTORY)
+            quiet(explorer.run)
+            self.assertExploredMaze(explorer)
+            self.assertEqual(explorer.sensed_cells, 400)
+
+    def test_inline_and_worker_perception(self):
+        for async_perception in (False, True):
+            explorer = Explorer(FakeRobot(), async_perception=async_perception, lut_directory=LUT_DIRECTORY)
+            quiet(explorer.run)
+            self.assertExploredMaze(explorer)
+            if async_perception:
+                self.assertEqual(explorer.perception.classified_cells, 400)
+                explorer.perception.close()
+
+    def test_luts_are_not_kept_by_default(self):
+        luts = controller_luts()
+        explorer = FrontierExplorer(FakeRobot(), async_perception=False)
+        quiet(explorer.run)
+        self.assertExploredMaze(explorer)
+        self.assertGreater(len(explorer.bottom_lut.table), 0)
+        self.assertEqual(controller_luts(), luts)
+
+class CheckpointTest(unittest.TestCase):
+
+    def test_killed_exploration_resumes(self):
+        reference = load_maze().to_array()
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'exploration.log')
+            for explorer_class in EXPLORERS:
+                robot = FakeRobot()
+                step = robot.step
+
+                def killing_step(duration):
+                    if robot.steps == 6000:
+                        raise ControllerKilled()
+                    return step(duration)
+
+                robot.step = killing_step
+                explorer = explorer_class(robot, checkpoint=ExplorationCheckpoint(file), lut_directory=LUT_DIRECTORY)
+                with self.assertRaises(ControllerKilled):
+                    quiet(explorer.run)
+                # Whatever the dead controller had not written is lost
+                explorer.checkpoint.close()
+                explorer.perception.executor.shutdown(wait=False)
+
+                robot.step = step
+                check_wall_crossings(robot)
+                resumed = explorer_class(robot, checkpoint=ExplorationCheckpoint(file), lut_directory=LUT_DIRECTORY)
+                self.assertTrue(resumed.restored)
+                # Cells logged before their colors were attached are sensed again
+                restored_cells = resumed.maze.grid.explored.count()
+                self.assertLessEqual(restored_cells, explorer.maze.grid.explored.count())
+                quiet(resumed.run)
+                resumed.perception.close()
+                self.assertTrue(resumed.completed)
+                for y, row in enumerate(resumed.maze.cell_map):
+                    for x, cell in enumerate(row):
+                        self.assertTrue(cell.explored)
+                        self.assertEqual(cell.to_array()[:3], reference[y][x][:3], (x, y))
+                self.assertLess(resumed.sensed_cells, 400 - restored_cells + 5)
+
+                # The mission runs on the resumed exploration
+                mission = Mission(resumed.maze, resumed.initial_position, resumed.initial_bearing, resumed.entrance_position, robot,
+                                  wait_clock=robot.getTime)
+                quiet(mission.run)
+                self.assertTrue(at_initial_position(mission))
+
+                # A log left over by another simulation run is not restored
+                stale = explorer_class(FakeRobot(), checkpoint=ExplorationCheckpoint(file), lut_directory=LUT_DIRECTORY)
+                self.assertFalse(stale.restored)
+                stale.checkpoint.clear()
+                stale.perception.close()
+
+    def test_ticks_are_logged_without_waiting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = ExplorationCheckpoint(os.path.join(directory, 'exploration.log'))
+            explorer = Explorer(FakeRobot(), checkpoint=checkpoint, lut_directory=LUT_DIRECTORY)
+            waits = []
+            wait = explorer.perception.wait
+            explorer.perception.wait = lambda: waits.append(wait())
+            for _ in range(50):
+                quiet(explorer.tick)
+            self.assertEqual(checkpoint.lines, 50)
+            self.assertEqual(waits, [])
+            explorer.checkpoint.close()
+            explorer.perception.close()
+
+class BatchRunnerTest(unittest.TestCase):
+
+    def test_serial_and_parallel_reports(self):
+        luts = controller_luts()
+        rng = random.Random(0)
+        with tempfile.TemporaryDirectory() as directory:
+            files = []
+            for i in range(3):
+                files.append(os.path.join(directory, f'maze_{i}.json'))
+                recolored_maze(rng).save(files[-1])
+
+            serial = batch_runner.run_batch(files, 'frontier', 1)
+            parallel = batch_runner.run_batch(files, 'frontier', 2)
+            simulated = [field for field in batch_runner.REPORT_FIELDS if 'wall_time' not in field and 'cpu_time' not in field]
+            for serial_result, parallel_result in zip(serial, parallel):
+                self.assertEqual(serial_result['status'], 'completed', serial_result)
+                self.assertEqual([serial_result[field] for field in simulated], [parallel_result[field] for field in simulated])
+
+            batch_runner.write_report(parallel, os.path.join(directory, 'report.json'))
+            with open(os.path.join(directory, 'report.json')) as f:
+                totals = json.load(f)['summary']
+        self.assertEqual(totals['survivors_rescued'], 9)
+        self.assertEqual(totals['survivors'], 9)
+        # Batch runs keep their color LUTs to themselves
+        self.assertEqual(controller_luts(), luts)
+
+class InstrumentationTest(unittest.TestCase):
+
+    def test_whole_run_profile(self):
+        profiler.reset()
+        profiler.enable()
+        try:
+            steps = full_run()
+        finally:
+            profiler.disable()
+        self.addCleanup(profiler.reset)
+
+        # Every step is taken by RobotUtils, most of them inside the motion primitives
+        self.assertEqual(profiler.steps, steps)
+        motion_steps = sum(profiler.timers[name]['steps'] for name in ('motion.rotate_to_angle', 'motion.move_straight', 'motion.turn_arc'))
+        self.assertTrue(0.9 * steps < motion_steps <= steps)
+        self.assertGreater(profiler.counters['planning.distance_oracle.settled'], 0)
+        self.assertGreaterEqual(profiler.timers['sensing.maze_update_current_cell']['calls'], 400)
+        self.assertEqual(profiler.timers['sensing.classify']['calls'], 400)
+
+        with tempfile.TemporaryDirectory() as directory:
+            json_file = os.path.join(directory, 'trace.json')
+            chrome_file = os.path.join(directory, 'chrome_trace.json')
+            profiler.save_json(json_file)
+            profiler.save_chrome_trace(chrome_file)
+            with open(json_file) as f:
+                self.assertEqual(len(json.load(f)['events']), len(profiler.events))
+            with open(chrome_file) as f:
+                events = json.load(f)['traceEvents']
+        self.assertGreaterEqual({event['cat'] for event in events if event['ph'] == 'X'}, {'phase', 'sensing', 'color_detect', 'planning', 'motion'})
+
+class VisualizerTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            self.pygame = import_pygame(headless=True)
+        except ImportError:
+            self.skipTest('pygame is not installed')
+
+    def test_import_does_not_load_pygame(self):
+        subprocess.run([sys.executable, '-c', 'import sys, maze_visualizer; assert "pygame" not in sys.modules'], check=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    def test_changes_wait_for_the_next_frame(self):
+        visualizer = MazeVisualizer(load_maze(), headless=True, max_fps=1)
+        visualizer.draw(force=True)
+        visualizer.on_cell_changed(1, 1)
+        self.assertEqual(visualizer.dirty_cells, {(1, 1)})
+        self.assertGreater(visualizer.frames_skipped, 0)
+
+    def test_incremental_drawing_matches_a_full_redraw(self):
+        visualizers = []
+
+        def headless(maze):
+            visualizers.append(MazeVisualizer(maze, headless=True, max_fps=None))
+            return visualizers[-1]
+
+        full_run(headless)
+        visualizer = visualizers[0]
+        self.assertTrue(visualizer.route)
+        self.assertLess(visualizer.cells_drawn, visualizer.frames * 400)
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'maze.png')
+            visualizer.save_png(file)
+            image = self.pygame.image.load(file)
+        expected = MazeVisualizer(visualizer.maze, headless=True)
+        expected.draw(visualizer.route, force=True)
+        self.assertEqual(self.pygame.image.tobytes(image, 'RGB'), self.pygame.image.tobytes(expected.screen, 'RGB'))
+
+if __name__ == '__main__':
+    unittest.main()